@@ -1,134 +1,230 @@
+from datetime import date
 from otsokop.odoo import Odoo
 from otsokop.odoo import banner as otsokop_banner
+import os
 import pandas as pd
 import sys
 
 client = Odoo()
 
+QUANT_KEY = ["product_id", "location_id", "lot_id"]
+
+# Number of location ids per `in` domain when loading the quants
+IDS_PER_QUERY = 1000
+
 
 def main():
     # stock_picking()
-    action_balance_qty()
+    if "--apply" in sys.argv:
+        apply_balance_qty()
+    else:
+        corrections = action_balance_qty()
+        print_corrections(corrections)
 
 
 # https://raw.githubusercontent.com/hydrosIII/odoo12-stock-correction/refs/heads/master/models/models.py
 def action_balance_qty():
-    datetime_start = "2024-12-01 00:00:00"
-    datetime_end = "2024-12-31 23:59:59"
+    """
+    Dry-run of the stock correction: the expected quantity of each quant of
+    an internal location is replayed from zero with all the done move lines,
+    and compared to its current quantity.
+
+    Instead of two `stock.quant` searches per move line, the move lines and
+    the quants are loaded in bulk and the expected quantities computed with
+    a groupby on (product, location, lot).
+
+    Returns:
+        DataFrame: one row per quant to create or update, with its current
+        and expected quantity
+    """
+    location_ids = load_internal_location_ids()
+    return compute_quant_corrections(
+        load_move_lines(location_ids), load_quants(location_ids), location_ids
+    )
+
 
+def load_internal_location_ids():
+    location_ids = client.execute_kw(
+        "stock.location",
+        "search",
+        [[["usage", "=", "internal"]]],
+        {"context": {"active_test": False}},
+    )
+    return sorted(location_ids or [])
+
+
+def load_move_lines(location_ids):
     # sqlscrpt=(
     #         "select product_id,location_id,location_dest_id,qty_done,lot_id "
     #         "from stock_move_line "
     #         "where state='done';"
     #         )
-    res = client.execute_kw(
+    rows = []
+    for page in client.iter_search_read(
         "stock.move.line",
-        "search_read",
         [
-            [
-                ["create_date", ">=", client._to_utc(datetime_start)],
-                ["create_date", "<=", client._to_utc(datetime_end)],
-                ["state", "=", "done"],
-            ],
-            ["product_id", "location_id", "location_dest_id", "qty_done", "lot_id"],
+            ["state", "=", "done"],
+            "|",
+            ["location_id", "in", location_ids],
+            ["location_dest_id", "in", location_ids],
+        ],
+        ["product_id", "location_id", "location_dest_id", "qty_done", "lot_id"],
+    ):
+        rows.extend(page)
+
+    move_lines = pd.DataFrame(
+        rows,
+        columns=[
+            "id",
+            "product_id",
+            "location_id",
+            "location_dest_id",
+            "qty_done",
+            "lot_id",
         ],
     )
+    for column in ["product_id", "location_id", "location_dest_id", "lot_id"]:
+        move_lines[column] = move_lines[column].map(_many2one_id)
+    return move_lines
 
-    # Reset all stock.quant quantity
-    # for i in self.search([]):
-    #     i.write({
-    #         'quantity': 0
-    #         })
-
-    for i in res:
-        product_id = i["product_id"][0]
-        location_id = i["location_id"][0]
-        location_dest_id = i["location_dest_id"][0]
-        lot_id = i["lot_id"][0] if i["lot_id"] else False
-
-        # sqrcrd = self.search([
-        #         ('product_id','=',i['product_id']),
-        #         ('location_id','=',i['location_id']),
-        #         ('lot_id','=', i.get('lot_id'))
-        #         ], limit=1)
-        # if len(sqrcrd) == 0:
-        #     self.create({
-        #         'product_id': i['product_id'],
-        #         'location_id': i['location_id'],
-        #         'lot_id' : i.get('lot_id'),
-        #         'quantity': -i['qty_done']
-        #         })
-        # else:
-        #     sqrcrd.write({
-        #         'quantity': sqrcrd.quantity - i['qty_done']
-        #         })
-        sqrcrd = client.execute_kw(
-            "stock.quant",
-            "search_read",
-            [
-                [
-                    ["product_id", "=", product_id],
-                    ["location_id", "=", location_id],
-                    ["lot_id", "=", lot_id],
-                ],
-                ["quantity"],
-                0,  # offset
-                1,  # limit
-            ],
-        )
-
-        if len(sqrcrd) == 0:
-            new_quantity = -i["qty_done"]
-            print(
-                f"TODO: create stock.quant entry for ORIG {product_id}/{location_id}/{lot_id} -> {new_quantity}"
-            )
-        else:
-            new_quantity = sqrcrd[0]["quantity"] - i["qty_done"]
-            print(
-                f"TODO: update stock.quant entry for ORIG {product_id}/{location_id}/{lot_id} -> {sqrcrd[0]['quantity']} => {new_quantity}"
-            )
-
-        # sqrcrd = self.search([
-        #         ('product_id','=',i['product_id']),
-        #         ('location_id','=',i['location_dest_id']),
-        #         ('lot_id','=', i.get('lot_id'))
-        #         ], limit=1)
-        # if len(sqrcrd) == 0:
-        #     self.create({
-        #         'product_id': i['product_id'],
-        #         'location_id': i['location_dest_id'],
-        #         'lot_id' : i.get('lot_id'),
-        #         'quantity': i['qty_done']
-        #         })
-        # else:
-        #     sqrcrd.write({
-        #         'quantity': sqrcrd.quantity + i['qty_done']
-        #         })
-        sqrcrd = client.execute_kw(
+
+def load_quants(location_ids):
+    rows = []
+    for i in range(0, len(location_ids), IDS_PER_QUERY):
+        for page in client.iter_search_read(
             "stock.quant",
-            "search_read",
-            [
-                [
-                    ["product_id", "=", product_id],
-                    ["location_id", "=", location_dest_id],
-                    ["lot_id", "=", lot_id],
-                ],
-                ["quantity"],
-                0,  # offset
-                1,  # limit
-            ],
-        )
-
-        if len(sqrcrd) == 0:
-            new_quantity = i["qty_done"]
-            print(
-                f"TODO: create stock.quant entry for DEST {product_id}/{location_dest_id}/{lot_id} -> {new_quantity}"
-            )
-        else:
-            new_quantity = sqrcrd[0]["quantity"] + i["qty_done"]
-            print(
-                f"TODO: update stock.quant entry for DEST {product_id}/{location_dest_id}/{lot_id} -> {sqrcrd[0]['quantity']} => {new_quantity}"
-            )
+            [["location_id", "in", location_ids[i : i + IDS_PER_QUERY]]],
+            ["product_id", "location_id", "lot_id", "quantity"],
+        ):
+            rows.extend(page)
+
+    quants = pd.DataFrame(
+        rows, columns=["id", "product_id", "location_id", "lot_id", "quantity"]
+    )
+    for column in QUANT_KEY:
+        quants[column] = quants[column].map(_many2one_id)
+    return quants
+
+
+def compute_quant_corrections(move_lines, quants, location_ids):
+    """
+    Each move line takes its quantity from (product, location, lot) and adds
+    it to (product, destination, lot). The sum per key, restricted to the
+    internal locations, is the expected quantity of the key: it is applied to
+    the first quant of the key (by id), or to a new quant when there is none,
+    and the other quants of the key are emptied. Quants without any move line
+    are expected to be empty.
+    """
+    outgoing = move_lines[["product_id", "location_id", "lot_id"]].assign(
+        expected=-move_lines["qty_done"]
+    )
+    incoming = move_lines[["product_id", "location_dest_id", "lot_id"]].rename(
+        columns={"location_dest_id": "location_id"}
+    )
+    incoming = incoming.assign(expected=move_lines["qty_done"])
+
+    expected = (
+        pd.concat([outgoing, incoming], ignore_index=True)
+        .groupby(QUANT_KEY, as_index=False)["expected"]
+        .sum()
+    )
+    expected = expected[expected["location_id"].isin(location_ids)]
+
+    quants = quants.sort_values("id").rename(columns={"id": "quant_id"})
+    first = ~quants.duplicated(QUANT_KEY, keep="first")
+    corrections = pd.concat(
+        [
+            expected.merge(quants[first], on=QUANT_KEY, how="outer"),
+            # The whole expected quantity goes to the first quant of the key
+            quants[~first].assign(expected=0.0),
+        ],
+        ignore_index=True,
+    )
+
+    corrections["action"] = corrections["quant_id"].isna().map(
+        {True: "create", False: "update"}
+    )
+    corrections["quantity"] = corrections["quantity"].fillna(0)
+    corrections["new_quantity"] = corrections["expected"].fillna(0)
+    corrections["delta"] = corrections["new_quantity"] - corrections["quantity"]
+    corrections["quant_id"] = corrections["quant_id"].astype("Int64")
+    corrections = corrections[corrections["delta"].round(6) != 0]
+
+    return corrections[
+        [
+            "action",
+            "quant_id",
+            "product_id",
+            "location_id",
+            "lot_id",
+            "quantity",
+            "delta",
+            "new_quantity",
+        ]
+    ].sort_values(
+        ["action", "product_id", "location_id", "quant_id"], ignore_index=True
+    )
+
+
+def apply_balance_qty():
+    """
+    Apply the corrections to the quants.
+
+    The corrections are computed once and saved to a plan file, and the chunks
+    written are recorded in a journal: running it again after an interruption
+    resumes from the plan instead of recomputing it against quants already
+    corrected. Each quant gets its own expected quantity, so the updates are
+    one `write` per quant; only the creations are sent in chunks.
+    """
+    plan = f"balance_quants_{date.today()}.csv"
+    if os.path.exists(plan):
+        print(f"Resuming from {plan}")
+        corrections = pd.read_csv(plan, dtype={"quant_id": "Int64"})
+    else:
+        corrections = action_balance_qty()
+        corrections.to_csv(plan, index=False)
+    print_corrections(corrections)
+
+    journal = plan.replace(".csv", ".jsonl")
+    updates = corrections[corrections["action"] == "update"]
+    client.bulk_write(
+        "stock.quant",
+        {
+            int(row.quant_id): {"quantity": float(row.new_quantity)}
+            for row in updates.itertuples()
+        },
+        journal=journal,
+    )
+
+    creates = corrections[corrections["action"] == "create"]
+    client.bulk_create(
+        "stock.quant",
+        [
+            {
+                "product_id": int(row.product_id),
+                "location_id": int(row.location_id),
+                "lot_id": int(row.lot_id) or False,
+                "quantity": float(row.new_quantity),
+            }
+            for row in creates.itertuples()
+        ],
+        journal=journal,
+    )
+
+
+def print_corrections(corrections):
+    counts = corrections["action"].value_counts()
+    print(
+        f"{counts.get('create', 0)} stock.quant to create, "
+        f"{counts.get('update', 0)} to update"
+    )
+    if not corrections.empty:
+        print(corrections.to_string(index=False))
+
+
+def _many2one_id(value):
+    # Empty many2one (no lot) as 0 so it can be grouped on and saved to CSV
+    return value[0] if value else 0
 
 
 if __name__ == "__main__":
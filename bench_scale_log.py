@@ -0,0 +1,639 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+"""
+Benchmark and golden-output harness of the scale file generation.
+
+    python bench_scale_log.py render [nb_products]
+    python bench_scale_log.py stages [nb_products ...]
+    python bench_scale_log.py record payloads.json
+    python bench_scale_log.py golden payloads.json golden_dir [--update]
+
+`render` compares the compiled rendering of a synthetic catalogue with a
+per-field baseline interpreting the product lines for every product. `stages`
+replays a synthetic catalogue through `generate_files` and reports the fetch,
+compute and write timings. `record` saves the Odoo payloads read for the
+unsent logs, and `golden` replays them and checks the generated files are
+byte-identical to the golden copies (`--update` rewrites them). The tests
+replay the payloads of tests/fixtures/scale_log the same way.
+"""
+
+import scale_log
+from scale_log import OdooScaleLogClient, ScaleFileWriter
+from datetime import datetime
+import argparse
+import filecmp
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+
+PRODUCT_LINES = [
+    {"id": 1, "type": "id", "delimiter": ","},
+    {
+        "id": 2,
+        "type": "text",
+        "field_name": "name",
+        "delimiter": ",",
+        "multiline_length": 24,
+        "multiline_separator": "|",
+    },
+    {
+        "id": 3,
+        "type": "numeric",
+        "field_name": "list_price",
+        "delimiter": ",",
+        "numeric_coefficient": 100,
+        "numeric_round": 1,
+    },
+    {
+        "id": 4,
+        "type": "many2one",
+        "field_name": "categ_id",
+        "related_model": "product.category",
+        "related_field_name": "name",
+        "delimiter": ",",
+    },
+    {"id": 5, "type": "external_text", "field_name": "ingredients", "delimiter": ","},
+    {"id": 6, "type": "constant", "constant_value": "1", "delimiter": ","},
+    {"id": 7, "type": "external_constant", "constant_value": "Bio", "delimiter": ","},
+    {
+        "id": 8,
+        "type": "many2many",
+        "field_name": "label_ids",
+        "related_model": "product.label",
+        "related_field_name": "code",
+        "x2many_range": 1,
+        "delimiter": ",",
+    },
+    {"id": 9, "type": "product_image", "field_name": "image", "suffix": ".PNG"},
+]
+
+SCALE_SYSTEM = {"id": 1, "encoding": "iso-8859-1"}
+
+# Fields of the product lines, as read from `ir.model.fields`
+LINE_FIELDS = {
+    "name": ("product.product", False),
+    "list_price": ("product.product", False),
+    "categ_id": ("product.product", "product.category"),
+    "ingredients": ("product.product", False),
+    "label_ids": ("product.product", "product.label"),
+    "image": ("product.product", False),
+    "code": ("product.label", False),
+}
+
+# Fixed generation date, so the file names do not depend on the run
+FROZEN_NOW = datetime(2025, 1, 1, 12, 0, 0)
+
+
+class NoOdoo:
+    """Odoo stand-in for the benchmark, where nothing must be fetched"""
+
+    def execute_kw(self, model, method, params, kwargs=None):
+        raise RuntimeError(f"Unexpected call {model}.{method}")
+
+
+class ReplayOdoo:
+    """
+    Local stand-in of `Odoo.execute_kw` answering `search`, `search_read`,
+    `read` and `write` from recorded payloads ({model: [records]}).
+    """
+
+    def __init__(self, payloads):
+        self.records = {
+            model: {record["id"]: dict(record) for record in records}
+            for model, records in payloads.items()
+        }
+        self.calls = 0
+        self.fetch_time = 0.0
+        self._cache = {}
+
+    def _check_cache(self, key):
+        return self._cache.get(key)
+
+    def _set_cache(self, key, value, expire=None):
+        self._cache[key] = value
+
+    def execute_kw(self, model, method, params, kwargs=None):
+        start = time.perf_counter()
+        try:
+            return self._execute(model, method, params, kwargs or {})
+        finally:
+            self.calls += 1
+            self.fetch_time += time.perf_counter() - start
+
+    def _execute(self, model, method, params, kwargs):
+        records = self.records.get(model, {})
+
+        if method == "write":
+            for record_id in params[0]:
+                if record_id in records:
+                    records[record_id].update(params[1])
+            return True
+
+        if method == "read":
+            found = [records[i] for i in params[0] if i in records]
+            fields = params[1] if len(params) > 1 else None
+        else:
+            found = ReplayOdoo._search(records, params[0])
+            if kwargs.get("order"):
+                for key in reversed(kwargs["order"].split(",")):
+                    found.sort(key=lambda r, k=key.strip(): r.get(k) or "")
+            if method == "search":
+                return [record["id"] for record in found]
+            fields = params[1] if len(params) > 1 else kwargs.get("fields")
+
+        if not fields:
+            return [dict(record) for record in found]
+        return [
+            {"id": record["id"], **{f: record.get(f, False) for f in fields}}
+            for record in found
+        ]
+
+    def _search(records, domain):
+        found = None
+        for field, operator, value in domain:
+            if field == "id" and operator == "in":
+                ids = [i for i in value if i in records]
+                found = [records[i] for i in dict.fromkeys(ids)]
+        if found is None:
+            found = list(records.values())
+
+        for field, operator, value in domain:
+            if field == "id" and operator == "in":
+                continue
+            found = [r for r in found if ReplayOdoo._match(r, field, operator, value)]
+        return found
+
+    def _match(record, field, operator, value):
+        current = record.get(field, False)
+        if isinstance(current, list) and operator in ("=", "!="):
+            current = current[0] if current else False
+        if operator == "=":
+            return current == value
+        if operator == "!=":
+            return current != value
+        if operator == "in":
+            return current in value
+        if operator == ">=":
+            return current >= value
+        if operator == ">":
+            return current > value
+        if operator == "<=":
+            return current <= value
+        if operator == "<":
+            return current < value
+        raise ValueError(f"Unsupported operator {operator}")
+
+
+class RecordingOdoo:
+    """
+    Wrapper of `Odoo` keeping every record read, to be replayed by
+    `ReplayOdoo`. Nothing is written to Odoo and the cache is bypassed so the
+    scale system configuration is read too.
+    """
+
+    def __init__(self, client):
+        self.client = client
+        self.payloads = {}
+
+    def _check_cache(self, key):
+        return None
+
+    def _set_cache(self, key, value, expire=None):
+        pass
+
+    def execute_kw(self, model, method, params, kwargs=None):
+        if method not in ("read", "search", "search_read"):
+            raise RuntimeError(f"Refusing to record {model}.{method}")
+
+        result = self.client.execute_kw(model, method, params, kwargs)
+
+        # Keep the fields searched on, so the same search can be replayed (a
+        # field searched as set is kept as True, e.g. an image)
+        searched = {}
+        for field, operator, value in params[0] if method != "read" else []:
+            if operator == "=":
+                searched[field] = value
+            elif operator == "!=" and value is False:
+                searched[field] = True
+
+        records = self.payloads.setdefault(model, {})
+        for record in result or []:
+            if method == "search":
+                record = {"id": record}
+            record = {**searched, **record}
+            records.setdefault(record["id"], {}).update(record)
+        return result
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            payloads = {
+                model: list(records.values())
+                for model, records in self.payloads.items()
+            }
+            json.dump(payloads, f, indent=1, sort_keys=True)
+
+
+class FrozenDatetime(datetime):
+    @classmethod
+    def now(cls, tz=None):
+        return FROZEN_NOW
+
+
+class TimedScaleFileWriter(ScaleFileWriter):
+    """ScaleFileWriter accumulating the time spent writing the files"""
+
+    write_time = 0.0
+
+    def write(self, text):
+        start = time.perf_counter()
+        super().write(text)
+        TimedScaleFileWriter.write_time += time.perf_counter() - start
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        start = time.perf_counter()
+        result = super().__exit__(exc_type, exc_value, traceback)
+        TimedScaleFileWriter.write_time += time.perf_counter() - start
+        return result
+
+
+def synthetic_catalogue(nb_products, seed=42):
+    rnd = random.Random(seed)
+    products = []
+    logs = []
+    for product_id in range(1, nb_products + 1):
+        products.append(
+            {
+                "id": product_id,
+                "name": f"PRODUIT {product_id} " + "X" * rnd.randint(0, 40),
+                "list_price": round(rnd.uniform(0, 50), 2),
+                "categ_id": [rnd.randint(1, 50), "Catégorie"],
+                "ingredients": "Eau, sel, farine" if rnd.random() < 0.5 else False,
+                "label_ids": rnd.sample(range(1, 10), rnd.randint(0, 3)),
+                "image": "iVBORw0KGgo=" if rnd.random() < 0.3 else False,
+                "scale_group_id": [1, "Groupe"],
+                "product_tmpl_id": [product_id, "Produit"],
+                "write_date": "2025-01-01 00:00:00",
+            }
+        )
+        logs.append(
+            {
+                "id": product_id,
+                "action": rnd.choice(["create", "write", "unlink"]),
+                "product_id": [product_id, "Produit"],
+                "scale_system_id": [1, "Balance"],
+                "scale_group_external_identity": "1",
+            }
+        )
+
+    related = {
+        ("product.category", "name"): {i: f"CATEG {i}" for i in range(1, 51)},
+        ("product.label", "code"): {i: f"L{i}" for i in range(1, 10)},
+    }
+    return products, logs, related
+
+
+def synthetic_payloads(nb_products, seed=42):
+    """Recorded-like Odoo payloads of the synthetic catalogue"""
+    products, logs, related = synthetic_catalogue(nb_products, seed)
+
+    field_ids = {name: i for i, name in enumerate(LINE_FIELDS, start=1)}
+    fields = [
+        {"id": field_ids[name], "name": name, "model": model, "relation": relation}
+        for name, (model, relation) in LINE_FIELDS.items()
+    ]
+
+    product_lines = []
+    for line in PRODUCT_LINES:
+        line = dict(line, scale_system_id=[1, "Balance"], write_date="2025-01-01")
+        field_name = line.pop("field_name", None)
+        related_field_name = line.pop("related_field_name", None)
+        line.pop("related_model", None)
+        line["field_id"] = [field_ids[field_name], field_name] if field_name else False
+        line["related_field_id"] = (
+            [field_ids[related_field_name], related_field_name]
+            if related_field_name
+            else False
+        )
+        product_lines.append(line)
+
+    scale_system = dict(
+        SCALE_SYSTEM,
+        product_text_file_pattern="PLU_%Y%m%d_%H%M%S.txt",
+        external_text_file_pattern="TXT_%Y%m%d_%H%M%S.txt",
+        send_images=False,
+        write_date="2025-01-01",
+    )
+
+    for i, log in enumerate(logs):
+        log.pop("scale_group_external_identity", None)
+        log["log_date"] = (
+            f"2025-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}"
+        )
+        log["sent"] = False
+
+    return {
+        "product.scale.log": logs,
+        "product.scale.system": [scale_system],
+        "product.scale.system.product.line": product_lines,
+        "ir.model.fields": fields,
+        "product.product": products,
+        # The images are stored on the templates
+        "product.template": [
+            {
+                "id": product["id"],
+                "image": product["image"],
+                "write_date": "2025-01-01 00:00:00",
+            }
+            for product in products
+        ],
+        "product.scale.group": [{"id": 1, "external_identity": "1"}],
+        "product.category": [
+            {"id": i, "name": name}
+            for i, name in related[("product.category", "name")].items()
+        ],
+        "product.label": [
+            {"id": i, "code": code}
+            for i, code in related[("product.label", "code")].items()
+        ],
+    }
+
+
+def generate(payloads, output_folder):
+    """
+    Run `generate_files` on the payloads, with a frozen date
+
+    Returns:
+        dict: calls, fetch, compute, write and total timings
+    """
+    odoo = ReplayOdoo(payloads)
+    client = OdooScaleLogClient(client=odoo)
+
+    TimedScaleFileWriter.write_time = 0.0
+    patched = {"datetime": FrozenDatetime, "ScaleFileWriter": TimedScaleFileWriter}
+    originals = {name: getattr(scale_log, name) for name in patched}
+    for name, value in patched.items():
+        setattr(scale_log, name, value)
+    try:
+        start = time.perf_counter()
+        client.generate_files(output_folder)
+        total = time.perf_counter() - start
+    finally:
+        for name, value in originals.items():
+            setattr(scale_log, name, value)
+
+    return {
+        "calls": odoo.calls,
+        "fetch": odoo.fetch_time,
+        "compute": total - odoo.fetch_time - TimedScaleFileWriter.write_time,
+        "write": TimedScaleFileWriter.write_time,
+        "total": total,
+    }
+
+
+def check_golden(payloads, golden_dir, update=False):
+    """
+    Compare the files generated from the payloads with the golden copies,
+    byte for byte. With `update`, the golden copies are replaced instead.
+    """
+    with tempfile.TemporaryDirectory() as output_folder:
+        generate(payloads, output_folder)
+
+        if update:
+            shutil.rmtree(golden_dir, ignore_errors=True)
+            shutil.copytree(output_folder, golden_dir)
+            print(f"Updated golden files in {golden_dir}")
+            return True
+
+        generated = sorted(os.listdir(output_folder))
+        golden = sorted(os.listdir(golden_dir))
+        (match, mismatch, errors) = filecmp.cmpfiles(
+            output_folder,
+            golden_dir,
+            sorted(set(generated) | set(golden)),
+            shallow=False,
+        )
+
+    for name in mismatch:
+        print(f"  differs: {name}")
+    for name in errors:
+        print(f"  missing: {name}")
+    ok = not mismatch and not errors
+    print(f"{len(match)} files identical, {'OK' if ok else 'FAILED'}")
+    return ok
+
+
+def bench_stages(sizes, repeat=3):
+    print(
+        f"{'products':>9} {'calls':>6} {'fetch':>8} "
+        f"{'compute':>8} {'write':>8} {'total':>8}"
+    )
+    for nb_products in sizes:
+        payloads = synthetic_payloads(nb_products)
+        timings = []
+        for _ in range(repeat):
+            with tempfile.TemporaryDirectory() as output_folder:
+                timings.append(generate(payloads, output_folder))
+        best = min(timings, key=lambda t: t["total"])
+        print(
+            f"{nb_products:>9} {best['calls']:>6} {best['fetch']:>7.3f}s "
+            f"{best['compute']:>7.3f}s {best['write']:>7.3f}s {best['total']:>7.3f}s"
+        )
+
+
+def record(path):
+    client = OdooScaleLogClient()
+    recorder = RecordingOdoo(client.client)
+    client.client = recorder
+    with tempfile.TemporaryDirectory() as output_folder:
+        client.generate_files(output_folder)
+    recorder.save(path)
+    nb_records = sum(len(records) for records in recorder.payloads.values())
+    print(f"Recorded {nb_records} records to {path}")
+
+
+def best_of(repeat, func):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def clean_value(value, product_line):
+    """Baseline cleaning of a value, see OdooScaleLogClient._compile_clean"""
+    if not value:
+        return ""
+    res = str(value)
+    if product_line.get("multiline_length"):
+        length = product_line["multiline_length"]
+        separator = product_line.get("multiline_separator") or ""
+        res = separator.join(res[i : i + length] for i in range(0, len(res), length))
+    if product_line.get("delimiter"):
+        return res.replace(product_line["delimiter"], "")
+    return res
+
+
+def interpret_product_lines(client, log, product, scale_system, product_lines, related):
+    """
+    Baseline rendering interpreting the product lines configuration field by
+    field for every product, as generate_files did before they were compiled
+    """
+    product_text = client._ACTION_MAPPING[log["action"]] + client._DELIMITER
+    external_texts = []
+
+    def external_text(value, product_line, external_id):
+        return client._EXTERNAL_TEXT_DELIMITER.join(
+            [
+                client._EXTERNAL_TEXT_ACTION_CODE,
+                log["scale_group_external_identity"],
+                external_id,
+                clean_value(value, product_line),
+            ]
+        )
+
+    for product_line in product_lines:
+        field_name = product_line.get("field_name")
+        value = product.get(field_name) if field_name else None
+        line_type = product_line["type"]
+
+        if line_type == "id":
+            product_text += str(product["id"])
+        elif line_type == "numeric":
+            numeric_value = float(value) if value else 0.0
+            coefficient = product_line.get("numeric_coefficient", 1.0)
+            rounding = product_line.get("numeric_round", 1.0)
+            value = client._float_round(numeric_value * coefficient, rounding)
+            product_text += str(value).replace(".0", "")
+        elif line_type == "text":
+            product_text += clean_value(value, product_line)
+        elif line_type == "external_text":
+            external_id = str(product["id"]) + str(product_line["id"]).rjust(
+                client._EXTERNAL_SIZE_ID_RIGHT, "0"
+            )
+            external_texts.append(external_text(value, product_line, external_id))
+            product_text += external_id
+        elif line_type == "constant":
+            product_text += clean_value(
+                product_line.get("constant_value", ""), product_line
+            )
+        elif line_type == "external_constant":
+            external_id = str(product_line["id"])
+            external_texts.append(
+                external_text(
+                    product_line.get("constant_value", ""), product_line, external_id
+                )
+            )
+            product_text += external_id
+        elif line_type == "many2one":
+            if value and isinstance(value, list):
+                if not product_line.get("related_field_name"):
+                    product_text += str(value[0])
+                else:
+                    related_value = client._related_value(
+                        product_line, value[0], related
+                    )
+                    if related_value is not None:
+                        product_text += str(related_value)
+        elif line_type == "many2many":
+            x2many_range = product_line.get("x2many_range", 1)
+            if value and isinstance(value, list) and x2many_range <= len(value):
+                item_id = value[x2many_range - 1]
+                if product_line.get("related_field_name"):
+                    item_value = client._related_value(product_line, item_id, related)
+                    if item_value is not None:
+                        product_text += clean_value(item_value, product_line)
+                else:
+                    product_text += str(item_id)
+        elif line_type == "product_image":
+            extension = product_line.get("suffix", ".PNG")
+            product_text += client._generate_image_file_name(
+                product["id"], value, extension
+            )
+
+        if product_line.get("delimiter"):
+            product_text += product_line["delimiter"]
+
+    encoding = scale_system.get("encoding", "utf-8")
+    break_line = client._ENCODING_MAPPING.get(encoding, "\n")
+    return {
+        "product_text": product_text + break_line,
+        "external_text": (
+            break_line.join(external_texts) + break_line if external_texts else ""
+        ),
+    }
+
+
+def bench_render(nb_products, repeat=3):
+    scale_log = OdooScaleLogClient(client=NoOdoo())
+    products, logs, related = synthetic_catalogue(nb_products)
+
+    def interpret():
+        return [
+            interpret_product_lines(
+                scale_log, log, product, SCALE_SYSTEM, PRODUCT_LINES, related
+            )
+            for log, product in zip(logs, products)
+        ]
+
+    def compile_and_render():
+        render = scale_log._compile_product_lines(
+            SCALE_SYSTEM, PRODUCT_LINES, related
+        )
+        return [render(log, product) for log, product in zip(logs, products)]
+
+    (interpreted_time, interpreted) = best_of(repeat, interpret)
+    (compiled_time, compiled) = best_of(repeat, compile_and_render)
+
+    if interpreted != compiled:
+        raise AssertionError("Compiled rendering differs from the baseline")
+
+    print(f"{nb_products} products")
+    print(f"  per-field baseline    : {interpreted_time:.3f}s")
+    print(f"  _compile_product_lines: {compiled_time:.3f}s")
+    print(f"  speed-up              : x{interpreted_time / compiled_time:.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    render = commands.add_parser("render")
+    render.add_argument("nb_products", type=int, nargs="?", default=50000)
+
+    stages = commands.add_parser("stages")
+    stages.add_argument(
+        "sizes", type=int, nargs="*", default=[100, 1000, 10000, 100000]
+    )
+
+    record_parser = commands.add_parser("record")
+    record_parser.add_argument("payloads")
+
+    golden = commands.add_parser("golden")
+    golden.add_argument("payloads")
+    golden.add_argument("golden_dir")
+    golden.add_argument("--update", action="store_true")
+
+    args = parser.parse_args()
+    if args.command != "record":
+        logging.getLogger(scale_log.__name__).setLevel(logging.WARNING)
+
+    if args.command == "render":
+        bench_render(args.nb_products)
+    elif args.command == "stages":
+        bench_stages(args.sizes)
+    elif args.command == "record":
+        record(args.payloads)
+    elif args.command == "golden":
+        with open(args.payloads, "r", encoding="utf-8") as f:
+            payloads = json.load(f)
+        if not check_golden(payloads, args.golden_dir, args.update):
+            raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,11 +1,13 @@
-import logging, os, pandas as pd, sqlalchemy as sa, sys
+import logging, os, pandas as pd, sys
 
 from datetime import datetime
 from dateutil.relativedelta import relativedelta
-from dotenv import load_dotenv
+from otsokop.dates import iterate_months
 from otsokop.odoo import Odoo
-from sqlalchemy import inspect, VARCHAR
-from sqlalchemy.sql import text
+from otsokop.reconcile import delete_pos_orders, reconcile_months
+from otsokop.rollups import update_sales_rollups
+from otsokop.warehouse import Warehouse
+from sqlalchemy import VARCHAR
 
 start_date = "2021-01-01"
 end_date = "2026-02-28"
@@ -13,15 +15,16 @@ end_date = "2026-02-28"
 INCLUDE_PRODUCT_TEMPLATE = False # FIXME True
 INCLUDE_PRODUCT_PRICE_HISTORY = False
 
-client = Odoo()
-engine = sa.create_engine(os.getenv("MYSQL_ENGINE"))
+# Stream the biggest monthly tables page by page instead of loading (and
+# caching) whole months in memory.
+STREAMING = True
+STREAM_PAGE_SIZE = 5000
 
+# Compare each loaded month with Odoo once the dump is done
+VERIFY = True
 
-def iterate_months(start_date, end_date):
-    current_date = start_date.replace(day=1)
-    while current_date <= end_date:
-        yield current_date
-        current_date += relativedelta(months=1)
+client = Odoo()
+warehouse = Warehouse()
 
 
 def dump_mysql(df, table_name, dtype=None):
@@ -30,87 +33,64 @@ def dump_mysql(df, table_name, dtype=None):
 
     logging.info(f"Export `{table_name}` table...")
 
-    df.to_sql(name=table_name, con=engine, if_exists="append", index=False, dtype=dtype)
-
-
-def truncate_tables():
-    with engine.connect() as connection:
-        with connection.begin():
-            inspector = inspect(engine)
-            table_names = inspector.get_table_names()
-
-            connection.execute(text("SET FOREIGN_KEY_CHECKS=0"))
-            for table in table_names:
-                connection.execute(text(f"DROP TABLE {table}"))
-            connection.execute(text("SET FOREIGN_KEY_CHECKS=1"))
-
-
-def add_constraints():
-    inspector = inspect(engine)
-
-    tables_to_alter = {}
-    all_tables = inspector.get_table_names()
-
-    for table_name in all_tables:
-        columns = inspector.get_columns(table_name)
-        pk_exists = inspector.get_pk_constraint(table_name).get("constrained_columns")
-
-        needs_pk = not pk_exists and any(col["name"] == "id" for col in columns)
-
-        potential_fks = []
-        for col in columns:
-            col_name = col["name"]
-            if col_name.endswith("_id") and col_name != "id":
-                referenced_table = col_name[:-3]  # Remove '_id' suffix
-                if referenced_table in all_tables:
-                    potential_fks.append((col_name, referenced_table))
-                else:
-                    logging.info(f"No FK for `{col_name}` in `{table_name}`")
-
-        if needs_pk or potential_fks:
-            tables_to_alter[table_name] = {
-                "needs_pk": needs_pk,
-                "potential_fks": potential_fks,
-            }
-
-    with engine.begin() as conn:
-        # First loop to add PK
-        for table_name, info in tables_to_alter.items():
-            if info["needs_pk"]:
-                try:
-                    conn.execute(
-                        text(f"ALTER TABLE `{table_name}` ADD PRIMARY KEY (`id`);")
-                    )
-                    logging.info(f"Added PK to `{table_name}`")
-                except Exception as e:
-                    logging.error(f"Could not add PK to `{table_name}`: {e}")
-
-        # Second loop to add FK
-        for table_name, info in tables_to_alter.items():
-            for fk_col, ref_table in info["potential_fks"]:
-                try:
-                    constraint_name = f"fk_{table_name}_{ref_table}"
-                    conn.execute(
-                        text(
-                            f"""
-                        ALTER TABLE `{table_name}` 
-                        ADD CONSTRAINT `{constraint_name}` 
-                        FOREIGN KEY (`{fk_col}`) 
-                        REFERENCES `{ref_table}`(`id`);
-                    """
-                        )
-                    )
-                    logging.info(
-                        f"Added FK `{fk_col}` to `{table_name}` referencing `{ref_table}`"
-                    )
-                except Exception as e:
-                    logging.error(
-                        f"Could not add foreign key `{fk_col}` to `{table_name}`: {e}"
-                    )
-
-
-def execute_sql(conn, sql):
-    conn.execute(text(sql))
+    warehouse.append(df, table_name, dtype)
+
+
+def dump_mysql_stream(frames, table_name, dtype=None):
+    logging.info(f"Stream `{table_name}` table...")
+
+    rows = 0
+    for df in frames:
+        warehouse.append(df, table_name, dtype)
+        rows += len(df)
+
+    logging.info(f"Exported {rows} rows to `{table_name}`")
+
+
+def dump_pos_orders(month_date, end):
+    df = client.get_pos_orders(month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
+    details = df[1]
+    details = details.drop("product_name", axis=1)
+    details = details.drop("date_order", axis=1)
+    details = details.rename(columns={"order_id": "pos_order_id"})
+    dump_mysql(details, "pos_order_detail")
+
+    df = df[0].drop("lines", axis=1)
+    df = df.drop("partner_name", axis=1)
+    dump_mysql(df, "pos_order")
+    update_sales_rollups(warehouse, month_date, end)
+
+
+def verify(start_date, end_date, reload=True):
+    """
+    Check the `pos_order` and `pos_order_detail` tables against Odoo, month
+    by month, and reload only the months that do not match.
+    """
+    if isinstance(start_date, str):
+        start_date = datetime.strptime(start_date, "%Y-%m-%d")
+        end_date = datetime.strptime(end_date, "%Y-%m-%d")
+
+    months = list(iterate_months(start_date, end_date))
+    report = reconcile_months(client, warehouse, months)
+    mismatches = report[~report["ok"]]
+    logging.info(f"{len(months) - len(mismatches)}/{len(months)} months verified")
+
+    if not reload or mismatches.empty:
+        return report
+
+    for month_date in months:
+        if month_date.strftime("%Y-%m") not in mismatches["month"].values:
+            continue
+
+        logging.info(f"Reloading {month_date.strftime('%Y-%m')}...")
+        delete_pos_orders(warehouse, client, month_date)
+        dump_pos_orders(month_date, month_date + relativedelta(months=1, days=-1))
+
+    return reconcile_months(
+        client,
+        warehouse,
+        [m for m in months if m.strftime("%Y-%m") in mismatches["month"].values],
+    )
 
 
 def main(start_date, end_date):
@@ -118,7 +98,7 @@ def main(start_date, end_date):
     end_date = datetime.strptime(end_date, "%Y-%m-%d")
 
     logging.info("Dropping existing tables...")
-    truncate_tables()
+    warehouse.drop_tables()
 
     df = pd.read_csv("resources/racks.tsv", sep="\t")
     dump_mysql(df, "product_rack", {"code": VARCHAR(25)})
@@ -188,18 +168,7 @@ def main(start_date, end_date):
             f"Fetching data from {month_date.strftime('%Y-%m-%d')} to {end.strftime('%Y-%m-%d')}..."
         )
 
-        df = client.get_pos_orders(
-            month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
-        )
-        details = df[1]
-        details = details.drop("product_name", axis=1)
-        details = details.drop("date_order", axis=1)
-        details = details.rename(columns={"order_id": "pos_order_id"})
-        dump_mysql(details, "pos_order_detail")
-
-        df = df[0].drop("lines", axis=1)
-        df = df.drop("partner_name", axis=1)
-        dump_mysql(df, "pos_order")
+        dump_pos_orders(month_date, end)
 
         df = client.get_purchase_orders(
             month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
@@ -226,21 +195,47 @@ def main(start_date, end_date):
         invoices[1] = invoices[1].rename(columns={"invoice_id": "account_invoice_id"})
         dump_mysql(invoices[1], "account_invoice_line")
 
-        account_move_line = client.get_account_move_lines(
-            month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
-        )
-        dump_mysql(account_move_line, "account_move_line")
+        if STREAMING:
+            dump_mysql_stream(
+                client.iter_account_move_lines(
+                    month_date.strftime("%Y-%m-%d"),
+                    end.strftime("%Y-%m-%d"),
+                    STREAM_PAGE_SIZE,
+                ),
+                "account_move_line",
+            )
+            dump_mysql_stream(
+                client.iter_stock_moves(
+                    month_date.strftime("%Y-%m-%d"),
+                    end.strftime("%Y-%m-%d"),
+                    STREAM_PAGE_SIZE,
+                ),
+                "stock_move",
+            )
+            dump_mysql_stream(
+                client.iter_stock_move_lines(
+                    month_date.strftime("%Y-%m-%d"),
+                    end.strftime("%Y-%m-%d"),
+                    STREAM_PAGE_SIZE,
+                ),
+                "stock_move_line",
+            )
+        else:
+            account_move_line = client.get_account_move_lines(
+                month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+            )
+            dump_mysql(account_move_line, "account_move_line")
 
-        stock_move = client.get_stock_moves(
-            month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
-        )
-        # stock_move = stock_move.rename(columns={"picking_type_id", "stock_picking_type_id"})
-        dump_mysql(stock_move, "stock_move")
+            stock_move = client.get_stock_moves(
+                month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+            )
+            # stock_move = stock_move.rename(columns={"picking_type_id", "stock_picking_type_id"})
+            dump_mysql(stock_move, "stock_move")
 
-        stock_move_line = client.get_stock_move_lines(
-            month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
-        )
-        dump_mysql(stock_move_line, "stock_move_line")
+            stock_move_line = client.get_stock_move_lines(
+                month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
+            )
+            dump_mysql(stock_move_line, "stock_move_line")
 
         result = client.get_product_history(
             month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
@@ -253,78 +248,41 @@ def main(start_date, end_date):
             month_date.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d"))
         dump_mysql(product_price_history, "product_price_history")
 
-    add_constraints()
-
-    # manual FK
-    with engine.begin() as conn:
-
-        execute_sql( conn, "DROP VIEW product_loss IF EXISTS")
-        execute_sql(
-            conn,
-            """
-            CREATE VIEW product_loss AS
-            SELECT
-                sm.date_expected,
-                sm.stock_location_id,
-                sm.product_id,
-                sm.product_qty,
-                sm.price_unit
-            FROM
-                stock_move sm
-            INNER JOIN stock_picking_type sp ON
-                sm.stock_picking_type_id = sp.id
-                AND sp.name = 'Pertes'
-            INNER JOIN stock_location sld ON
-                sm.dest_stock_location_id = sld.id
-            WHERE
-                state = 'done'
-                AND sld.name = 'Inventory loss'
-            """
-        )
-        execute_sql(
-            conn,
-            "ALTER TABLE stock_move_line ADD CONSTRAINT fk_stock_move_line_location_dest_id FOREIGN KEY (dest_stock_location_id)  REFERENCES stock_location(id)",
-        )
-        execute_sql(
-            conn,
-            "ALTER TABLE stock_move ADD CONSTRAINT fk_stock_move_location_dest_id FOREIGN KEY (dest_stock_location_id)  REFERENCES stock_location(id)",
-        )
+    warehouse.add_constraints()
 
-        execute_sql(conn, "ALTER TABLE product_rack ADD PRIMARY KEY (code)")
-        execute_sql(
-            conn,
-            "ALTER TABLE product ADD CONSTRAINT fk_product_coeff1 FOREIGN KEY (coeff1_id) REFERENCES product_coefficient(id)",
-        )
-        execute_sql(
-            conn,
-            "ALTER TABLE product ADD CONSTRAINT fk_product_coeff2 FOREIGN KEY (coeff2_id) REFERENCES product_coefficient(id)",
-        )
-        execute_sql(
-            conn,
-            "ALTER TABLE product ADD CONSTRAINT fk_product_coeff3 FOREIGN KEY (coeff3_id) REFERENCES product_coefficient(id)",
-        )
-        execute_sql(
-            conn,
-            "ALTER TABLE product ADD CONSTRAINT fk_product_coeff4 FOREIGN KEY (coeff4_id) REFERENCES product_coefficient(id)",
-        )
-        execute_sql(
-            conn,
-            "ALTER TABLE product ADD CONSTRAINT fk_product_coeff5 FOREIGN KEY (coeff5_id) REFERENCES product_coefficient(id)",
+    # manual keys
+    warehouse.create_views()
+    warehouse.add_foreign_key(
+        "stock_move_line",
+        "dest_stock_location_id",
+        "stock_location",
+        name="fk_stock_move_line_location_dest_id",
+    )
+    warehouse.add_foreign_key(
+        "stock_move",
+        "dest_stock_location_id",
+        "stock_location",
+        name="fk_stock_move_location_dest_id",
+    )
+    warehouse.add_primary_key("product_rack", "code")
+    for i in range(1, 6):
+        warehouse.add_foreign_key(
+            "product",
+            f"coeff{i}_id",
+            "product_coefficient",
+            name=f"fk_product_coeff{i}",
         )
-        # execute_sql(conn, "ALTER TABLE product ADD CONSTRAINT fk_fiscal_classif FOREIGN KEY (fiscal_classification_id) REFERENCES account_fiscal_classification(id)")
-
-        # execute_sql(
-        #     conn,
-        #     "ALTER TABLE product ADD CONSTRAINT fk_product_rack FOREIGN KEY (product_rack_code) REFERENCES product_rack(code)",
-        # )
+    # warehouse.add_foreign_key("product", "fiscal_classification_id", "account_fiscal_classification", name="fk_fiscal_classif")
+    # warehouse.add_foreign_key("product", "product_rack_code", "product_rack", "code", name="fk_product_rack")
+    # warehouse.add_foreign_key("category", "parent_id", "category", name="fk_category_parent_id")
 
-        # conn.execute(
-        #     text(
-        #         "ALTER TABLE category ADD CONSTRAINT fk_category_parent_id FOREIGN KEY (parent_id)  REFERENCES category(id)"
-        #     )
-        # )
+    if VERIFY:
+        verify(start_date, end_date)
 
     logging.info("Dump complete")
+    if warehouse.is_embedded:
+        return
+
     logging.info(
         f"""Create a SQL dump with the following command:
     mysqldump --skip-lock-tables --routines --add-drop-table --disable-keys --extended-insert -u {os.getenv('MYSQL_USERNAME')}  -p{os.getenv('MYSQL_PASSWORD')} --host={os.getenv('MYSQL_HOST')} --port={os.getenv('MYSQL_PORT')} --protocol tcp {os.getenv('MYSQL_DATABASE')} | gzip -c > /tmp/{os.getenv('MYSQL_DATABASE')}.sql.gz
@@ -334,4 +292,7 @@ def main(start_date, end_date):
 
 
 if __name__ == "__main__":
-    sys.exit(main(start_date, end_date))
+    if len(sys.argv) >= 2 and sys.argv[1] == "verify":
+        verify(start_date, end_date)
+    else:
+        sys.exit(main(start_date, end_date))
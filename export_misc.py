@@ -99,29 +99,19 @@ def update_fiscal_classification():
 
 def update_to_print(model_name="product.product"):
     print(f"Resetting to_print field in {model_name}...")
-    product_ids = []
     # reset to_print field for all products and product variants
-    products = client.execute_kw(
+    product_ids = client.execute_kw(
         model_name,
-        "search_read",
+        "search",
         [
             [
                 ["to_print", "=", True],
             ],
-            [],
         ],
     )
-    for p in products:
-        product_ids.append(p["id"])
 
-    # Revert fiscal classification to the correct one
-    update = client.execute_kw(
-        model_name,
-        "write",
-        [
-            product_ids,
-            {"to_print": False},
-        ],
+    update = client.bulk_write(
+        model_name, dict.fromkeys(product_ids, {"to_print": False})
     )
 
     print(f"Updated {model_name} to_print: {update}")
@@ -144,7 +134,7 @@ def drop_keys(month):
 
 
 def product_list():
-    products = client.get_all_products()
+    products = client.get_products()
     products.to_csv("output/products.csv", index=False)
 
 
@@ -0,0 +1,31 @@
+from datetime import datetime
+from otsokop.dates import iterate_months
+from otsokop.lake import ParquetLake
+from otsokop.odoo import Odoo
+import logging
+import sys
+
+start_date = "2021-01-01"
+end_date = "2026-02-28"
+
+LAKE_ROOT = "lake"
+
+client = Odoo()
+
+
+def main(start_date, end_date):
+    start_date = datetime.strptime(start_date, "%Y-%m-%d")
+    end_date = datetime.strptime(end_date, "%Y-%m-%d")
+
+    lake = ParquetLake(LAKE_ROOT)
+    lake.export_snapshots(client)
+
+    for month_date in iterate_months(start_date, end_date):
+        logging.info(f"Exporting {month_date.strftime('%Y-%m')}...")
+        lake.export_month(client, month_date)
+
+    logging.info(f"Export complete, see {LAKE_ROOT}/{ParquetLake.MANIFEST}")
+
+
+if __name__ == "__main__":
+    sys.exit(main(start_date, end_date))
@@ -1,33 +1,21 @@
-from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from datetime import date
 from otsokop.odoo import Odoo
-import logging
-import os
 import sys
 import pandas as pd
-import json
 
 client = Odoo()
 
 
 def main():
-    dfs = []
-    for year in range(2023, 2026):
-        for month in range(1, 13):
-            date_start = datetime.strptime(f"{year}-{month}", "%Y-%m")
-            pertes_df = export_pertes(date_start)
-            print(pertes_df)
-            dfs.append(pertes_df)
-
-    df = pd.concat(dfs, ignore_index=True)
-    df.to_csv(f"output/pertes_otsokop.csv", index=False)
+    # Only the months not cached yet are read from Odoo
+    df = client.get_product_losses(date(2023, 1, 1), date(2025, 12, 31))
+    df.to_csv("output/pertes_otsokop.csv", index=False)
     print(df)
 
-
-def export_pertes(current_date):
-    end_date = current_date + relativedelta(months=1, days=-1)
-    print(f"export pertes {current_date}, {end_date}")
-    return client.get_product_losses(current_date, end_date)
+    rollups = client.get_product_loss_rollups(date(2023, 1, 1), date(2025, 12, 31))
+    with pd.ExcelWriter("output/pertes_otsokop.xlsx") as writer:
+        for rollup, rollup_df in rollups.items():
+            rollup_df.to_excel(writer, sheet_name=rollup, index=False)
 
 
 if __name__ == "__main__":
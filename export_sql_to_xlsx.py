@@ -4,17 +4,16 @@
 MySQL to XLSX Export Script
 
 This script reads a SQL query from a file and exports the results to an XLSX file.
-Database configuration is handled via .env file.
+Database configuration is handled via .env file (WAREHOUSE_ENGINE or MYSQL_ENGINE,
+see otsokop.warehouse for the embedded DuckDB/SQLite targets).
 """
 
-import pandas as pd
-import pymysql
-import sqlalchemy as sa
 import os
 import argparse
 from datetime import datetime
 import sys
 from dotenv import load_dotenv
+from otsokop.warehouse import Warehouse
 
 load_dotenv()
 
@@ -40,10 +39,10 @@ def read_sql_file(file_path):
 
 def mysql_to_xlsx(query, output_file=None):
     try:
-        engine = sa.create_engine(os.getenv("MYSQL_ENGINE"))
-        print("Connecting to MySQL database...")
+        warehouse = Warehouse()
+        print(f"Connecting to {warehouse.dialect} database...")
 
-        df = pd.read_sql(query, engine)
+        df = warehouse.read_sql(query)
 
         print(f"Successfully fetched {len(df)} rows and {len(df.columns)} columns")
 
@@ -56,7 +55,7 @@ def mysql_to_xlsx(query, output_file=None):
         )
 
         print(f"Data successfully exported to: {output_file}")
-        engine.dispose()
+        warehouse.engine.dispose()
 
         return df
 
@@ -70,7 +69,7 @@ def parse_arguments():
     Parse command line arguments
     """
     parser = argparse.ArgumentParser(
-        description="Export MySQL query results to XLSX file",
+        description="Export warehouse query results to XLSX file",
         formatter_class=argparse.RawDescriptionHelpFormatter,
         epilog="""
 Examples:
@@ -110,7 +109,7 @@ def main():
     if df is not None:
         print("\nFirst 5 rows of the exported data:")
         print(df.head())
-        print(f"\nExport completed successfully!")
+        print("\nExport completed successfully!")
     else:
         print("Export failed!")
         sys.exit(1)
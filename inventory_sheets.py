@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from otsokop.odoo import Odoo
+import argparse
+import logging
+import os
+import re
+import sys
+import pandas as pd
+
+client = Odoo()
+
+NO_RACK = "Sans rayon"
+
+SHEET_COLUMNS = {
+    "barcode": "Code-barres",
+    "name": "Article",
+    "categ": "Catégorie",
+    "uom": "Unité",
+    "qty_available": "Qté théorique",
+    "qty_counted": "Qté comptée",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the inventory sheets")
+    parser.add_argument("--output", default=f"output/inventaire_{date.today()}")
+    parser.add_argument("--format", choices=["xlsx", "csv"], default="xlsx")
+    parser.add_argument("--rack", action="append", help="Only these racks")
+    parser.add_argument(
+        "--full",
+        action="store_true",
+        help="Reload all the products instead of the changes since the last run",
+    )
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    snapshot = client.products_by_racks(full=args.full)
+    paths = generate_sheets(
+        snapshot, args.output, args.format, racks=args.rack, workers=args.workers
+    )
+    print(f"{len(paths)} inventory sheets in {args.output}")
+
+
+def generate_sheets(
+    snapshot, output_folder, file_format="xlsx", racks=None, workers=None
+):
+    """
+    Write one count sheet per rack of the `products_by_racks` snapshot, the
+    racks being rendered in threads (worker processes would each import the
+    script and its module-level `Odoo()`).
+
+    Returns:
+        list: paths of the sheets written
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    # groupby would drop the products without a rack
+    snapshot = snapshot.set_axis(snapshot.index.fillna(NO_RACK)).fillna(
+        {"barcode": ""}
+    )
+    if racks:
+        snapshot = snapshot[snapshot.index.isin(racks)]
+
+    jobs = [
+        (rack, products.reset_index(drop=True), output_folder, file_format)
+        for rack, products in snapshot.groupby(level=0, sort=False)
+    ]
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        paths = list(executor.map(render_sheet, *zip(*jobs))) if jobs else []
+
+    logging.info(f"{len(paths)} racks, {len(snapshot)} products")
+    return paths
+
+
+def render_sheet(rack, products, output_folder, file_format):
+    sheet = products.assign(qty_counted=None)[list(SHEET_COLUMNS)].rename(
+        columns=SHEET_COLUMNS
+    )
+    path = os.path.join(output_folder, f"{_file_name(rack)}.{file_format}")
+
+    if file_format == "csv":
+        sheet.to_csv(path, index=False, sep=";", float_format="%.3f")
+        return path
+
+    with pd.ExcelWriter(path, engine="openpyxl") as writer:
+        sheet.to_excel(
+            writer, index=False, sheet_name=_file_name(rack)[:31], startrow=2
+        )
+        worksheet = writer.sheets[_file_name(rack)[:31]]
+        worksheet["A1"] = f"Inventaire {rack} - {date.today():%d/%m/%Y}"
+        worksheet["A2"] = f"{len(sheet)} articles"
+        worksheet.freeze_panes = "A4"
+        for column, width in zip("ABCDEF", [16, 50, 30, 10, 14, 14]):
+            worksheet.column_dimensions[column].width = width
+    return path
+
+
+def _file_name(rack):
+    return re.sub(r"[^\w\- ]+", "_", rack).strip() or NO_RACK
+
+
+if __name__ == "__main__":
+    sys.exit(main())
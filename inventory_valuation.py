@@ -1,57 +1,118 @@
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
 from otsokop.odoo import Odoo
 import logging
-import os
 import sys
+import numpy as np
 import pandas as pd
-import json
 
 client = Odoo()
 
 
-def main():    
-    # Get the stock valuation account for the product
-    product = client.execute_kw(
-        "product.product",
-        "read",
-        [[product_id]],
-        {"fields": ["categ_id"]}
+def main():
+    if len(sys.argv) > 1:
+        date_str = sys.argv[1]
+    else:
+        date_str = datetime.now().strftime("%Y-%m-%d")
+
+    valuation = inventory_valuation(date_str)
+    print(valuation)
+    print(f"Total value at {date_str}: {valuation['value'].sum():.2f}")
+
+    valuation.to_csv(f"output/inventory_valuation_{date_str}.csv", index=False)
+
+
+def inventory_valuation(date_str):
+    """
+    Stock value and quantity of every product at `date_str`, from the posted
+    account move lines of the stock valuation accounts of the categories.
+
+    Returns:
+        DataFrame: product_id, product_name, account_id, value, quantity and
+        unit_cost per product
+    """
+    categories = client.get_product_categories()
+    valuation_account_ids = (
+        categories["property_stock_valuation_account_id"]
+        .loc[lambda accounts: accounts.astype(bool)]
+        .astype(int)
+        .unique()
+        .tolist()
     )
-    
-    category = client.execute_kw(
-        "product.category",
-        "read",
-        [product["categ_id"]],
-        {"fields": ["property_stock_valuation_account_id"]}
-    )[0]
-    
-    valuation_account_id = category["property_stock_valuation_account_id"][0]
-    
-    # Get account move lines for this product up to the date
-    move_lines = client.execute_kw(
-        db, uid, password,
+    logging.info(f"{len(valuation_account_ids)} stock valuation accounts")
+
+    rows = []
+    for page in client.iter_search_read(
         "account.move.line",
-        "search_read",
-        [[
-            ("product_id", "=", product_id),
-            ("account_id", "=", valuation_account_id),
-            ("date", "<=", date_str),
-            ("parent_state", "=", "posted")
-        ]],
-        {
-            "fields": ["debit", "credit", "quantity", "date"],
-            "order": "date asc"
-        }
+        [
+            ["account_id", "in", valuation_account_ids],
+            ["product_id", "!=", False],
+            ["date", "<=", date_str],
+            ["parent_state", "=", "posted"],
+        ],
+        ["product_id", "account_id", "move_id", "debit", "credit", "quantity"],
+    ):
+        rows.extend(page)
+
+    move_lines = pd.DataFrame(
+        rows,
+        columns=[
+            "id",
+            "product_id",
+            "account_id",
+            "move_id",
+            "debit",
+            "credit",
+            "quantity",
+        ],
+    )
+    move_lines["product_name"] = move_lines["product_id"].str[1]
+    move_lines["product_id"] = move_lines["product_id"].str[0]
+    move_lines["account_id"] = move_lines["account_id"].str[0]
+    move_lines["move_id"] = move_lines["move_id"].str[0]
+    move_lines["value"] = move_lines["debit"] - move_lines["credit"]
+
+    # The quantity of the valuation lines is not signed, it follows the side
+    # of the line (debit for incoming, credit for outgoing stock). The lines of
+    # a zero cost have no side and follow the direction of their stock move.
+    no_side = (move_lines["debit"] == 0) & (move_lines["credit"] == 0)
+    incoming = move_lines["move_id"].isin(
+        incoming_account_moves(move_lines.loc[no_side, "move_id"].unique().tolist())
+    )
+    sign = np.where(
+        move_lines["debit"] > 0,
+        1,
+        np.where(move_lines["credit"] > 0, -1, np.where(incoming, 1, -1)),
+    )
+    move_lines["quantity"] = move_lines["quantity"].abs() * sign
+
+    valuation = move_lines.groupby("product_id", as_index=False).agg(
+        product_name=("product_name", "last"),
+        account_id=("account_id", "last"),
+        value=("value", "sum"),
+        quantity=("quantity", "sum"),
     )
-    
-    total_value = sum(line["debit"] - line["credit"] for line in move_lines)
-    total_quantity = sum(line.get("quantity", 0) for line in move_lines)
-    
-    if total_quantity > 0:
-        return total_value / total_quantity
-    
-    return 0.0
+    valuation["unit_cost"] = (valuation["value"] / valuation["quantity"]).where(
+        valuation["quantity"] > 0, 0.0
+    )
+    return valuation.sort_values("product_name", ignore_index=True)
+
+
+def incoming_account_moves(account_move_ids):
+    """Ids of the account moves whose stock move enters the stock"""
+    if not account_move_ids:
+        return set()
+
+    incoming = set()
+    for page in client.iter_search_read(
+        "account.move",
+        [
+            ["id", "in", account_move_ids],
+            ["stock_move_id.location_dest_id.usage", "=", "internal"],
+        ],
+        ["id"],
+    ):
+        incoming.update(move["id"] for move in page)
+    return incoming
 
 
 if __name__ == "__main__":
@@ -1,10 +1,10 @@
 from datetime import date
-from datetime import datetime
 from dateutil.relativedelta import relativedelta
 from dotenv import load_dotenv
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
 from email.mime.application import MIMEApplication
+from otsokop.dates import iterate_months, month_interval
 from otsokop.odoo import Odoo
 import pandas as pd
 import logging
@@ -26,10 +26,92 @@ EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 SEND_EMAIL = True
 
 
+# Number of consecutive days after which a negative stock is chronic
+CHRONIC_DAYS = 7
+# Period of product.history used to explain the negative stocks
+HISTORY_DAYS = 30
+SNAPSHOT_TTL = 90 * Odoo.ONE_DAY
+
+SNAPSHOT_COLUMNS = ["id", "name", "rack_location", "standard_price", "qty_available"]
+
+EXPORT_COLUMNS = {
+    "id": "Id",
+    "name": "Produit",
+    "rack_location": "Rayon",
+    "standard_price": "Coût",
+    "qty_available": "Stock",
+    "total": "Valeur",
+    "status": "Statut",
+    "negative_since": "Négatif depuis",
+    "days_negative": "Jours",
+    "sales_qty": f"Ventes {HISTORY_DAYS}j",
+    "loss_qty": f"Pertes {HISTORY_DAYS}j",
+    "incoming_qty": f"Entrées {HISTORY_DAYS}j",
+}
+
+
 def main():
     client = Odoo()
+    today = date.today()
+
+    stocks = get_negative_stocks(client)
+    scan = scan_negative_stocks(client, stocks, today)
+    stocks = explain_negative_stocks(client, scan["stocks"], today)
+
+    with pd.ExcelWriter("stocks_negatifs.xlsx") as writer:
+        for sheet_name, df in (
+            ("Stocks négatifs", stocks),
+            ("Nouveaux", stocks[stocks["status"] == "nouveau"]),
+            ("Chroniques", stocks[stocks["status"] == "chronique"]),
+            ("Résolus", scan["resolved"]),
+        ):
+            df.to_excel(
+                writer,
+                index=False,
+                sheet_name=sheet_name,
+                float_format="%.2f",
+                freeze_panes=(1, 2),
+                columns=[c for c in EXPORT_COLUMNS if c in df.columns],
+                header=[h for c, h in EXPORT_COLUMNS.items() if c in df.columns],
+            )
+
+    content = start_html()
+    content.extend(
+        [
+            f"""
+        <p>Bonjour,</p>
+        <p>Voici en pièce-jointe la liste des {len(stocks)} produits dont le stock
+        est négatif (valeur {stocks["total"].sum():.2f} €).</p>
+        <ul>
+            <li>{len(stocks[stocks["status"] == "nouveau"])} nouveaux</li>
+            <li>{len(scan["resolved"])} résolus depuis le
+            {scan["previous_date"] or "-"}</li>
+            <li>{len(stocks[stocks["status"] == "chronique"])} négatifs depuis
+            au moins {CHRONIC_DAYS} jours</li>
+        </ul>
+    """
+        ]
+    )
+    content.extend(
+        diff_html("Nouveaux stocks négatifs", stocks[stocks["status"] == "nouveau"])
+    )
+    content.extend(diff_html("Stocks résolus", scan["resolved"]))
+
+    content.extend(
+        [
+            """
+        <p>Bonne journée,</p>
+        """
+            "</body></html>"
+        ]
+    )
+
+    send_email(content)
+
+
+def get_negative_stocks(client):
     stocks = client.execute_kw(
-        "product.template",
+        "product.product",
         "search_read",
         [
             [
@@ -47,46 +129,122 @@ def main():
             "rack_location,qty_available",  # sort
         ],
     )
-    stocks = pd.DataFrame(stocks)
+    stocks = pd.DataFrame(stocks, columns=SNAPSHOT_COLUMNS)
     stocks["total"] = stocks["standard_price"] * stocks["qty_available"]
+    return stocks
 
-    stocks.to_excel(
-        "stocks_negatifs.xlsx",
-        index=False,
-        sheet_name="Stocks négatifs",
-        float_format="%.2f",
-        freeze_panes=(1, 2),
-        columns=[
-            "id",
-            "name",
-            "rack_location",
-            "standard_price",
-            "qty_available",
-            "total",
-        ],
-        header=["Id", "Produit", "Rayon", "Coût", "Stock", "Valeur"],
-    )
 
-    content = start_html()
-    content.extend(
-        [
-            """
-        <p>Bonjour,</p>
-        <p>Voici en pièce-jointe la liste des produits dont le stock est négatif.</p>
+def scan_negative_stocks(client, stocks, today):
     """
-        ]
+    Compare today's negative stocks with the previous scan.
+
+    The snapshot of each day is kept in the cache. The scan state only holds
+    the date since which each product is negative, so the status of a product
+    (nouveau, chronique, négatif) is updated from the previous scan alone.
+    """
+    state = client._check_cache("negative_stocks:state") or {
+        "date": None,
+        "negative_since": {},
+    }
+    if state["date"] == today.isoformat():
+        # Already scanned today, compare with the scan before
+        state = client._check_cache("negative_stocks:previous_state") or {
+            "date": None,
+            "negative_since": {},
+        }
+    else:
+        client._set_cache("negative_stocks:previous_state", state)
+
+    previous_since = state["negative_since"]
+    negative_since = {
+        product_id: previous_since.get(product_id, today.isoformat())
+        for product_id in stocks["id"]
+    }
+
+    stocks = stocks.copy()
+    stocks["negative_since"] = stocks["id"].map(negative_since)
+    stocks["days_negative"] = stocks["negative_since"].map(
+        lambda since: (today - date.fromisoformat(since)).days + 1
     )
+    stocks["status"] = "négatif"
+    stocks.loc[stocks["days_negative"] >= CHRONIC_DAYS, "status"] = "chronique"
+    stocks.loc[~stocks["id"].isin(list(previous_since)), "status"] = "nouveau"
 
-    content.extend(
-        [
-            """
-        <p>Bonne journée,</p>
-        """
-            "</body></html>"
+    resolved = pd.DataFrame(columns=SNAPSHOT_COLUMNS)
+    if state["date"]:
+        previous = client._check_cache(f"negative_stocks:{state['date']}")
+        if previous is not None:
+            resolved = previous[~previous["id"].isin(stocks["id"])]
+
+    client._set_cache(
+        f"negative_stocks:{today.isoformat()}",
+        stocks[SNAPSHOT_COLUMNS],
+        expire=SNAPSHOT_TTL,
+    )
+    client._set_cache(
+        "negative_stocks:state",
+        {"date": today.isoformat(), "negative_since": negative_since},
+    )
+
+    return {"stocks": stocks, "resolved": resolved, "previous_date": state["date"]}
+
+
+def explain_negative_stocks(client, stocks, today):
+    """
+    Add the sales, losses and incoming quantities of the last days. The history
+    is read by month, so the months over keep the same cache key every day.
+    """
+    date_start = today - relativedelta(days=HISTORY_DAYS)
+    months = [
+        history
+        for history in (
+            history_month(client, month, today)
+            for month in iterate_months(date_start, today)
+        )
+        if history is not None and not history.empty
+    ]
+    if not months:
+        return stocks.assign(sales_qty=0.0, loss_qty=0.0, incoming_qty=0.0)
+
+    history = pd.concat(months, ignore_index=True)
+    history = (
+        history[
+            history["product_id"].isin(stocks["id"])
+            & (history["from_date"] >= pd.Timestamp(date_start))
         ]
+        .groupby("product_id")[["sales_qty", "loss_qty", "incoming_qty"]]
+        .sum()
     )
+    stocks = stocks.merge(history, left_on="id", right_index=True, how="left")
+    return stocks.fillna({"sales_qty": 0.0, "loss_qty": 0.0, "incoming_qty": 0.0})
 
-    send_email(content)
+
+def history_month(client, month, today):
+    """Product history of the month, cached once the month is over"""
+    cache_key = f"negative_stocks_history:{month:%Y-%m}"
+    history = client._check_cache(cache_key)
+    if history is not None:
+        return history
+
+    (date_start, date_end) = month_interval(month)
+    # The history may have been cached while the month was still going on, it
+    # is read again until the month is over and cached here
+    client.delete_cache_by_prefix(f"get_product_history:{date_start}_{date_end}:")
+    history = client.get_product_history(date_start, date_end)
+    if history is not None and date_end < today.strftime("%Y-%m-%d"):
+        client._set_cache(cache_key, history)
+    return history
+
+
+def diff_html(title, df):
+    if df.empty:
+        return []
+    return [
+        f"<h2>{title}</h2>",
+        df[["name", "rack_location", "qty_available"]]
+        .rename(columns=EXPORT_COLUMNS)
+        .to_html(index=False, float_format="%.2f", na_rep=""),
+    ]
 
 
 def start_html():
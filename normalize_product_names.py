@@ -1,7 +1,6 @@
 import re
 import unicodedata
 from otsokop.odoo import Odoo
-import pandas as pd
 
 client = Odoo()
 
@@ -58,23 +57,22 @@ def process_odoo_model(model_name, dry_run=False):
 
     print(f"Found {len(rows)} records in {model_name}")
 
+    updates = {}
     for row in rows:
         row_id = row["id"][0] if isinstance(row["id"], list) else row["id"]
         original_name = row["name"]
         normalized_name = process_name(original_name, "")
         if original_name != normalized_name:
             print(f"Updating ID {row_id}: '{row['name']}' -> '{normalized_name}'")
-            if not dry_run:
-                result = client.execute_kw(
-                    model_name,
-                    "write",
-                    [
-                        [row["id"]],
-                        {"name": normalized_name},
-                    ],
-                    {"context": {"lang": "fr_FR"}},
-                )
-                print(f"  -> {result}")
+            updates[row_id] = {"name": normalized_name}
+
+    if updates and not dry_run:
+        result = client.bulk_write(
+            model_name,
+            updates,
+            kwargs={"context": {"lang": "fr_FR"}},
+        )
+        print(f"  -> {result} records updated")
 
 
 def main():
@@ -0,0 +1,179 @@
+import logging, numpy as np, pandas as pd
+
+from otsokop.dates import iterate_months, month_interval
+
+# A price further than SIGMA standard deviations from the mean price of the
+# product is a jump, for the products with at least MIN_PRICES prices
+SIGMA = 3
+MIN_PRICES = 5
+
+# Move lines identical on these columns are duplicates of the first one
+DUPLICATE_KEY = [
+    "stock_move_id",
+    "product_id",
+    "stock_location_id",
+    "dest_stock_location_id",
+    "qty_done",
+    "date",
+]
+
+RULES = [
+    "zero_costs",
+    "negative_costs",
+    "cost_jumps",
+    "purchase_price_errors",
+    "purchase_price_jumps",
+    "move_line_sign_errors",
+    "duplicate_move_lines",
+    "uom_mismatches",
+]
+
+
+def scan_anomalies(client, date_start, date_end, sigma=SIGMA):
+    """
+    Run the anomaly rules over the move lines, price history and purchase
+    order lines of the months between `date_start` and `date_end`, read from
+    the monthly cached getters.
+
+    Returns:
+        dict: {rule: DataFrame of the anomalous rows}, for each rule of RULES
+    """
+    (move_lines, price_history, purchase_lines) = load_frames(
+        client, date_start, date_end
+    )
+
+    anomalies = {
+        "zero_costs": price_history[price_history["cost"] == 0],
+        "negative_costs": price_history[price_history["cost"] < 0],
+        "cost_jumps": price_jumps(price_history, "cost", "datetime", sigma),
+        "purchase_price_errors": purchase_lines[
+            (purchase_lines["price_unit"] <= 0) | (purchase_lines["product_qty"] <= 0)
+        ],
+        "purchase_price_jumps": price_jumps(
+            purchase_lines[purchase_lines["price_unit"] > 0],
+            "price_unit",
+            "date_order",
+            sigma,
+        ),
+        "move_line_sign_errors": move_lines[
+            (move_lines["state"] == "done") & (move_lines["qty_done"] <= 0)
+        ],
+        "duplicate_move_lines": duplicate_move_lines(move_lines),
+        "uom_mismatches": uom_mismatches(
+            move_lines, client.get_products(), client.get_uoms()
+        ),
+    }
+
+    for rule in RULES:
+        logging.info(f"scan_anomalies: {len(anomalies[rule])} {rule}")
+    return anomalies
+
+
+def load_frames(client, date_start, date_end):
+    move_lines = []
+    price_history = []
+    purchase_lines = []
+    for month in iterate_months(
+        pd.Timestamp(date_start).date(), pd.Timestamp(date_end).date()
+    ):
+        (month_start, month_end) = month_interval(month)
+        move_lines.append(client.get_stock_move_lines(month_start, month_end))
+        price_history.append(client.get_product_price_history(month_start, month_end))
+        (_, lines) = client.get_purchase_orders(
+            month_start, month_end, include_order_lines=True
+        )
+        purchase_lines.append(lines)
+
+    return (
+        _concat(move_lines, ["id", "uom_id", "state"] + DUPLICATE_KEY),
+        _concat(price_history, ["id", "datetime", "product_id", "cost"]),
+        _concat(
+            purchase_lines,
+            [
+                "id",
+                "order_id",
+                "date_order",
+                "product_id",
+                "product_name",
+                "price_unit",
+                "product_qty",
+            ],
+        ),
+    )
+
+
+def price_jumps(prices, value_column, date_column, sigma=SIGMA):
+    """
+    Prices more than `sigma` standard deviations away from the mean price of
+    their product, with their z-score
+    """
+    by_product = prices.groupby("product_id")[value_column]
+    mean = by_product.transform("mean")
+    std = by_product.transform("std")
+    count = by_product.transform("size")
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        z_score = (prices[value_column] - mean) / std
+    jumps = prices.assign(mean=mean, z_score=z_score)[
+        (count >= MIN_PRICES) & (std > 0) & (z_score.abs() > sigma)
+    ]
+    return jumps.sort_values(["product_id", date_column])
+
+
+def duplicate_move_lines(move_lines):
+    """Done move lines repeating a previous one (by id) of the same move"""
+    done = move_lines[
+        (move_lines["state"] == "done") & move_lines["stock_move_id"].notna()
+    ].sort_values("id")
+    return done[done.duplicated(DUPLICATE_KEY, keep="first")]
+
+
+def uom_mismatches(move_lines, products, uoms):
+    """
+    Move lines whose unit of measure is not of the same type (unit, weight,
+    volume...) as the unit of their product, or with a fractional quantity of
+    a unit counted by pieces
+    """
+    measure_types = uoms.set_index("id")["measure_type"]
+    rounding = uoms.set_index("id")["rounding"]
+    product_uoms = products.set_index("id")["uom_id"]
+
+    lines = move_lines.assign(
+        product_uom_id=move_lines["product_id"].map(product_uoms),
+    )
+    lines = lines.assign(
+        measure_type=lines["uom_id"].map(measure_types),
+        product_measure_type=lines["product_uom_id"].map(measure_types),
+    )
+
+    steps = lines["qty_done"] / lines["uom_id"].map(rounding).fillna(1)
+    fractional = (lines["measure_type"] == "unit") & (
+        (steps - steps.round()).abs() > 1e-6
+    )
+    mismatch = lines["product_measure_type"].notna() & (
+        lines["measure_type"] != lines["product_measure_type"]
+    )
+    return lines[mismatch | fractional]
+
+
+def fix_anomalies(client, anomalies, journal=None):
+    """
+    Apply the fixes which are safe to do in bulk: delete the price history
+    entries with a zero cost, so the cost of the product falls back to the
+    previous one. The other anomalies, negative costs included, are only
+    reported.
+
+    Returns:
+        int: number of records fixed
+    """
+    price_history_ids = [int(i) for i in anomalies["zero_costs"]["id"]]
+    return client.bulk_unlink(
+        "product.price.history", price_history_ids, journal=journal
+    )
+
+
+def _concat(frames, columns):
+    frames = [frame for frame in frames if frame is not None and not frame.empty]
+    if not frames:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(frames, ignore_index=True)
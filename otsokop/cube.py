@@ -0,0 +1,252 @@
+import logging, numpy as np, pandas as pd
+
+from datetime import date
+from otsokop.dates import iterate_months, month_interval
+
+MEASURES = ["revenue", "discount", "loss", "purchase_qty"]
+
+MEASURE_LABELS = {
+    "revenue": "CA",
+    "discount": "Remise",
+    "loss": "Pertes",
+    "purchase_qty": "Achats (qté)",
+}
+
+# Sheet name and product columns of each `ProductCube.totals` dimension
+DIMENSIONS = {
+    "product": ("Produits", ["product_id", "name", "category", "rack_location"]),
+    "category": ("Catégories", ["category_id", "category"]),
+    "rack": ("Rayons", ["rack_location"]),
+}
+
+PURCHASE_STATES = ["purchase", "done"]
+
+
+class ProductCube:
+    """
+    Revenue, discount, loss and purchase quantity of every product for each
+    month of [date_start, date_end], as a NumPy array of shape
+    (measures, products, months):
+
+        cube = ProductCube(client, "2024-01-01", "2024-12-31")
+        cube.values[MEASURES.index("revenue")]  # products x months
+        cube.totals("category")
+
+    Each month is summed per product once (a tile) from `get_pos_orders`,
+    `get_product_losses` and `get_purchase_orders`, and kept in the Odoo cache
+    when the month is over: only the current month and the months never seen
+    are read from Odoo.
+
+    The product dimensions (category, rack) come from `get_products`.
+    """
+
+    def __init__(self, client, date_start, date_end=None):
+        self.client = client
+        date_start = pd.Timestamp(date_start).to_pydatetime().date()
+        date_end = pd.Timestamp(date_end or date.today()).to_pydatetime().date()
+        self.months = list(iterate_months(date_start, date_end))
+
+        tiles = [self._month_tile(month) for month in self.months]
+
+        self.products = self._load_products(
+            np.unique(
+                np.concatenate([tile.index.to_numpy("int64") for tile in tiles] or [[]])
+            )
+        )
+        self.values = np.zeros((len(MEASURES), len(self.products), len(self.months)))
+        for m, tile in enumerate(tiles):
+            rows = self.products.index.get_indexer(tile.index)
+            self.values[:, rows, m] = tile[MEASURES].to_numpy().T
+
+        logging.info(
+            f"ProductCube: {len(self.products)} products x {len(self.months)} months"
+        )
+
+    def measure(self, measure):
+        """
+        One measure of the cube
+
+        Returns:
+            DataFrame: products x months
+        """
+        return pd.DataFrame(
+            self.values[MEASURES.index(measure)],
+            index=self.products.index,
+            columns=[f"{month:%Y-%m}" for month in self.months],
+        )
+
+    def totals(self, dimension="product"):
+        """
+        Measures summed over the months and grouped by `dimension` (product,
+        category or rack), with the discount and loss rates
+
+        Returns:
+            DataFrame: one row per product, category or rack
+        """
+        (_, columns) = DIMENSIONS[dimension]
+        totals = pd.DataFrame(
+            self.values.sum(axis=2).T, index=self.products.index, columns=MEASURES
+        )
+        totals = self.products.join(totals).reset_index()
+        if dimension != "product":
+            totals = totals.groupby(columns, dropna=False, as_index=False)[
+                MEASURES
+            ].sum()
+
+        totals = totals[columns + MEASURES]
+        totals["discount_rate"] = ProductCube._rate(
+            totals["discount"], totals["revenue"] + totals["discount"]
+        )
+        totals["loss_rate"] = ProductCube._rate(totals["loss"], totals["revenue"])
+        return totals.sort_values("revenue", ascending=False, ignore_index=True)
+
+    def to_excel(self, path, money_format, percent_format):
+        """
+        Workbook with the monthly revenue and the totals of each product, and
+        the totals per category and per rack
+        """
+        with pd.ExcelWriter(path, engine="openpyxl") as writer:
+            for dimension, (sheet_name, columns) in DIMENSIONS.items():
+                sheet = self.totals(dimension)
+                if dimension == "product":
+                    revenue = self.measure("revenue").add_prefix("CA ")
+                    sheet = sheet.merge(
+                        revenue, left_on="product_id", right_index=True
+                    )
+                sheet = sheet.rename(
+                    columns={
+                        **MEASURE_LABELS,
+                        "discount_rate": "% remise",
+                        "loss_rate": "% pertes",
+                    }
+                )
+                sheet.to_excel(
+                    writer,
+                    index=False,
+                    sheet_name=sheet_name,
+                    freeze_panes=(1, len(columns)),
+                )
+
+                worksheet = writer.sheets[sheet_name]
+                for c, column in enumerate(sheet.columns, start=1):
+                    if column in ("% remise", "% pertes"):
+                        number_format = percent_format
+                    elif column in columns or column == MEASURE_LABELS["purchase_qty"]:
+                        continue
+                    else:
+                        number_format = money_format
+                    for (cell,) in worksheet.iter_rows(
+                        min_row=2, min_col=c, max_col=c
+                    ):
+                        cell.number_format = number_format
+
+        logging.info(f"ProductCube: saved {path}")
+
+    def _month_tile(self, month):
+        """
+        Measures of the month, indexed by product_id (only the products with
+        at least one sale, loss or purchase)
+        """
+        cache_key = f"product_cube:{month:%Y-%m}"
+        tile = self.client._check_cache(cache_key)
+        if tile is not None:
+            return tile
+
+        (date_start, date_end) = month_interval(month)
+        final = date_end < date.today().strftime("%Y-%m-%d")
+        # The orders may have been cached while the month was still going on,
+        # they are read again until the month is over and its tile is cached
+        for getter in ("get_pos_orders", "get_purchase_orders"):
+            self.client.delete_cache_by_prefix(f"{getter}:{date_start}_{date_end}:")
+        sums = [
+            self._sales(date_start, date_end),
+            self._losses(date_start, date_end),
+            self._purchases(date_start, date_end),
+        ]
+        tile = (
+            pd.concat(sums)
+            .groupby(level=0)
+            .sum()
+            .reindex(columns=MEASURES, fill_value=0.0)
+            .astype(float)
+        )
+        tile.index = tile.index.astype("int64")
+        tile.index.name = "product_id"
+
+        if final:
+            self.client._set_cache(cache_key, tile)
+        logging.debug(f"ProductCube: {len(tile)} products in {date_start}")
+        return tile
+
+    def _sales(self, date_start, date_end):
+        (_, lines) = self.client.get_pos_orders(
+            date_start, date_end, include_order_lines=True
+        )
+        if lines.empty:
+            return ProductCube._empty_sums()
+
+        gross = lines["price_unit"] * lines["qty"]
+        return (
+            lines.assign(
+                revenue=lines["price_subtotal"],
+                discount=gross * lines["discount"] / 100,
+            )
+            .groupby("product_id")[["revenue", "discount"]]
+            .sum()
+        )
+
+    def _losses(self, date_start, date_end):
+        losses = self.client.get_product_losses(date_start, date_end)
+        if losses.empty:
+            return ProductCube._empty_sums()
+
+        return losses.groupby("product_id")[["loss_value"]].sum().rename(
+            columns={"loss_value": "loss"}
+        )
+
+    def _purchases(self, date_start, date_end):
+        (orders, lines) = self.client.get_purchase_orders(
+            date_start, date_end, include_order_lines=True
+        )
+        if lines.empty:
+            return ProductCube._empty_sums()
+
+        confirmed = orders.loc[orders["state"].isin(PURCHASE_STATES), "id"]
+        lines = lines[lines["order_id"].isin(confirmed)]
+        return lines.groupby("product_id")[["product_qty"]].sum().rename(
+            columns={"product_qty": "purchase_qty"}
+        )
+
+    def _load_products(self, product_ids):
+        products = self.client.get_products()
+        categories = self.client.get_product_categories()
+
+        products = products.rename(
+            columns={
+                "id": "product_id",
+                "product_category_id": "category_id",
+                "product_rack_code": "rack_location",
+            }
+        ).merge(
+            categories[["id", "name"]].rename(
+                columns={"id": "category_id", "name": "category"}
+            ),
+            on="category_id",
+            how="left",
+        )
+        products = products.set_index("product_id")[
+            ["name", "category_id", "category", "rack_location"]
+        ]
+        # Products sold or lost but no longer readable keep empty dimensions
+        products = products.reindex(products.index.union(product_ids.astype("int64")))
+        products.index.name = "product_id"
+        products["category_id"] = products["category_id"].astype("Int64")
+        return products
+
+    @staticmethod
+    def _rate(part, total):
+        return (part / total.where(total != 0)).fillna(0.0)
+
+    @staticmethod
+    def _empty_sums():
+        return pd.DataFrame(columns=MEASURES, index=pd.Index([], name="product_id"))
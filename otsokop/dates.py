@@ -0,0 +1,18 @@
+from dateutil.relativedelta import relativedelta
+
+
+def iterate_months(start_date, end_date):
+    current_date = start_date.replace(day=1)
+    while current_date <= end_date:
+        yield current_date
+        current_date += relativedelta(months=1)
+
+
+def month_interval(month_date):
+    """
+    First and last day (as `%Y-%m-%d` strings) of the month of `month_date`,
+    in the format expected by the monthly `Odoo.get_*` getters.
+    """
+    start = month_date.replace(day=1)
+    end = start + relativedelta(months=1, days=-1)
+    return start.strftime("%Y-%m-%d"), end.strftime("%Y-%m-%d")
@@ -0,0 +1,281 @@
+import json, logging, numbers, os, pandas as pd, shutil, uuid
+
+from datetime import datetime
+from otsokop.dates import month_interval
+
+# Monthly getters and the model name(s) of the frame(s) they return
+MONTHLY_GETTERS = {
+    "get_pos_orders": ("pos_order", "pos_order_detail"),
+    "get_report_pos_orders": ("report_pos_order",),
+    "get_purchase_orders": ("purchase_order", "purchase_order_detail"),
+    "get_account_invoices": ("account_invoice", "account_invoice_line"),
+    "get_account_move_lines": ("account_move_line",),
+    "get_stock_moves": ("stock_move",),
+    "get_stock_move_lines": ("stock_move_line",),
+    "get_product_history": ("product_history",),
+    "get_product_price_history": ("product_price_history",),
+}
+
+# Reference data, exported as a single unpartitioned snapshot
+SNAPSHOT_GETTERS = {
+    "get_products": "product",
+    "get_product_templates": "product_template",
+    "get_partners": "partner",
+    "get_product_coefficients": "product_coefficient",
+    "get_account_journals": "account_journal",
+    "get_stock_picking_types": "stock_picking_type",
+    "get_uoms": "uom",
+    "get_account_taxes": "account_tax",
+    "get_account_fiscal_classification": "account_fiscal_classification",
+    "get_accounts": "account",
+    "get_stock_locations": "stock_location",
+    "get_product_labels": "product_label",
+    "get_product_categories": "product_category",
+}
+
+
+class ParquetLake:
+    """
+    Hive-style partitioned Parquet dataset of the Odoo getters:
+
+        <root>/model=pos_order/year=2025/month=03/part-0.parquet
+        <root>/model=product/part-0.parquet
+
+    Each partition is written in a temporary directory, then the previous one
+    is renamed aside and the new one renamed in its place, the previous one
+    being put back if that fails. Readers never see a partially written
+    partition, only a missing one between the two renames. `_manifest.json`
+    keeps the row count and watermark (latest date) of every partition.
+
+    The Arrow type of each column is kept per model in `_common_metadata` and
+    widened when a partition needs it (e.g. int to float, or to string when
+    nothing else fits), so the partitions of a model are read with a single
+    schema.
+    """
+
+    MANIFEST = "_manifest.json"
+    SCHEMA = "_common_metadata"
+
+    def __init__(self, root="lake"):
+        self.root = root
+        os.makedirs(self.root, exist_ok=True)
+
+    def partition_path(self, model, year=None, month=None):
+        path = os.path.join(self.root, f"model={model}")
+        if year is not None:
+            path = os.path.join(path, f"year={year}", f"month={month:02d}")
+        return path
+
+    def write_partition(self, model, df, year=None, month=None):
+        target = self.partition_path(model, year, month)
+        parent = os.path.dirname(target)
+        os.makedirs(parent, exist_ok=True)
+
+        # Dot-prefixed directories are ignored by Parquet dataset readers
+        token = uuid.uuid4().hex
+        tmp = os.path.join(parent, f".tmp-{os.path.basename(target)}-{token}")
+        old = os.path.join(parent, f".old-{os.path.basename(target)}-{token}")
+
+        rows = 0 if df is None else len(df)
+        try:
+            if rows:
+                import pyarrow.parquet as pq
+
+                table = self._to_arrow_table(model, df)
+                os.makedirs(tmp)
+                pq.write_table(table, os.path.join(tmp, "part-0.parquet"))
+
+            if os.path.exists(target):
+                os.rename(target, old)
+            if rows:
+                os.rename(tmp, target)
+        except Exception:
+            # Keep the previous partition until the new one is in place
+            if os.path.exists(old) and not os.path.exists(target):
+                os.rename(old, target)
+            shutil.rmtree(tmp, ignore_errors=True)
+            raise
+        shutil.rmtree(old, ignore_errors=True)
+
+        if rows:
+            self._update_schema(model, table.schema)
+        self._update_manifest(
+            os.path.relpath(target, self.root),
+            {
+                "rows": rows,
+                "watermark": ParquetLake._watermark(df),
+                "written_at": datetime.now().isoformat(timespec="seconds"),
+            },
+        )
+        logging.info(f"Wrote {rows} rows to {target}")
+
+    def read(self, model, columns=None, filters=None):
+        """
+        Read a model, e.g. `lake.read("pos_order", ["id", "amount_total"],
+        [("year", "=", 2025), ("month", "in", [1, 2, 3])])`. Only the matching
+        partitions and columns are loaded.
+        """
+        import pyarrow as pa, pyarrow.dataset as ds
+
+        path = self.partition_path(model)
+        schema = self.schema(model)
+        if schema is None:
+            return pd.read_parquet(path, columns=columns, filters=filters)
+
+        partitioning = ds.dataset(path, partitioning="hive").partitioning
+        if partitioning is not None:
+            schema = pa.unify_schemas([schema, partitioning.schema])
+        df = pd.read_parquet(path, columns=columns, filters=filters, schema=schema)
+
+        # Odoo booleans are False when empty, as are the partitions without True
+        for field in schema:
+            if pa.types.is_boolean(field.type) and field.name in df:
+                df[field.name] = df[field.name].fillna(False).astype(bool)
+        return df
+
+    def schema(self, model):
+        """Arrow schema of the columns of a model, None before its first write"""
+        import pyarrow.parquet as pq
+
+        path = os.path.join(self.partition_path(model), ParquetLake.SCHEMA)
+        if not os.path.exists(path):
+            return None
+        return pq.read_schema(path)
+
+    def manifest(self):
+        path = os.path.join(self.root, ParquetLake.MANIFEST)
+        if not os.path.exists(path):
+            return {}
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def export_month(self, client, month_date):
+        (date_start, date_end) = month_interval(month_date)
+
+        for getter, models in MONTHLY_GETTERS.items():
+            result = getattr(client, getter)(date_start, date_end)
+            frames = result if isinstance(result, list) else [result]
+            for model, df in zip(models, frames):
+                self.write_partition(model, df, month_date.year, month_date.month)
+
+    def export_snapshots(self, client):
+        for getter, model in SNAPSHOT_GETTERS.items():
+            self.write_partition(model, getattr(client, getter)())
+
+    def _update_manifest(self, partition, entry):
+        manifest = self.manifest()
+        manifest[partition] = entry
+
+        path = os.path.join(self.root, ParquetLake.MANIFEST)
+        tmp = f"{path}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp, path)
+
+    def _watermark(df):
+        if df is None:
+            return None
+
+        dates = [
+            df[c].max()
+            for c in df.columns
+            if pd.api.types.is_datetime64_any_dtype(df[c])
+        ]
+        dates = [d for d in dates if not pd.isna(d)]
+        return max(dates).isoformat() if dates else None
+
+    def _to_arrow_table(self, model, df):
+        """
+        Arrow table of the frame, with the types of the model's schema (widened
+        if needed). XML-RPC returns `False` for empty values, which become
+        nulls: a column without any other value takes the type it has in the
+        other partitions.
+        """
+        import pyarrow as pa
+
+        schema = self.schema(model)
+        arrays = {}
+        for column in df.columns:
+            array = ParquetLake._to_arrow_array(df[column])
+            if schema is None or schema.get_field_index(column) < 0:
+                arrays[column] = array
+                continue
+
+            widened = ParquetLake._widen(schema.field(column).type, array.type)
+            if widened == pa.string() and array.type != pa.string():
+                arrays[column] = pa.array(
+                    df[column].map(ParquetLake._to_str_or_none), pa.string()
+                )
+            else:
+                arrays[column] = array.cast(widened)
+        return pa.table(arrays)
+
+    def _update_schema(self, model, schema):
+        import pyarrow as pa, pyarrow.parquet as pq
+
+        known = self.schema(model)
+        if known is not None:
+            fields = {field.name: field.type for field in known}
+            for field in schema:
+                fields[field.name] = ParquetLake._widen(
+                    fields.get(field.name, pa.null()), field.type
+                )
+            schema = pa.schema(list(fields.items()))
+            if schema.equals(known):
+                return
+
+        path = os.path.join(self.partition_path(model), ParquetLake.SCHEMA)
+        pq.write_metadata(schema, f"{path}.tmp")
+        os.replace(f"{path}.tmp", path)
+
+    def _widen(known, new):
+        """Type able to hold the values of both types, string as a last resort"""
+        import pyarrow as pa
+
+        try:
+            return pa.unify_schemas(
+                [pa.schema([("value", known)]), pa.schema([("value", new)])],
+                promote_options="permissive",
+            ).field("value").type
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.string()
+
+    def _to_arrow_array(series):
+        import pyarrow as pa
+
+        # A column of `False` only is how Odoo returns an empty field of any
+        # type, its type is taken from the other partitions
+        if series.dtype == bool:
+            return pa.array(series) if series.any() else pa.nulls(len(series))
+        if series.dtype != object:
+            return pa.array(series, from_pandas=True)
+
+        values = series.map(ParquetLake._to_value_or_none)
+        present = [value for value in values if value is not None]
+        if not present:
+            return pa.nulls(len(series))
+        if all(isinstance(value, bool) for value in present):
+            return pa.array(values, pa.bool_())
+        if all(isinstance(value, str) for value in present):
+            return pa.array(values, pa.string())
+        if all(
+            isinstance(value, numbers.Number) and not isinstance(value, bool)
+            for value in present
+        ):
+            integers = all(isinstance(value, numbers.Integral) for value in present)
+            return pa.array(values, pa.int64() if integers else pa.float64())
+        try:
+            return pa.array(values, from_pandas=True)
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            return pa.array(series.map(ParquetLake._to_str_or_none), pa.string())
+
+    def _to_value_or_none(value):
+        if value is False or value is None or value is pd.NA:
+            return None
+        if isinstance(value, float) and value != value:
+            return None
+        return value
+
+    def _to_str_or_none(value):
+        value = ParquetLake._to_value_or_none(value)
+        return None if value is None else str(value)
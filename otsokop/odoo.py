@@ -1,10 +1,12 @@
-import diskcache, logging, os, pandas as pd, pytz, re, sys, xmlrpc.client, yaml
+import diskcache, hashlib, json, logging, os, pandas as pd, pytz, re, sys, time
+import xmlrpc.client, yaml
 
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timedelta
 from re import search, sub
+from otsokop.dates import iterate_months, month_interval
 from otsokop.odoo_cache import odoo_cache
-from typing import Any, Optional, Union
+from typing import Any, Optional
 
 banner = """
  ____ _____ ____  ____  _  __ ____  ____ 
@@ -18,6 +20,70 @@ banner = """
 class Odoo:
     DISABLE_CACHE = False
     ONE_DAY = 60 * 60 * 24
+    PAGE_SIZE = 5000
+    WRITE_CHUNK_SIZE = 1000
+    CREATE_CHUNK_SIZE = 500
+    BULK_RETRIES = 3
+
+    _STOCK_MOVE_FIELDS = [
+        "date_expected",
+        "location_id",
+        "location_dest_id",
+        "product_id",
+        "product_qty",
+        "price_unit",
+        "picking_type_id",
+        "state",
+    ]
+
+    _STOCK_MOVE_LINE_FIELDS = [
+        "date",
+        "location_id",
+        "location_dest_id",
+        "move_id",
+        "product_qty",
+        "product_id",
+        "product_uom_id",
+        "product_uom_qty",
+        "qty_done",
+        "state",
+    ]
+
+    _PRODUCT_LOSS_COLUMNS = [
+        "date_expected",
+        "stock_location_id",
+        "product_id",
+        "product_qty",
+        "price_unit",
+        "loss_value",
+    ]
+
+    _PRODUCT_LOSS_ROLLUPS = {
+        "product": ["product_id", "product_name"],
+        "category": ["category_id", "category_name"],
+        "rack": ["rack_location"],
+    }
+
+    _RACK_PRODUCT_FIELDS = [
+        "rack_location",
+        "categ_id",
+        "name",
+        "barcode",
+        "uom_id",
+        "qty_available",
+        "sale_ok",
+        "active",
+    ]
+
+    _ACCOUNT_MOVE_LINE_FIELDS = [
+        "journal_id",
+        "date",
+        "move_id",
+        "account_id",
+        "name",
+        "debit",
+        "credit",
+    ]
 
     def __init__(
         self,
@@ -100,12 +166,183 @@ class Odoo:
             print("Fault string: %s" % err.faultString, file=sys.stderr)
             # raise Exception("Odoo XMLRPC Exception")
 
+    def iter_search_read(
+        self, model: str, domain: list, fields: list, page_size=None, kwargs=None
+    ):
+        """
+        Yield the result of a `search_read` one page at a time.
+
+        Pages are read by increasing id (keyset pagination), so the cost of a
+        page does not grow with its position and at most `page_size` records
+        are held in memory.
+        """
+        page_size = page_size or Odoo.PAGE_SIZE
+        last_id = 0
+
+        while True:
+            rows = self.execute_kw(
+                model,
+                "search_read",
+                [domain + [["id", ">", last_id]], fields, 0, page_size, "id"],
+                kwargs,
+            )
+            if not rows:
+                return
+
+            last_id = rows[-1]["id"]
+            yield rows
+
+            if len(rows) < page_size:
+                return
+
+    def bulk_write(
+        self, model: str, values_by_id: dict, chunk_size=None, kwargs=None, journal=None
+    ):
+        """
+        Write `{record_id: values}`, with one `write` per chunk of records
+        getting identical values.
+
+        Each chunk is retried up to `BULK_RETRIES` times. With a `journal`
+        (JSONL file), the chunks already written are recorded and skipped when
+        the same changes are applied again, so an interrupted run can simply be
+        restarted.
+
+        Returns:
+            int: number of records written
+        """
+        chunk_size = chunk_size or Odoo.WRITE_CHUNK_SIZE
+        done = Odoo._read_journal(journal)
+
+        ids_by_values = {}
+        for record_id, values in values_by_id.items():
+            key = json.dumps(values, sort_keys=True, default=str)
+            ids_by_values.setdefault(key, (values, []))[1].append(record_id)
+
+        written = 0
+        for values, ids in ids_by_values.values():
+            for i in range(0, len(ids), chunk_size):
+                chunk = sorted(ids[i : i + chunk_size])
+                key = Odoo._journal_key(model, "write", [chunk, values])
+                if key not in done:
+                    self._execute_chunk(model, "write", [chunk, values], kwargs)
+                    Odoo._append_journal(journal, key, model, "write", chunk)
+                written += len(chunk)
+
+        logging.info(f"Wrote {written} {model} records in {len(ids_by_values)} groups")
+        return written
+
+    def bulk_create(
+        self, model: str, values_list: list, chunk_size=None, kwargs=None, journal=None
+    ):
+        """
+        Create the records of `values_list` with one `create` per chunk of
+        value dicts. Retries and `journal` work as in `bulk_write`, the ids
+        of the chunks created by a previous run are read from the journal.
+
+        Returns:
+            list: ids of the created records, in the order of `values_list`
+        """
+        chunk_size = chunk_size or Odoo.CREATE_CHUNK_SIZE
+        done = Odoo._read_journal(journal)
+
+        created_ids = []
+        for i in range(0, len(values_list), chunk_size):
+            chunk = values_list[i : i + chunk_size]
+            key = Odoo._journal_key(model, "create", [chunk])
+            if key in done:
+                ids = done[key]
+            else:
+                ids = self._execute_chunk(model, "create", [chunk], kwargs)
+                ids = ids if isinstance(ids, list) else [ids]
+                Odoo._append_journal(journal, key, model, "create", ids)
+            created_ids.extend(ids)
+
+        logging.info(f"Created {len(created_ids)} {model} records")
+        return created_ids
+
+    def bulk_unlink(
+        self, model: str, ids: list, chunk_size=None, kwargs=None, journal=None
+    ):
+        """
+        Delete the records of `ids` with one `unlink` per chunk. Retries and
+        `journal` work as in `bulk_write`.
+
+        Returns:
+            int: number of records deleted
+        """
+        chunk_size = chunk_size or Odoo.WRITE_CHUNK_SIZE
+        done = Odoo._read_journal(journal)
+
+        ids = sorted(ids)
+        for i in range(0, len(ids), chunk_size):
+            chunk = ids[i : i + chunk_size]
+            key = Odoo._journal_key(model, "unlink", [chunk])
+            if key not in done:
+                self._execute_chunk(model, "unlink", [chunk], kwargs)
+                Odoo._append_journal(journal, key, model, "unlink", chunk)
+
+        logging.info(f"Deleted {len(ids)} {model} records")
+        return len(ids)
+
+    def _execute_chunk(self, model, method, params, kwargs=None):
+        # execute_kw returns None on Odoo faults, which are retried as well
+        for attempt in range(1, Odoo.BULK_RETRIES + 1):
+            try:
+                result = self.execute_kw(model, method, params, kwargs)
+                if result is not None:
+                    return result
+                error = "Odoo fault"
+            except (OSError, xmlrpc.client.ProtocolError) as e:
+                error = e
+
+            logging.warning(
+                f"{model}.{method} failed ({error}), "
+                f"attempt {attempt}/{Odoo.BULK_RETRIES}"
+            )
+            if attempt < Odoo.BULK_RETRIES:
+                time.sleep(2**attempt)
+
+        raise RuntimeError(
+            f"{model}.{method} failed after {Odoo.BULK_RETRIES} attempts"
+        )
+
+    def _journal_key(model, method, params):
+        return hashlib.sha1(
+            json.dumps([model, method, params], sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    def _read_journal(journal):
+        if not journal or not os.path.exists(journal):
+            return {}
+
+        done = {}
+        with open(journal, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    done[entry["key"]] = entry["ids"]
+        return done
+
+    def _append_journal(journal, key, model, method, ids):
+        if not journal:
+            return
+
+        entry = {
+            "key": key,
+            "model": model,
+            "method": method,
+            "ids": ids,
+            "at": datetime.now().isoformat(timespec="seconds"),
+        }
+        with open(journal, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
     @odoo_cache()
     def get_pos_orders(
         self, date_start, date_end: str = None, include_order_lines=True
     ):
-        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
-
         data_orders = []
         data_order_lines = []
 
@@ -113,11 +350,7 @@ class Odoo:
             "pos.order",
             "search_read",
             [
-                [
-                    ["date_order", ">=", datetime_start],
-                    ["date_order", "<=", datetime_end],
-                    ["state", "in", ["done", "paid", "invoiced"]],
-                ],
+                self._pos_orders_domain(date_start, date_end),
                 [
                     "date_order",
                     "partner_id",
@@ -171,6 +404,18 @@ class Odoo:
 
         return result
 
+    def _pos_orders_domain(self, date_start, date_end=None, prefix=""):
+        """
+        Domain of the orders returned by `get_pos_orders`. `prefix` allows to
+        apply it to a related model, e.g. `order_id.` for `pos.order.line`.
+        """
+        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
+        return [
+            [f"{prefix}date_order", ">=", datetime_start],
+            [f"{prefix}date_order", "<=", datetime_end],
+            [f"{prefix}state", "in", ["done", "paid", "invoiced"]],
+        ]
+
     @odoo_cache()
     def get_report_pos_orders(self, date_start, date_end: str = None):
         (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
@@ -237,6 +482,7 @@ class Odoo:
                 ],
                 [
                     "date_order",
+                    "date_planned",
                     "display_name",
                     "partner_id",
                     "amount_total",
@@ -289,6 +535,10 @@ class Odoo:
         orders = pd.DataFrame(data_orders)
         orders = orders.drop("order_line", axis=1)
         orders["date_order"] = pd.to_datetime(orders["date_order"])
+        # Draft RFQs without lines have no planned date
+        orders["date_planned"] = pd.to_datetime(
+            orders["date_planned"].replace(False, None)
+        )
 
         result = [orders, pd.DataFrame(data_order_lines)]
 
@@ -514,29 +764,30 @@ class Odoo:
 
     @odoo_cache()
     def get_stock_moves(self, date_start, date_end):
-        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
-
         stock_moves = self.execute_kw(
             "stock.move",
             "search_read",
-            [
-                [
-                    ["date_expected", ">=", datetime_start],
-                    ["date_expected", "<=", datetime_end],
-                ],
-                [
-                    "date_expected",
-                    "location_id",
-                    "location_dest_id",
-                    "product_id",
-                    "product_qty",
-                    "price_unit",
-                    "picking_type_id",
-                    "state",
-                ],
-            ],
+            [self._stock_moves_domain(date_start, date_end), Odoo._STOCK_MOVE_FIELDS],
         )
+        return self._stock_moves_frame(stock_moves)
+
+    def iter_stock_moves(self, date_start, date_end, page_size=None):
+        for page in self.iter_search_read(
+            "stock.move",
+            self._stock_moves_domain(date_start, date_end),
+            Odoo._STOCK_MOVE_FIELDS,
+            page_size,
+        ):
+            yield self._stock_moves_frame(page)
 
+    def _stock_moves_domain(self, date_start, date_end):
+        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
+        return [
+            ["date_expected", ">=", datetime_start],
+            ["date_expected", "<=", datetime_end],
+        ]
+
+    def _stock_moves_frame(self, stock_moves):
         for sm in stock_moves:
             self._remove_odoo_id(
                 sm, ["product_id", "location_id", "picking_type_id", "location_dest_id"]
@@ -554,33 +805,151 @@ class Odoo:
 
         return result
 
+    def get_product_losses(self, date_start, date_end=None):
+        """
+        Product losses between two days: done stock moves of the 'Pertes'
+        picking type into the 'Inventory loss' location, as the `product_loss`
+        view of the warehouse.
+
+        Losses are computed from `get_stock_moves` and cached per month once
+        the month is over, so only the current month and the months not cached
+        yet are read again from Odoo.
+        """
+        (day_start, day_end) = (
+            Odoo._to_day(date_start),
+            Odoo._to_day(date_end if date_end is not None else date_start),
+        )
+
+        picking_types = self.get_stock_picking_types()
+        locations = self.get_stock_locations()
+        loss_picking_type_ids = picking_types.loc[
+            picking_types["name"] == "Pertes", "id"
+        ].tolist()
+        loss_location_ids = locations.loc[
+            locations["name"] == "Inventory loss", "id"
+        ].tolist()
+
+        tiles = []
+        today = datetime.now().strftime("%Y-%m-%d")
+        for month in iterate_months(
+            datetime.strptime(day_start, "%Y-%m-%d"),
+            datetime.strptime(day_end, "%Y-%m-%d"),
+        ):
+            (month_start, month_end) = month_interval(month)
+            cache_key = f"get_product_losses:{month_start}_{month_end}:"
+            final = month_end < today
+            tile = self._check_cache(cache_key) if final else None
+            if tile is None:
+                # The moves may have been cached while the month was still going
+                # on, they are read again until the month is over and its tile
+                # is cached
+                self.delete_cache_by_prefix(
+                    f"get_stock_moves:{month_start}_{month_end}:"
+                )
+                tile = self._product_losses_tile(
+                    month_start, month_end, loss_picking_type_ids, loss_location_ids
+                )
+                if final:
+                    self._set_cache(cache_key, tile)
+            tiles.append(tile)
+
+        losses = pd.concat(tiles, ignore_index=True)
+
+        (datetime_start, datetime_end) = self._interval_dates(day_start, day_end)
+        dates = losses["date_expected"]
+        losses = losses[
+            (dates >= datetime_start.replace(tzinfo=None))
+            & (dates <= datetime_end.replace(tzinfo=None))
+        ]
+        return losses.reset_index(drop=True)
+
+    def _product_losses_tile(
+        self, date_start, date_end, loss_picking_type_ids, loss_location_ids
+    ):
+        stock_moves = self.get_stock_moves(date_start, date_end)
+        if stock_moves is None or stock_moves.empty:
+            return pd.DataFrame(columns=Odoo._PRODUCT_LOSS_COLUMNS)
+
+        losses = stock_moves[
+            (stock_moves["state"] == "done")
+            & stock_moves["stock_picking_type_id"].isin(loss_picking_type_ids)
+            & stock_moves["dest_stock_location_id"].isin(loss_location_ids)
+        ]
+        losses = losses.assign(
+            loss_value=losses["product_qty"] * losses["price_unit"].abs()
+        )
+        return losses[Odoo._PRODUCT_LOSS_COLUMNS].reset_index(drop=True)
+
+    def get_product_loss_rollups(self, date_start, date_end=None):
+        """
+        Losses between two days summed by product, category and rack
+
+        Returns:
+            dict: {"product": DataFrame, "category": DataFrame, "rack": DataFrame}
+        """
+        losses = self.get_product_losses(date_start, date_end)
+
+        product_ids = [int(i) for i in losses["product_id"].unique()]
+        products = pd.DataFrame(
+            self.execute_kw(
+                "product.product",
+                "search_read",
+                [[["id", "in", product_ids]], ["name", "categ_id", "rack_location"]],
+                {"context": {"active_test": False, "lang": "fr_FR"}},
+            )
+            or [],
+            columns=["id", "name", "categ_id", "rack_location"],
+        )
+        products["category_id"] = products["categ_id"].str[0]
+        products["category_name"] = products["categ_id"].str[1]
+        products["rack_location"] = products["rack_location"].replace(False, None)
+        products = products.rename(columns={"id": "product_id", "name": "product_name"})
+
+        losses = losses.merge(
+            products.drop(columns="categ_id"), on="product_id", how="left"
+        )
+
+        return {
+            rollup: losses.groupby(columns, dropna=False)
+            .agg(
+                qty=("product_qty", "sum"),
+                loss_value=("loss_value", "sum"),
+                nb_moves=("product_qty", "size"),
+            )
+            .reset_index()
+            .sort_values("loss_value", ascending=False, ignore_index=True)
+            for rollup, columns in Odoo._PRODUCT_LOSS_ROLLUPS.items()
+        }
+
     @odoo_cache(force_fetch=False)
     def get_stock_move_lines(self, date_start, date_end):
-        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
-
         result = self.execute_kw(
             "stock.move.line",
             "search_read",
             [
-                [
-                    ["date", ">=", datetime_start],
-                    ["date", "<", datetime_end],
-                ],
-                [
-                    "date",
-                    "location_id",
-                    "location_dest_id",
-                    "move_id",
-                    "product_qty",
-                    "product_id",
-                    "product_uom_id",
-                    "product_uom_qty",
-                    "qty_done",
-                    "state",
-                ],
+                self._stock_move_lines_domain(date_start, date_end),
+                Odoo._STOCK_MOVE_LINE_FIELDS,
             ],
         )
+        return self._stock_move_lines_frame(result)
 
+    def iter_stock_move_lines(self, date_start, date_end, page_size=None):
+        for page in self.iter_search_read(
+            "stock.move.line",
+            self._stock_move_lines_domain(date_start, date_end),
+            Odoo._STOCK_MOVE_LINE_FIELDS,
+            page_size,
+        ):
+            yield self._stock_move_lines_frame(page)
+
+    def _stock_move_lines_domain(self, date_start, date_end):
+        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
+        return [
+            ["date", ">=", datetime_start],
+            ["date", "<", datetime_end],
+        ]
+
+    def _stock_move_lines_frame(self, result):
         for row in result:
             self._remove_odoo_id(
                 row,
@@ -692,29 +1061,34 @@ class Odoo:
 
     @odoo_cache()
     def get_account_move_lines(self, date_start, date_end):
-        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
-
         result = self.execute_kw(
             "account.move.line",
             "search_read",
             [
-                [
-                    ["date", ">=", datetime_start],
-                    ["date", "<=", datetime_end],
-                    ["parent_state", "=", "posted"],
-                ],
-                [
-                    "journal_id",
-                    "date",
-                    "move_id",
-                    "account_id",
-                    "name",
-                    "debit",
-                    "credit",
-                ],
+                self._account_move_lines_domain(date_start, date_end),
+                Odoo._ACCOUNT_MOVE_LINE_FIELDS,
             ],
         )
+        return self._account_move_lines_frame(result)
 
+    def iter_account_move_lines(self, date_start, date_end, page_size=None):
+        for page in self.iter_search_read(
+            "account.move.line",
+            self._account_move_lines_domain(date_start, date_end),
+            Odoo._ACCOUNT_MOVE_LINE_FIELDS,
+            page_size,
+        ):
+            yield self._account_move_lines_frame(page)
+
+    def _account_move_lines_domain(self, date_start, date_end):
+        (datetime_start, datetime_end) = self._interval_dates(date_start, date_end)
+        return [
+            ["date", ">=", datetime_start],
+            ["date", "<=", datetime_end],
+            ["parent_state", "=", "posted"],
+        ]
+
+    def _account_move_lines_frame(self, result):
         for line in result:
             line["move_ref"] = line["move_id"][1]
             self._remove_odoo_id(line, ["journal_id", "account_id", "move_id"])
@@ -987,37 +1361,117 @@ class Odoo:
     Liste des produits vendable d'un rayon. Cette liste peut servir de base à l'inventaire.
     """
 
-    @odoo_cache(ttl=ONE_DAY)
-    def products_by_racks(self):
+    def products_by_racks(self, full=False):
+        """
+        Saleable products indexed by rack_location (sorted by rack and name),
+        with their barcode, unit of measure and expected quantity.
+
+        The snapshot is kept in the cache and, unless `full`, only the products
+        (or templates) and stock quants written or deleted since the previous
+        call are read again. Deleted products are only dropped by a `full`
+        refresh.
+        """
+        cache_key = "products_by_racks"
+        cached = None if full else self._check_cache(cache_key)
+        # A margin for the clock difference with the Odoo server
+        synced_at = (datetime.now(pytz.utc) - timedelta(minutes=5)).strftime(
+            "%Y-%m-%d %H:%M:%S"
+        )
 
-        result = self.execute_kw(
+        if cached is None:
+            products = self._rack_products([["sale_ok", "=", True]])
+            quants = self._rack_quants([])
+        else:
+            products = cached["products"]
+            quants = cached["quants"]
+            changed_ids = self._rack_changed_product_ids(cached["synced_at"], quants)
+            logging.info(f"products_by_racks: {len(changed_ids)} changed products")
+            if changed_ids:
+                changed = self._rack_products(
+                    [["id", "in", changed_ids]], {"context": {"active_test": False}}
+                )
+                products = pd.concat(
+                    [
+                        products[~products["product_id"].isin(changed_ids)],
+                        changed[changed["sale_ok"] & changed["active"]],
+                    ],
+                    ignore_index=True,
+                )
+
+        self._set_cache(
+            cache_key, {"synced_at": synced_at, "products": products, "quants": quants}
+        )
+
+        return (
+            products.sort_values(["rack_location", "name"], na_position="last")
+            .set_index("rack_location")
+            .drop(columns=["sale_ok", "active"])
+        )
+
+    def _rack_products(self, domain, kwargs=None):
+        rows = []
+        for page in self.iter_search_read(
+            "product.product", domain, Odoo._RACK_PRODUCT_FIELDS, kwargs=kwargs
+        ):
+            rows.extend(page)
+
+        products = pd.DataFrame(rows, columns=["id"] + Odoo._RACK_PRODUCT_FIELDS)
+        products["categ"] = products["categ_id"].str[1]
+        products["uom"] = products["uom_id"].str[1]
+        for column in ["rack_location", "barcode"]:
+            products[column] = products[column].replace(False, None)
+        return products.rename(columns={"id": "product_id"})[
+            [
+                "product_id",
+                "rack_location",
+                "categ",
+                "name",
+                "barcode",
+                "uom",
+                "qty_available",
+                "sale_ok",
+                "active",
+            ]
+        ]
+
+    def _rack_quants(self, domain):
+        """Product of the stock quants, {quant_id: product_id}"""
+        quants = {}
+        for page in self.iter_search_read("stock.quant", domain, ["product_id"]):
+            quants.update((quant["id"], quant["product_id"][0]) for quant in page)
+        return quants
+
+    def _rack_changed_product_ids(self, since, quants):
+        """
+        Products (or templates) written since `since`, and products whose
+        stock quants were written or deleted (by the zero quants cleanup),
+        `quants` being updated in place
+        """
+        product_ids = self.execute_kw(
             "product.product",
-            "search_read",
+            "search",
             [
-                # query
-                [["sale_ok", "=", True]],  # , ["rack_location", "in", racks]],
-                # fields
                 [
-                    "rack_location",
-                    # "product_variant_ids",
-                    "categ_id",
-                    "name",
-                    "barcode",
-                    "uom_id",
-                    "qty_available",
-                ],
-                0,
-                0,
-                "rack_location,name",
+                    "|",
+                    ["write_date", ">", since],
+                    ["product_tmpl_id.write_date", ">", since],
+                ]
             ],
+            {"context": {"active_test": False}},
         )
 
-        for product in result:
-            product["categ"] = product["categ_id"][1]
-
-        result = pd.DataFrame(result, columns=["rack_location", "categ"])
-        result.drop_duplicates(inplace=True)
-        return result.shape
+        # The expected quantity changes with the quants of the product, a
+        # deleted quant leaves no write_date behind: diff the quant ids
+        written = self._rack_quants([["write_date", ">", since]])
+        quant_ids = set(self.execute_kw("stock.quant", "search", [[]]) or [])
+        deleted = {
+            quant_id: quants.pop(quant_id) for quant_id in set(quants) - quant_ids
+        }
+        quants.update(written)
+
+        return sorted(
+            set(product_ids or []) | set(written.values()) | set(deleted.values())
+        )
 
     def _remove_odoo_id(self, odoo_object, oddo_id_fields):
         for odoo_field in oddo_id_fields:
@@ -1072,6 +1526,11 @@ class Odoo:
 
         return self._to_utc(date_start), self._to_utc(date_end)
 
+    def _to_day(value):
+        if isinstance(value, str):
+            return value[:10]
+        return value.strftime("%Y-%m-%d")
+
     def _to_utc(self, local_datetime_str: str):
         return self._local_tz.localize(
             datetime.strptime(local_datetime_str, "%Y-%m-%d %H:%M:%S")
@@ -0,0 +1,147 @@
+import logging, pandas as pd
+
+from otsokop.dates import month_interval
+
+# Amounts are summed in a different order by Odoo and the warehouse
+AMOUNT_TOLERANCE = 0.01
+
+WAREHOUSE_ORDERS_QUERY = """
+    SELECT
+        count(*) AS nb,
+        sum(amount_total) AS amount
+    FROM
+        pos_order
+    WHERE
+        date_order >= :date_start
+        AND date_order <= :date_end
+"""
+
+WAREHOUSE_LINES_QUERY = """
+    SELECT
+        count(*) AS nb,
+        sum(pod.price_subtotal_incl) AS amount
+    FROM
+        pos_order_detail pod
+    INNER JOIN pos_order po ON
+        pod.pos_order_id = po.id
+    WHERE
+        po.date_order >= :date_start
+        AND po.date_order <= :date_end
+"""
+
+
+def odoo_totals(client, model, domain, amount_field):
+    """
+    Record count and sum of `amount_field`, computed by Odoo in one
+    `read_group` call.
+    """
+    groups = client.execute_kw(model, "read_group", [domain, [amount_field], []])
+    if not groups:
+        return 0, 0.0
+    return groups[0].get("__count", 0), groups[0].get(amount_field) or 0.0
+
+
+def warehouse_totals(warehouse, query, datetime_start, datetime_end):
+    result = warehouse.read_sql(
+        query,
+        {
+            "date_start": datetime_start.strftime("%Y-%m-%d %H:%M:%S"),
+            "date_end": datetime_end.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    )
+    return int(result["nb"][0] or 0), float(result["amount"][0] or 0.0)
+
+
+def reconcile_month(client, warehouse, month_date):
+    """
+    Compare the `pos_order` and `pos_order_detail` rows of a month in the
+    warehouse with Odoo (counts and amounts).
+    """
+    (date_start, date_end) = month_interval(month_date)
+    (datetime_start, datetime_end) = client._interval_dates(date_start, date_end)
+
+    (odoo_orders, odoo_amount) = odoo_totals(
+        client,
+        "pos.order",
+        client._pos_orders_domain(date_start, date_end),
+        "amount_total",
+    )
+    (odoo_lines, odoo_lines_amount) = odoo_totals(
+        client,
+        "pos.order.line",
+        client._pos_orders_domain(date_start, date_end, prefix="order_id."),
+        "price_subtotal_incl",
+    )
+    (wh_orders, wh_amount) = warehouse_totals(
+        warehouse, WAREHOUSE_ORDERS_QUERY, datetime_start, datetime_end
+    )
+    (wh_lines, wh_lines_amount) = warehouse_totals(
+        warehouse, WAREHOUSE_LINES_QUERY, datetime_start, datetime_end
+    )
+
+    ok = (
+        odoo_orders == wh_orders
+        and odoo_lines == wh_lines
+        and _same_amount(odoo_amount, wh_amount)
+        and _same_amount(odoo_lines_amount, wh_lines_amount)
+    )
+
+    return {
+        "month": month_date.strftime("%Y-%m"),
+        "odoo_orders": odoo_orders,
+        "warehouse_orders": wh_orders,
+        "odoo_amount": odoo_amount,
+        "warehouse_amount": wh_amount,
+        "odoo_lines": odoo_lines,
+        "warehouse_lines": wh_lines,
+        "odoo_lines_amount": odoo_lines_amount,
+        "warehouse_lines_amount": wh_lines_amount,
+        "ok": ok,
+    }
+
+
+def reconcile_months(client, warehouse, months):
+    report = []
+    for month_date in months:
+        result = reconcile_month(client, warehouse, month_date)
+        if not result["ok"]:
+            logging.warning(f"Warehouse mismatch for {result['month']}: {result}")
+        report.append(result)
+    return pd.DataFrame(report)
+
+
+def delete_pos_orders(warehouse, client, month_date):
+    """
+    Remove the orders of a month from the warehouse (and their cached Odoo
+    copy) before reloading them.
+    """
+    (date_start, date_end) = month_interval(month_date)
+    (datetime_start, datetime_end) = client._interval_dates(date_start, date_end)
+    params = {
+        "date_start": datetime_start.strftime("%Y-%m-%d %H:%M:%S"),
+        "date_end": datetime_end.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+    with warehouse.engine.begin() as conn:
+        warehouse.execute(
+            conn,
+            """
+            DELETE FROM pos_order_detail WHERE pos_order_id IN (
+                SELECT id FROM pos_order
+                WHERE date_order >= :date_start AND date_order <= :date_end
+            )
+            """,
+            params,
+        )
+        warehouse.execute(
+            conn,
+            "DELETE FROM pos_order "
+            "WHERE date_order >= :date_start AND date_order <= :date_end",
+            params,
+        )
+
+    client.delete_cache_by_prefix(f"get_pos_orders:{date_start}_{date_end}")
+
+
+def _same_amount(a, b):
+    return abs(a - b) <= AMOUNT_TOLERANCE
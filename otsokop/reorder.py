@@ -0,0 +1,213 @@
+import logging, numpy as np, pandas as pd
+
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from otsokop.dates import iterate_months, month_interval
+
+HISTORY_MONTHS = 3
+
+# Lead time of the suppliers without any dated purchase order
+DEFAULT_LEAD_DAYS = 7
+
+# Days of sales kept as safety stock, and covered by each order on top of the
+# lead time (time until the next order)
+SAFETY_DAYS = 3
+REVIEW_DAYS = 7
+
+HISTORY_MEASURES = ["sales_qty", "loss_qty", "incoming_qty"]
+
+PURCHASE_STATES = ["purchase", "done"]
+
+
+def reorder_points(client, today=None, months=HISTORY_MONTHS):
+    """
+    Average daily sales, days of cover and suggested order quantity of every
+    product, from the product history and the purchase orders of the last
+    `months` months (and the current one).
+
+    The history of each month is summed per product once and kept in the Odoo
+    cache when the month is over, so a daily run only reads the current month.
+
+    Returns:
+        DataFrame: one row per product with its supplier, lead time, stock,
+        quantity on order, reorder point and quantity to order
+    """
+    today = today or date.today()
+    months_range = list(iterate_months(today - relativedelta(months=months), today))
+    days = (today - months_range[0]).days + 1
+
+    history = pd.concat([history_tile(client, month, today) for month in months_range])
+    # The stock is the end quantity of the last month with a history
+    stock = history.groupby(level=0)["end_qty"].last()
+    history = history.groupby(level=0)[HISTORY_MEASURES].sum()
+    history["end_qty"] = stock
+
+    (orders, lines) = purchases(client, months_range, today)
+    suppliers = product_suppliers(orders, lines)
+    lead_times = supplier_lead_times(orders)
+
+    result = history.join(suppliers, how="outer")
+    result.index.name = "product_id"
+    result["partner_id"] = result["partner_id"].astype("Int64")
+    result = result.join(lead_times, on="partner_id")
+    result = result.join(quantities_on_order(client))
+    result = result.fillna(
+        {
+            **dict.fromkeys(HISTORY_MEASURES + ["end_qty", "on_order_qty"], 0.0),
+            "lead_days": DEFAULT_LEAD_DAYS,
+        }
+    )
+
+    result["avg_daily_sales"] = result["sales_qty"] / days
+    sales = result["avg_daily_sales"].to_numpy()
+    available = (result["end_qty"] + result["on_order_qty"]).to_numpy()
+    lead_days = result["lead_days"].to_numpy()
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result["days_of_cover"] = np.where(
+            sales > 0, np.clip(result["end_qty"], 0, None) / sales, np.inf
+        )
+    result["reorder_point"] = sales * (lead_days + SAFETY_DAYS)
+    order_up_to = sales * (lead_days + SAFETY_DAYS + REVIEW_DAYS)
+    result["reorder_qty"] = np.where(
+        available <= result["reorder_point"],
+        np.ceil(np.clip(order_up_to - available, 0, None)),
+        0.0,
+    )
+
+    logging.info(
+        f"reorder_points: {len(result)} products, "
+        f"{int((result['reorder_qty'] > 0).sum())} to order"
+    )
+    return result.reset_index()
+
+
+def history_tile(client, month, today):
+    """
+    Sales, losses and incoming quantities of the month summed per product,
+    with the end quantity of its last period (summed over the locations)
+    """
+    cache_key = f"reorder_history:{month:%Y-%m}"
+    tile = client._check_cache(cache_key)
+    if tile is not None:
+        return tile
+
+    (date_start, date_end) = month_interval(month)
+    final = date_end < today.strftime("%Y-%m-%d")
+    # The history may have been cached while the month was still going on, it
+    # is read again until the month is over and its tile is cached
+    client.delete_cache_by_prefix(f"get_product_history:{date_start}_{date_end}:")
+    history = client.get_product_history(date_start, date_end)
+
+    if history is None or history.empty:
+        tile = pd.DataFrame(
+            columns=HISTORY_MEASURES + ["end_qty"],
+            index=pd.Index([], name="product_id"),
+            dtype=float,
+        )
+    else:
+        history = history[~history["ignored"]]
+        last_periods = history[
+            history["to_date"]
+            == history.groupby(["product_id", "stock_location_id"])[
+                "to_date"
+            ].transform("max")
+        ]
+        tile = history.groupby("product_id")[HISTORY_MEASURES].sum()
+        tile["end_qty"] = last_periods.groupby("product_id")["end_qty"].sum()
+
+    if final:
+        client._set_cache(cache_key, tile)
+    return tile
+
+
+def purchases(client, months, today):
+    """Confirmed purchase orders and their lines over the months"""
+    orders = []
+    lines = []
+    for month in months:
+        (month_orders, month_lines) = purchases_tile(client, month, today)
+        orders.append(month_orders)
+        lines.append(month_lines)
+
+    orders = pd.concat(orders, ignore_index=True)
+    orders = orders[orders["state"].isin(PURCHASE_STATES)]
+    lines = pd.concat(lines, ignore_index=True)
+    if lines.empty:
+        lines = pd.DataFrame(columns=["order_id", "product_id", "date_order"])
+    lines = lines[lines["order_id"].isin(orders["id"])]
+    return orders, lines
+
+
+def purchases_tile(client, month, today):
+    """
+    Purchase orders of the month and their lines, kept in the Odoo cache once
+    the month is over
+    """
+    cache_key = f"reorder_purchases:{month:%Y-%m}"
+    tile = client._check_cache(cache_key)
+    if tile is not None:
+        return tile
+
+    (date_start, date_end) = month_interval(month)
+    final = date_end < today.strftime("%Y-%m-%d")
+    # The orders may have been cached while the month was still going on, they
+    # are read again until the month is over and its tile is cached
+    client.delete_cache_by_prefix(f"get_purchase_orders:{date_start}_{date_end}:")
+    tile = client.get_purchase_orders(date_start, date_end, include_order_lines=True)
+
+    if final:
+        client._set_cache(cache_key, tile)
+    return tile
+
+
+def product_suppliers(orders, lines):
+    """Supplier of the last purchase order of each product"""
+    lines = lines.merge(
+        orders[["id", "partner_id"]], left_on="order_id", right_on="id"
+    )
+    return (
+        lines.sort_values("date_order")
+        .groupby("product_id")[["partner_id"]]
+        .last()
+    )
+
+
+def supplier_lead_times(orders):
+    """
+    Median number of days between the order and its planned reception, per
+    supplier. Orders cached before `date_planned` was read are ignored.
+    """
+    if "date_planned" not in orders:
+        return pd.DataFrame(columns=["lead_days"], dtype=float)
+
+    orders = orders.dropna(subset=["date_planned"])
+    delays = (orders["date_planned"] - orders["date_order"]).dt.total_seconds()
+    return (
+        (delays / 86400)
+        .clip(lower=0)
+        .groupby(orders["partner_id"])
+        .median()
+        .round()
+        .to_frame("lead_days")
+    )
+
+
+def quantities_on_order(client):
+    """Quantity ordered but not received yet, per product"""
+    rows = []
+    for page in client.iter_search_read(
+        "purchase.order.line",
+        [["order_id.state", "=", "purchase"]],
+        ["product_id", "product_qty", "qty_received"],
+    ):
+        rows.extend(page)
+
+    lines = pd.DataFrame(
+        rows, columns=["id", "product_id", "product_qty", "qty_received"]
+    )
+    lines["product_id"] = lines["product_id"].str[0]
+    lines["on_order_qty"] = (lines["product_qty"] - lines["qty_received"]).clip(
+        lower=0
+    )
+    return lines.groupby("product_id")[["on_order_qty"]].sum()
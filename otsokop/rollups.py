@@ -0,0 +1,147 @@
+import logging, pandas as pd
+
+from dateutil.relativedelta import relativedelta
+
+GRAINS = ("day", "week", "month")
+
+ROLLUP_DIMENSIONS = [
+    "product_id",
+    "product_category_id",
+    "product_rack_code",
+    "state",
+]
+
+ROLLUP_INDEXES = [
+    ["period_start", "product_id"],
+    ["period_start", "product_category_id"],
+    ["period_start", "product_rack_code"],
+]
+
+SALES_QUERY = """
+    SELECT
+        po.date_order,
+        po.state,
+        pod.product_id,
+        p.product_category_id,
+        p.product_rack_code,
+        pod.qty,
+        pod.price_subtotal,
+        pod.price_subtotal_incl
+    FROM
+        pos_order_detail pod
+    INNER JOIN pos_order po ON
+        pod.pos_order_id = po.id
+    LEFT JOIN product p ON
+        pod.product_id = p.id
+    WHERE
+        po.date_order >= :date_start
+        AND po.date_order < :date_end
+"""
+
+
+def rollup_table(grain):
+    return f"sales_rollup_{grain}"
+
+
+def period_start(dates, grain):
+    days = dates.dt.normalize()
+    if grain == "day":
+        return days
+    if grain == "week":
+        return days - pd.to_timedelta(days.dt.weekday, unit="D")
+    return days - pd.to_timedelta(days.dt.day - 1, unit="D")
+
+
+def update_sales_rollups(warehouse, date_start, date_end):
+    """
+    Recompute the `sales_rollup_{day,week,month}` tables for the periods
+    overlapping [date_start, date_end] (datetimes, date_end inclusive).
+
+    Rows are aggregated per product (with its category and rack) and order
+    state. The weeks and months touching `date_start` and `date_end` are
+    recomputed from their first to their last day, so reloading a single
+    month keeps the weeks spanning two months exact.
+    """
+    date_start = pd.Timestamp(date_start).normalize()
+    date_end = pd.Timestamp(date_end).normalize() + relativedelta(days=1)
+    last_day = date_end - relativedelta(days=1)
+    windows = {
+        "day": (date_start, date_end),
+        "week": (
+            date_start - relativedelta(days=date_start.weekday()),
+            last_day + relativedelta(days=7 - last_day.weekday()),
+        ),
+        "month": (
+            date_start.replace(day=1),
+            last_day.replace(day=1) + relativedelta(months=1),
+        ),
+    }
+
+    read_start = min(start for (start, _) in windows.values())
+    read_end = max(end for (_, end) in windows.values())
+
+    sales = warehouse.read_sql(
+        SALES_QUERY,
+        {
+            "date_start": read_start.strftime("%Y-%m-%d %H:%M:%S"),
+            "date_end": read_end.strftime("%Y-%m-%d %H:%M:%S"),
+        },
+    )
+    sales["date_order"] = pd.to_datetime(sales["date_order"])
+    sales["sales_ttc"] = sales["price_subtotal_incl"].where(
+        sales["price_subtotal_incl"] > 0, 0
+    )
+
+    existing_tables = warehouse.get_table_names()
+
+    for grain in GRAINS:
+        table = rollup_table(grain)
+        (window_start, window_end) = windows[grain]
+
+        rows = sales[
+            (sales["date_order"] >= window_start) & (sales["date_order"] < window_end)
+        ]
+        rollup = _aggregate(rows, grain)
+
+        if table in existing_tables:
+            with warehouse.engine.begin() as conn:
+                warehouse.execute(
+                    conn,
+                    f"DELETE FROM {warehouse.quote(table)} "
+                    "WHERE period_start >= :date_start AND period_start < :date_end",
+                    {
+                        "date_start": window_start.strftime("%Y-%m-%d %H:%M:%S"),
+                        "date_end": window_end.strftime("%Y-%m-%d %H:%M:%S"),
+                    },
+                )
+
+        if rollup.empty:
+            continue
+
+        warehouse.append(rollup, table)
+        if table not in existing_tables:
+            for columns in ROLLUP_INDEXES:
+                warehouse.add_index(table, columns, name=f"idx_{table}_{columns[1]}")
+
+        logging.info(
+            f"Updated {len(rollup)} rows in `{table}` from {window_start:%Y-%m-%d}"
+        )
+
+
+def _aggregate(sales, grain):
+    sales = sales.assign(period_start=period_start(sales["date_order"], grain))
+
+    rollup = (
+        sales.groupby(["period_start"] + ROLLUP_DIMENSIONS, dropna=False)
+        .agg(
+            qty=("qty", "sum"),
+            amount_untaxed=("price_subtotal", "sum"),
+            amount_ttc=("price_subtotal_incl", "sum"),
+            sales_ttc=("sales_ttc", "sum"),
+            nb_lines=("qty", "size"),
+        )
+        .reset_index()
+    )
+    rollup.insert(1, "year", rollup["period_start"].dt.year)
+    rollup.insert(2, "quarter", rollup["period_start"].dt.quarter)
+    return rollup
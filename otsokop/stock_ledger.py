@@ -0,0 +1,218 @@
+import bisect, logging, pandas as pd
+
+from datetime import date
+from otsokop.dates import iterate_months, month_interval
+
+LEDGER_KEY = ["product_id", "location_id"]
+
+
+class StockLedger:
+    """
+    Point-in-time stock quantity per (product, location), replayed from the
+    done move lines of `Odoo.get_stock_move_lines`, month by month:
+
+        ledger = StockLedger(client, date(2024, 1, 1))
+        ledger.quantity_at(product_id, location_id, datetime(2024, 6, 15))
+        ledger.quantity_series(product_id, location_id, "2024-06-01", "2024-06-30")
+
+    The cumulative quantities at the end of each month (checkpoints) are kept
+    in the Odoo cache once the month is over. A query starts from the
+    checkpoint of the previous month and only adds the move lines of the
+    queried month, read again from Odoo until its checkpoint is cached.
+
+    Quantities are relative to `date_start` (the stock is assumed empty at that
+    date), use `qty_done` without unit of measure conversion, and dates are the
+    UTC dates of Odoo.
+    """
+
+    def __init__(self, client, date_start, date_end=None):
+        self.client = client
+        self.date_start = pd.Timestamp(date_start).to_pydatetime().date()
+        self.date_end = pd.Timestamp(date_end or date.today()).to_pydatetime().date()
+        self._months = list(iterate_months(self.date_start, self.date_end))
+        self._checkpoints = {}
+        self._deltas = {}
+
+    def quantity_at(self, product_id, location_id, at):
+        """Quantity of the product at the location at datetime `at`"""
+        quantities = self.quantities_at(at)
+        return float(quantities.get((product_id, location_id), 0.0))
+
+    def quantities_at(self, at, product_ids=None, location_ids=None):
+        """
+        Quantities of all the (product, location) at datetime `at`
+
+        Returns:
+            Series: quantity indexed by (product_id, location_id)
+        """
+        at = pd.Timestamp(at)
+        month = self._month_of(at)
+        if month is None:
+            return StockLedger._empty_quantities()
+
+        deltas = self._month_deltas(month)
+        deltas = deltas[deltas["date"] <= at]
+        quantities = self._checkpoint_before(month).add(
+            deltas.groupby(LEDGER_KEY)["qty"].sum(), fill_value=0.0
+        )
+
+        if product_ids is not None:
+            quantities = quantities[
+                quantities.index.get_level_values("product_id").isin(product_ids)
+            ]
+        if location_ids is not None:
+            quantities = quantities[
+                quantities.index.get_level_values("location_id").isin(location_ids)
+            ]
+        return quantities
+
+    def quantity_series(self, product_id, location_id, date_start, date_end):
+        """
+        End of day quantity of the product at the location, for each day of
+        [date_start, date_end]
+
+        Returns:
+            Series: quantity indexed by day
+        """
+        days = pd.date_range(
+            pd.Timestamp(date_start).normalize(),
+            pd.Timestamp(date_end).normalize(),
+            freq="D",
+        )
+        if days.empty:
+            return pd.Series(dtype=float)
+
+        opening = self.quantity_at(
+            product_id, location_id, days[0] - pd.Timedelta(microseconds=1)
+        )
+
+        moves = []
+        for month in iterate_months(days[0].date(), days[-1].date()):
+            if month not in self._months:
+                continue
+            deltas = self._month_deltas(month)
+            moves.append(
+                deltas[
+                    (deltas["product_id"] == product_id)
+                    & (deltas["location_id"] == location_id)
+                ]
+            )
+
+        daily = pd.Series(0.0, index=days)
+        if moves:
+            moves = pd.concat(moves)
+            moves = moves[
+                (moves["date"] >= days[0])
+                & (moves["date"] < days[-1] + pd.Timedelta(days=1))
+            ]
+            daily = daily.add(
+                moves.groupby(moves["date"].dt.normalize())["qty"].sum(),
+                fill_value=0.0,
+            )
+        return opening + daily.cumsum()
+
+    def checkpoint(self, month_date):
+        """
+        Quantities at the end of the month of `month_date`
+
+        Returns:
+            Series: quantity indexed by (product_id, location_id)
+        """
+        month = month_date.replace(day=1)
+        if hasattr(month, "date"):
+            month = month.date()
+        if month not in self._checkpoints:
+            self._checkpoints[month] = self._compute_checkpoint(month)
+        return self._checkpoints[month]
+
+    def _compute_checkpoint(self, month):
+        cache_key = self._checkpoint_key(month)
+        checkpoint = self.client._check_cache(cache_key)
+        if checkpoint is not None:
+            return checkpoint
+
+        deltas = self._month_deltas(month)
+        checkpoint = self._checkpoint_before(month).add(
+            deltas.groupby(LEDGER_KEY)["qty"].sum(), fill_value=0.0
+        )
+        checkpoint = checkpoint[checkpoint.round(6) != 0]
+
+        # Only the months which are over are final
+        (_, last_day) = month_interval(month)
+        if last_day < date.today().strftime("%Y-%m-%d"):
+            self.client._set_cache(cache_key, checkpoint)
+        return checkpoint
+
+    def _checkpoint_key(self, month):
+        return f"stock_ledger:{self.date_start}:{month:%Y-%m}"
+
+    def _checkpoint_before(self, month):
+        index = self._months.index(month)
+        if index == 0:
+            return StockLedger._empty_quantities()
+        return self.checkpoint(self._months[index - 1])
+
+    def _month_of(self, at):
+        if at < pd.Timestamp(self._months[0]):
+            return None
+        index = bisect.bisect_right([pd.Timestamp(m) for m in self._months], at)
+        return self._months[index - 1]
+
+    def _month_deltas(self, month):
+        """
+        Quantity changes of the month: each done move line removes its
+        quantity from its source location and adds it to its destination.
+        """
+        if month in self._deltas:
+            return self._deltas[month]
+
+        (date_start, date_end) = month_interval(month)
+        final = date_end < date.today().strftime("%Y-%m-%d")
+        if not final or self.client._check_cache(self._checkpoint_key(month)) is None:
+            # The move lines may have been cached while the month was still
+            # going on, they are read again until the month is over and its
+            # checkpoint is cached
+            self.client.delete_cache_by_prefix(
+                f"get_stock_move_lines:{date_start}_{date_end}:"
+            )
+        move_lines = self.client.get_stock_move_lines(date_start, date_end)
+
+        if move_lines is None or move_lines.empty:
+            deltas = pd.DataFrame(
+                {
+                    "product_id": pd.Series(dtype="int64"),
+                    "location_id": pd.Series(dtype="int64"),
+                    "date": pd.Series(dtype="datetime64[ns]"),
+                    "qty": pd.Series(dtype=float),
+                }
+            )
+        else:
+            done = move_lines[move_lines["state"] == "done"]
+            outgoing = pd.DataFrame(
+                {
+                    "product_id": done["product_id"],
+                    "location_id": done["stock_location_id"],
+                    "date": done["date"],
+                    "qty": -done["qty_done"],
+                }
+            )
+            incoming = pd.DataFrame(
+                {
+                    "product_id": done["product_id"],
+                    "location_id": done["dest_stock_location_id"],
+                    "date": done["date"],
+                    "qty": done["qty_done"],
+                }
+            )
+            deltas = pd.concat([outgoing, incoming], ignore_index=True)
+            deltas = deltas.sort_values("date", ignore_index=True)
+            logging.debug(f"StockLedger: {len(done)} done move lines in {date_start}")
+
+        self._deltas[month] = deltas
+        return deltas
+
+    def _empty_quantities():
+        return pd.Series(
+            dtype=float,
+            index=pd.MultiIndex.from_arrays([[], []], names=LEDGER_KEY),
+        )
@@ -0,0 +1,245 @@
+import importlib.util, logging, os, pandas as pd, sqlalchemy as sa
+
+from dotenv import load_dotenv
+from sqlalchemy import event, inspect
+from sqlalchemy.sql import text
+
+PRODUCT_LOSS_VIEW = """
+    CREATE VIEW product_loss AS
+    SELECT
+        sm.date_expected,
+        sm.stock_location_id,
+        sm.product_id,
+        sm.product_qty,
+        sm.price_unit
+    FROM
+        stock_move sm
+    INNER JOIN stock_picking_type sp ON
+        sm.stock_picking_type_id = sp.id
+        AND sp.name = 'Pertes'
+    INNER JOIN stock_location sld ON
+        sm.dest_stock_location_id = sld.id
+    WHERE
+        state = 'done'
+        AND sld.name = 'Inventory loss'
+"""
+
+
+class Warehouse:
+    """
+    Target database of the Odoo dump.
+
+    The URL is read from `WAREHOUSE_ENGINE` (falling back to `MYSQL_ENGINE`):
+    - `mysql+pymysql://...`: MySQL server, with real primary and foreign keys.
+    - `duckdb:///warehouse.duckdb`: embedded columnar file. When DuckDB is not
+      installed, a SQLite file with the same name is used instead.
+    - `sqlite:///warehouse.sqlite`: embedded SQLite file.
+
+    Embedded engines cannot add constraints to existing tables, keys are
+    created as (unique) indexes instead.
+    """
+
+    EMBEDDED_DIALECTS = ("duckdb", "sqlite")
+
+    def __init__(self, url=None):
+        load_dotenv()
+
+        url = url or os.getenv("WAREHOUSE_ENGINE") or os.getenv("MYSQL_ENGINE")
+        if not url:
+            raise ValueError(
+                "Missing warehouse URL. Please set WAREHOUSE_ENGINE or MYSQL_ENGINE."
+            )
+
+        self.engine = Warehouse._create_engine(url)
+        self.dialect = self.engine.dialect.name
+
+    @property
+    def is_embedded(self):
+        return self.dialect in Warehouse.EMBEDDED_DIALECTS
+
+    def quote(self, name):
+        return self.engine.dialect.identifier_preparer.quote(name)
+
+    def append(self, df, table_name, dtype=None):
+        if self.dialect == "duckdb":
+            self._append_duckdb(df, table_name)
+        else:
+            df.to_sql(
+                name=table_name,
+                con=self.engine,
+                if_exists="append",
+                index=False,
+                dtype=dtype,
+            )
+
+    def read_sql(self, query, params=None):
+        return pd.read_sql(text(query), self.engine, params=params)
+
+    def execute(self, conn, sql, params=None):
+        conn.execute(text(sql), params or {})
+
+    def get_table_names(self):
+        return inspect(self.engine).get_table_names()
+
+    def drop_tables(self):
+        inspector = inspect(self.engine)
+
+        with self.engine.begin() as conn:
+            for view in inspector.get_view_names():
+                self.execute(conn, f"DROP VIEW {self.quote(view)}")
+
+            if self.dialect == "mysql":
+                self.execute(conn, "SET FOREIGN_KEY_CHECKS=0")
+            for table in inspector.get_table_names():
+                self.execute(conn, f"DROP TABLE {self.quote(table)}")
+            if self.dialect == "mysql":
+                self.execute(conn, "SET FOREIGN_KEY_CHECKS=1")
+
+    def add_primary_key(self, table_name, column="id", conn=None):
+        if self.is_embedded:
+            sql = (
+                f"CREATE UNIQUE INDEX {self.quote(f'pk_{table_name}')} "
+                f"ON {self.quote(table_name)} ({self.quote(column)})"
+            )
+        else:
+            sql = (
+                f"ALTER TABLE {self.quote(table_name)} "
+                f"ADD PRIMARY KEY ({self.quote(column)})"
+            )
+        self._execute_ddl(sql, conn)
+
+    def add_foreign_key(
+        self, table_name, column, ref_table, ref_column="id", name=None, conn=None
+    ):
+        name = name or f"fk_{table_name}_{ref_table}"
+        if self.is_embedded:
+            sql = (
+                f"CREATE INDEX {self.quote(name)} "
+                f"ON {self.quote(table_name)} ({self.quote(column)})"
+            )
+        else:
+            sql = (
+                f"ALTER TABLE {self.quote(table_name)} "
+                f"ADD CONSTRAINT {self.quote(name)} "
+                f"FOREIGN KEY ({self.quote(column)}) "
+                f"REFERENCES {self.quote(ref_table)}({self.quote(ref_column)})"
+            )
+        self._execute_ddl(sql, conn)
+
+    def add_index(self, table_name, columns, name=None, unique=False, conn=None):
+        name = name or f"idx_{table_name}_{'_'.join(columns)}"
+        self._execute_ddl(
+            f"CREATE {'UNIQUE ' if unique else ''}INDEX {self.quote(name)} "
+            f"ON {self.quote(table_name)} "
+            f"({', '.join(self.quote(c) for c in columns)})",
+            conn,
+        )
+
+    def add_constraints(self):
+        """
+        Add a primary key on every `id` column and a foreign key on every
+        `<table>_id` column referencing an existing table.
+        """
+        inspector = inspect(self.engine)
+
+        tables_to_alter = {}
+        all_tables = inspector.get_table_names()
+
+        for table_name in all_tables:
+            columns = inspector.get_columns(table_name)
+            pk_exists = inspector.get_pk_constraint(table_name).get(
+                "constrained_columns"
+            )
+
+            needs_pk = not pk_exists and any(col["name"] == "id" for col in columns)
+
+            potential_fks = []
+            for col in columns:
+                col_name = col["name"]
+                if col_name.endswith("_id") and col_name != "id":
+                    referenced_table = col_name[:-3]  # Remove '_id' suffix
+                    if referenced_table in all_tables:
+                        potential_fks.append((col_name, referenced_table))
+                    else:
+                        logging.info(f"No FK for `{col_name}` in `{table_name}`")
+
+            if needs_pk or potential_fks:
+                tables_to_alter[table_name] = {
+                    "needs_pk": needs_pk,
+                    "potential_fks": potential_fks,
+                }
+
+        # First loop to add PK
+        for table_name, info in tables_to_alter.items():
+            if info["needs_pk"]:
+                self.add_primary_key(table_name)
+                logging.info(f"Added PK to `{table_name}`")
+
+        # Second loop to add FK
+        for table_name, info in tables_to_alter.items():
+            for fk_col, ref_table in info["potential_fks"]:
+                self.add_foreign_key(table_name, fk_col, ref_table)
+                logging.info(
+                    f"Added FK `{fk_col}` to `{table_name}` referencing `{ref_table}`"
+                )
+
+    def create_views(self):
+        with self.engine.begin() as conn:
+            self.execute(conn, "DROP VIEW IF EXISTS product_loss")
+            self.execute(conn, PRODUCT_LOSS_VIEW)
+
+    def _execute_ddl(self, sql, conn=None):
+        try:
+            if conn is not None:
+                self.execute(conn, sql)
+            else:
+                with self.engine.begin() as conn:
+                    self.execute(conn, sql)
+        except Exception as e:
+            logging.error(f"Could not execute `{sql}`: {e}")
+
+    def _append_duckdb(self, df, table_name):
+        # Bulk insert the whole frame through DuckDB's pandas scan instead of
+        # row by row INSERT statements.
+        exists = table_name in self.get_table_names()
+        with self.engine.begin() as conn:
+            duck = conn.connection.dbapi_connection
+            duck.register("_append_df", df)
+            try:
+                if exists:
+                    duck.execute(
+                        f"INSERT INTO {self.quote(table_name)} BY NAME "
+                        "SELECT * FROM _append_df"
+                    )
+                else:
+                    duck.execute(
+                        f"CREATE TABLE {self.quote(table_name)} AS "
+                        "SELECT * FROM _append_df"
+                    )
+            finally:
+                duck.unregister("_append_df")
+
+    def _create_engine(url):
+        if url.startswith("duckdb") and not importlib.util.find_spec("duckdb_engine"):
+            url = "sqlite" + url[len("duckdb") :]
+            logging.warning(f"DuckDB is not installed, falling back to {url}")
+
+        engine = sa.create_engine(url)
+
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", Warehouse._register_sqlite_functions)
+
+        return engine
+
+    def _register_sqlite_functions(dbapi_connection, connection_record):
+        # MySQL functions used by the reports in sql/
+        dbapi_connection.create_function("quarter", 1, Warehouse._quarter)
+        dbapi_connection.create_function("concat_ws", -1, Warehouse._concat_ws)
+
+    def _quarter(value):
+        if value is None:
+            return None
+        return (int(str(value)[5:7]) - 1) // 3 + 1
+
+    def _concat_ws(separator, *values):
+        return separator.join(str(v) for v in values if v is not None)
@@ -0,0 +1,70 @@
+from datetime import date
+from otsokop.odoo import Odoo
+from otsokop.reorder import reorder_points
+import sys
+import pandas as pd
+
+client = Odoo()
+
+EXPORT_COLUMNS = {
+    "product_id": "ID",
+    "name": "Article",
+    "product_rack_code": "Rayon",
+    "supplier": "Fournisseur",
+    "lead_days": "Délai (j)",
+    "avg_daily_sales": "Ventes / jour",
+    "end_qty": "Stock",
+    "on_order_qty": "En commande",
+    "days_of_cover": "Couverture (j)",
+    "reorder_point": "Point de commande",
+    "reorder_qty": "Qté à commander",
+}
+
+
+def main():
+    today = date.today()
+    months = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    result = reorder_points(client, today, months)
+
+    products = client.get_products()
+    products = products[products["sale_ok"] & products["active"]]
+    partners = client.execute_kw(
+        "res.partner",
+        "search_read",
+        [[["supplier", "=", True]], ["name"]],
+        {"context": {"active_test": False}},
+    )
+    partners = pd.DataFrame(partners or [], columns=["id", "name"])
+
+    result = result.merge(
+        products[["id", "name", "product_rack_code"]],
+        left_on="product_id",
+        right_on="id",
+    ).merge(
+        partners.rename(columns={"id": "partner_id", "name": "supplier"}),
+        on="partner_id",
+        how="left",
+    )
+    result = result.sort_values(
+        ["supplier", "reorder_qty", "name"], ascending=[True, False, True]
+    )
+
+    to_order = result[result["reorder_qty"] > 0]
+    print(to_order[list(EXPORT_COLUMNS)].to_string(index=False))
+
+    with pd.ExcelWriter(f"output/reorder_points_{today}.xlsx") as writer:
+        for sheet_name, df in (("A commander", to_order), ("Tous", result)):
+            df.to_excel(
+                writer,
+                index=False,
+                sheet_name=sheet_name,
+                float_format="%.2f",
+                freeze_panes=(1, 2),
+                columns=list(EXPORT_COLUMNS),
+                header=list(EXPORT_COLUMNS.values()),
+            )
+
+
+if __name__ == "__main__":
+    sys.exit(main())
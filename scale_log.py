@@ -5,10 +5,16 @@ Based on: product_to_scale_bizerba/models/product_scale_log.py
 """
 
 from otsokop.odoo import Odoo
+import argparse
+import codecs
+import hashlib
+import json
 import os
-import sys
+import shutil
+import time
 import logging
 import base64
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -19,6 +25,72 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 _logger = logging.getLogger(__name__)
 
+_MISSING = object()
+
+
+class ScaleFileWriter:
+    """
+    Scale text file streamed through a buffered encoder, written in a
+    temporary file and renamed into place on exit, so the scale software never
+    picks up a partial file. A file with the same name not yet consumed by the
+    scale is kept, and the new lines are appended after its content. Nothing is
+    written when no line is.
+    """
+
+    _BUFFER_SIZE = 1024 * 1024
+
+    def __init__(self, path, encoding="utf-8", translation=None):
+        self.path = path
+        self.encoding = encoding
+        self.translation = translation
+        self.lines = 0
+        self.bytes = 0
+        self._tmp_path = None
+        self._file = None
+        self._encoder = None
+
+    def __enter__(self):
+        return self
+
+    def write(self, text):
+        if self._file is None:
+            self._open()
+        if self.translation:
+            text = text.translate(self.translation)
+        data = self._encoder.encode(text)
+        self._file.write(data)
+        self.lines += 1
+        self.bytes += len(data)
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._file is None:
+            return False
+
+        if exc_type is not None:
+            self._file.close()
+            os.remove(self._tmp_path)
+            return False
+
+        self._file.write(self._encoder.encode("", final=True))
+        self._file.close()
+        os.replace(self._tmp_path, self.path)
+        _logger.info(
+            f"Generated {os.path.basename(self.path)}: "
+            f"{self.lines} lines, {self.bytes} bytes"
+        )
+        return False
+
+    def _open(self):
+        self._tmp_path = os.path.join(
+            os.path.dirname(self.path),
+            f".{os.path.basename(self.path)}.{os.getpid()}.tmp",
+        )
+        self._encoder = codecs.getincrementalencoder(self.encoding)(errors="ignore")
+        self._file = open(self._tmp_path, "wb", buffering=self._BUFFER_SIZE)
+        if os.path.exists(self.path):
+            with open(self.path, "rb") as previous:
+                shutil.copyfileobj(previous, self._file)
+
 
 class OdooScaleLogClient:
     """Client to generate scale log files from Odoo via XML-RPC"""
@@ -49,43 +121,85 @@ class OdooScaleLogClient:
     _EXTERNAL_TEXT_ACTION_CODE = "C"
     _EXTERNAL_TEXT_DELIMITER = "#"
 
-    def __init__(self):
-        self.client = Odoo()
+    # Maximum number of records per bulk `read`
+    _READ_BATCH_SIZE = 1000
 
-    def _clean_value(self, value, product_line):
-        """Clean value according to product line configuration"""
-        if not value:
-            return ""
+    # Content hashes of the images already written in the output folder
+    _IMAGE_MANIFEST = ".images.json"
+    _IMAGE_WORKERS = 8
 
-        value = str(value)
-
-        # Handle multiline
-        if product_line.get("multiline_length"):
-            res = ""
-            current_val = value
-            while current_val:
-                res += current_val[: product_line["multiline_length"]]
-                current_val = current_val[product_line["multiline_length"] :]
-                if current_val:
-                    res += product_line.get("multiline_separator", "")
-        else:
-            res = value
+    def __init__(self, client=None):
+        self.client = client if client is not None else Odoo()
 
-        # Remove delimiter if present
-        if product_line.get("delimiter"):
-            return res.replace(product_line["delimiter"], "")
-        else:
-            return res
-
-    def _generate_external_text(self, value, product_line, external_id, log):
-        """Generate external text line"""
-        external_text_list = [
-            self._EXTERNAL_TEXT_ACTION_CODE,
-            log["scale_group_external_identity"],
-            external_id,
-            self._clean_value(value, product_line),
-        ]
-        return self._EXTERNAL_TEXT_DELIMITER.join(external_text_list)
+    def _m2o_id(self, value):
+        """Id of a many2one value returned by XML-RPC ([id, name] or id)"""
+        return value[0] if isinstance(value, list) else value
+
+    def _read_by_id(self, model, ids, fields):
+        """
+        Read records in bulk and return them indexed by id. Records that do not
+        exist anymore are skipped.
+        """
+        records = {}
+        ids = list(ids)
+        for i in range(0, len(ids), self._READ_BATCH_SIZE):
+            batch = ids[i : i + self._READ_BATCH_SIZE]
+            result = self.client.execute_kw(
+                model,
+                "search_read",
+                [[["id", "in", batch]], fields],
+                {"context": {"active_test": False}},
+            )
+            for record in result or []:
+                records[record["id"]] = record
+
+        missing = len(set(ids)) - len(records)
+        if missing:
+            _logger.warning(f"{missing} {model} records could not be read")
+        return records
+
+    def _search_ids(self, model, ids, domain):
+        """Ids among `ids` of the records matching `domain`, searched in bulk"""
+        found = set()
+        ids = list(ids)
+        for i in range(0, len(ids), self._READ_BATCH_SIZE):
+            batch = ids[i : i + self._READ_BATCH_SIZE]
+            found.update(
+                self.client.execute_kw(
+                    model,
+                    "search",
+                    [[["id", "in", batch]] + domain],
+                    {"context": {"active_test": False}},
+                )
+                or []
+            )
+        return found
+
+    def _read_image_versions(self, products, image_fields):
+        """
+        Set the image fields of the products to whether they have an image,
+        and their `image_write_date` to the last write of the product or its
+        template. The images are edited on the template, whose fields are
+        stored (the variant ones are computed and cannot be searched).
+        """
+        template_ids = {
+            product["id"]: self._m2o_id(product["product_tmpl_id"])
+            for product in products.values()
+        }
+        templates = self._read_by_id(
+            "product.template", dict.fromkeys(template_ids.values()), ["write_date"]
+        )
+        for image_field in image_fields:
+            with_image = self._search_ids(
+                "product.template", templates, [[image_field, "!=", False]]
+            )
+            for product in products.values():
+                product[image_field] = template_ids[product["id"]] in with_image
+
+        for product in products.values():
+            template = templates.get(template_ids[product["id"]], {})
+            write_dates = [product["write_date"], template.get("write_date")]
+            product["image_write_date"] = max(filter(None, write_dates), default=False)
 
     def _generate_image_file_name(self, product_id, field_value, extension):
         """Generate image file name"""
@@ -100,199 +214,437 @@ class OdooScaleLogClient:
             return value
         return round(value / precision) * precision
 
-    def _compute_text(self, log, product, scale_group, scale_system, product_lines):
+    def _prefetch_related(self, products, product_lines):
         """
-        Compute product text and external text for a log entry
+        Bulk read the related fields used by many2one/many2many product lines
 
         Returns:
-            dict: {'product_text': str, 'external_text': str}
+            dict: {(related_model, related_field_name): {record_id: value}}
         """
-        action = log["action"]
-        product_text = self._ACTION_MAPPING[action] + self._DELIMITER
-        external_texts = []
-
-        # Process each product line
+        wanted = {}
         for product_line in product_lines:
+            related_field = product_line.get("related_field_name")
             field_name = product_line.get("field_name")
-            value = product.get(field_name) if field_name else None
-
             line_type = product_line["type"]
+            if line_type not in ("many2one", "many2many") or not related_field:
+                continue
+
+            ids = wanted.setdefault((product_line["related_model"], related_field), set())
+            for product in products:
+                value = product.get(field_name)
+                if not value or not isinstance(value, list):
+                    continue
+                if line_type == "many2one":
+                    ids.add(value[0])
+                else:
+                    x2many_range = product_line.get("x2many_range", 1)
+                    if x2many_range <= len(value):
+                        ids.add(value[x2many_range - 1])
+
+        related = {}
+        for (related_model, related_field), ids in wanted.items():
+            records = self._read_by_id(related_model, ids, [related_field])
+            related[(related_model, related_field)] = {
+                record_id: record.get(related_field, "")
+                for record_id, record in records.items()
+            }
+        return related
+
+    def _related_value(self, product_line, record_id, related):
+        """
+        Value of the related field of a product line for a record, read from
+        the prefetched values (records missing from them are read and memoized)
 
-            if line_type == "id":
-                product_text += str(product["id"])
+        Returns:
+            The value, or None if the record does not exist
+        """
+        key = (product_line["related_model"], product_line["related_field_name"])
+        values = related.setdefault(key, {})
+        if record_id not in values:
+            records = self._read_by_id(key[0], [record_id], [key[1]])
+            values[record_id] = (
+                records[record_id].get(key[1], "") if record_id in records else None
+            )
+        return values[record_id]
 
-            elif line_type == "numeric":
-                numeric_value = float(value) if value else 0.0
-                coefficient = product_line.get("numeric_coefficient", 1.0)
-                rounding = product_line.get("numeric_round", 1.0)
-                value = self._float_round(numeric_value * coefficient, rounding)
-                product_text += str(value).replace(".0", "")
+    def _compile_clean(self, product_line):
+        """
+        Compile the cleaning of a value for a product line: split in chunks of
+        `multiline_length` joined by `multiline_separator`, and the delimiter
+        removed
+        """
+        multiline_length = product_line.get("multiline_length")
+        multiline_separator = product_line.get("multiline_separator") or ""
+        delimiter = product_line.get("delimiter")
+
+        def clean(value):
+            if not value:
+                return ""
+            value = str(value)
+            if multiline_length:
+                value = multiline_separator.join(
+                    [
+                        value[i : i + multiline_length]
+                        for i in range(0, len(value), multiline_length)
+                    ]
+                )
+            if delimiter:
+                value = value.replace(delimiter, "")
+            return value
 
-            elif line_type == "text":
-                product_text += self._clean_value(value, product_line)
+        return clean
 
-            elif line_type == "external_text":
-                external_id = str(product["id"]) + str(product_line["id"]).rjust(
-                    self._EXTERNAL_SIZE_ID_RIGHT, "0"
-                )
-                external_texts.append(
-                    self._generate_external_text(value, product_line, external_id, log)
-                )
-                product_text += external_id
+    def _compile_product_line(self, product_line, related):
+        """
+        Compile a product line into a formatter returning its text (and
+        appending its external texts to `externals`)
+        """
+        field_name = product_line.get("field_name")
+        line_type = product_line["type"]
+        delimiter = product_line.get("delimiter") or ""
+        clean = self._compile_clean(product_line)
+
+        if product_line.get("related_field_name"):
+            # Prefetched values of the related field, see _prefetch_related
+            related_values = related.setdefault(
+                (product_line["related_model"], product_line["related_field_name"]),
+                {},
+            )
+
+        if line_type == "id":
+
+            def formatter(externals, log, product):
+                return str(product["id"]) + delimiter
+
+        elif line_type == "numeric":
+            coefficient = product_line.get("numeric_coefficient", 1.0)
+            rounding = product_line.get("numeric_round", 1.0)
+            float_round = self._float_round
 
-            elif line_type == "constant":
-                product_text += self._clean_value(
-                    product_line.get("constant_value", ""), product_line
+            def formatter(externals, log, product):
+                value = product.get(field_name) if field_name else None
+                numeric_value = float(value) if value else 0.0
+                value = float_round(numeric_value * coefficient, rounding)
+                return str(value).replace(".0", "") + delimiter
+
+        elif line_type == "text":
+
+            def formatter(externals, log, product):
+                value = product.get(field_name) if field_name else None
+                return clean(value) + delimiter
+
+        elif line_type == "external_text":
+            suffix = str(product_line["id"]).rjust(self._EXTERNAL_SIZE_ID_RIGHT, "0")
+            code = self._EXTERNAL_TEXT_ACTION_CODE
+            separator = self._EXTERNAL_TEXT_DELIMITER
+
+            def formatter(externals, log, product):
+                external_id = f"{product['id']}{suffix}"
+                value = product.get(field_name) if field_name else None
+                externals.append(
+                    f"{code}{separator}{log['scale_group_external_identity']}"
+                    f"{separator}{external_id}{separator}{clean(value)}"
                 )
+                return external_id + delimiter
 
-            elif line_type == "external_constant":
-                external_id = str(product_line["id"])
-                external_texts.append(
-                    self._generate_external_text(
-                        product_line.get("constant_value", ""),
-                        product_line,
-                        external_id,
-                        log,
-                    )
+        elif line_type == "constant":
+            constant = clean(product_line.get("constant_value", "")) + delimiter
+
+            def formatter(externals, log, product):
+                return constant
+
+        elif line_type == "external_constant":
+            external_id = str(product_line["id"])
+            constant = clean(product_line.get("constant_value", ""))
+            code = self._EXTERNAL_TEXT_ACTION_CODE
+            separator = self._EXTERNAL_TEXT_DELIMITER
+
+            text = external_id + delimiter
+            tail = f"{separator}{external_id}{separator}{constant}"
+
+            def formatter(externals, log, product):
+                externals.append(
+                    f"{code}{separator}{log['scale_group_external_identity']}{tail}"
                 )
-                product_text += external_id
+                return text
 
-            elif line_type == "many2one":
-                if value:
-                    if isinstance(value, list):
-                        # XML-RPC returns many2one as [id, name]
-                        related_field = product_line.get("related_field_name")
-                        if not related_field:
-                            product_text += str(value[0])
-                        else:
-                            # Need to fetch related field
-                            related_obj = self.client.execute_kw(
-                                product_line["related_model"],
-                                "read",
-                                [value[0]],
-                                [related_field],
-                            )
-                            if related_obj:
-                                product_text += str(
-                                    related_obj[0].get(related_field, "")
-                                )
+        elif line_type == "many2one":
+            related_field = product_line.get("related_field_name")
 
-            elif line_type == "many2many":
+            def formatter(externals, log, product):
+                value = product.get(field_name) if field_name else None
                 if value and isinstance(value, list):
-                    x2many_range = product_line.get("x2many_range", 1)
-                    if x2many_range <= len(value):
-                        item_id = value[x2many_range - 1]
-                        related_field = product_line.get("related_field_name")
-                        if related_field:
-                            item_obj = self.client.execute_kw(
-                                product_line["related_model"],
-                                "read",
-                                [item_id],
-                                [related_field],
-                            )
-                            if item_obj:
-                                item_value = item_obj[0].get(related_field, "")
-                                product_text += self._clean_value(
-                                    item_value, product_line
-                                )
-                        else:
-                            product_text += str(item_id)
+                    if not related_field:
+                        return str(value[0]) + delimiter
+                    related_value = related_values.get(value[0], _MISSING)
+                    if related_value is _MISSING:
+                        related_value = self._related_value(
+                            product_line, value[0], related
+                        )
+                    if related_value is not None:
+                        return str(related_value) + delimiter
+                return delimiter
+
+        elif line_type == "many2many":
+            related_field = product_line.get("related_field_name")
+            x2many_range = product_line.get("x2many_range", 1)
+
+            def formatter(externals, log, product):
+                value = product.get(field_name) if field_name else None
+                if value and isinstance(value, list) and x2many_range <= len(value):
+                    item_id = value[x2many_range - 1]
+                    if not related_field:
+                        return str(item_id) + delimiter
+                    item_value = related_values.get(item_id, _MISSING)
+                    if item_value is _MISSING:
+                        item_value = self._related_value(product_line, item_id, related)
+                    if item_value is not None:
+                        return clean(item_value) + delimiter
+                return delimiter
+
+        elif line_type == "product_image":
+
+            def formatter(externals, log, product):
+                value = product.get(field_name) if field_name else None
+                if value:
+                    return f"{product['id']}.PNG" + delimiter
+                return delimiter
 
-            elif line_type == "product_image":
-                extension = product_line.get("suffix", ".PNG")
-                product_text += self._generate_image_file_name(
-                    product["id"], value, extension
-                )
+        else:
+
+            def formatter(externals, log, product):
+                return delimiter
+
+        return formatter
 
-            # Add delimiter if specified
-            if product_line.get("delimiter"):
-                product_text += product_line["delimiter"]
+    def _compile_product_lines(self, scale_system, product_lines, related=None):
+        """
+        Compile the product lines configuration of a scale system once, instead
+        of interpreting it for every product
+
+        Returns:
+            callable: render(log, product) -> {'product_text': str, 'external_text': str}
+        """
+        if related is None:
+            related = {}
 
-        # Get line break for encoding
+        formatters = [
+            self._compile_product_line(product_line, related)
+            for product_line in product_lines
+        ]
+        prefixes = {
+            action: code + self._DELIMITER
+            for action, code in self._ACTION_MAPPING.items()
+        }
         encoding = scale_system.get("encoding", "utf-8")
         break_line = self._ENCODING_MAPPING.get(encoding, "\n")
 
-        return {
-            "product_text": product_text + break_line,
-            "external_text": (
-                break_line.join(external_texts) + break_line if external_texts else ""
-            ),
-        }
+        def render(log, product):
+            externals = []
+            parts = [formatter(externals, log, product) for formatter in formatters]
 
-    def get_unsent_logs(self):
-        """Get all unsent scale logs"""
-        log_ids = self.client.execute_kw(
-            "product.scale.log",
-            "search",
+            return {
+                "product_text": prefixes[log["action"]] + "".join(parts) + break_line,
+                "external_text": (
+                    break_line.join(externals) + break_line if externals else ""
+                ),
+            }
+
+        return render
+
+    def _get_scale_system_config(self, scale_system_id):
+        """
+        Scale system and product lines configuration, with field names resolved.
+
+        The configuration is kept in the Odoo disk cache and only read again
+        when the `write_date` of the scale system or of one of its product lines
+        changes.
+
+        Returns:
+            tuple: (scale_system, product_lines)
+        """
+        system_write_date = self.client.execute_kw(
+            "product.scale.system", "read", [[scale_system_id], ["write_date"]]
+        )[0]["write_date"]
+        line_write_dates = self.client.execute_kw(
+            "product.scale.system.product.line",
+            "search_read",
+            [[["scale_system_id", "=", scale_system_id]], ["write_date"]],
+        )
+        signature = [system_write_date] + [
+            (line["id"], line["write_date"]) for line in line_write_dates
+        ]
+
+        cache_key = f"scale_system_config:{scale_system_id}"
+        cached = self.client._check_cache(cache_key)
+        if cached is not None and cached["signature"] == signature:
+            _logger.debug(f"Using cached configuration of scale system {scale_system_id}")
+            return cached["scale_system"], cached["product_lines"]
+
+        # Get scale system configuration
+        scale_system = self.client.execute_kw(
+            "product.scale.system",
+            "read",
             [
-                [["sent", "=", False]],
-                0,
-                0,
-                "log_date",
+                [scale_system_id],
+                [
+                    "encoding",
+                    "product_text_file_pattern",
+                    "external_text_file_pattern",
+                    "send_images",
+                ],
             ],
-        )
-        if not log_ids:
-            _logger.info("No unsent logs found")
-            return []
+        )[0]
 
-        # Read logs with related fields
-        logs = self.client.execute_kw(
-            "product.scale.log",
+        # Get product lines configuration
+        product_lines = self.client.execute_kw(
+            "product.scale.system.product.line",
             "read",
             [
-                log_ids,
-                ["id", "log_date", "action", "product_id", "scale_system_id", "sent"],
+                [line["id"] for line in line_write_dates],
+                [
+                    "id",
+                    "type",
+                    "field_id",
+                    "delimiter",
+                    "numeric_coefficient",
+                    "numeric_round",
+                    "constant_value",
+                    "multiline_length",
+                    "multiline_separator",
+                    "related_field_id",
+                    "x2many_range",
+                    "suffix",
+                ],
             ],
         )
 
+        # Convert field_id references to field names, in a single read
+        field_ids = set()
+        for pl in product_lines:
+            for key in ("field_id", "related_field_id"):
+                if pl.get(key):
+                    field_ids.add(self._m2o_id(pl[key]))
+        fields = {}
+        if field_ids:
+            fields = {
+                field["id"]: field
+                for field in self.client.execute_kw(
+                    "ir.model.fields", "read", [list(field_ids), ["name", "relation"]]
+                )
+            }
+
+        for pl in product_lines:
+            field_info = fields.get(self._m2o_id(pl.get("field_id")))
+            if field_info:
+                pl["field_name"] = field_info["name"]
+                pl["related_model"] = field_info.get("relation")
+            related_info = fields.get(self._m2o_id(pl.get("related_field_id")))
+            if related_info:
+                pl["related_field_name"] = related_info["name"]
+
+        self.client._set_cache(
+            cache_key,
+            {
+                "signature": signature,
+                "scale_system": scale_system,
+                "product_lines": product_lines,
+            },
+        )
+        return scale_system, product_lines
+
+    _LOG_FIELDS = ["id", "log_date", "action", "product_id", "scale_system_id", "sent"]
+
+    def get_unsent_logs(self):
+        """Get unsent scale logs, ordered by log_date"""
+        logs = self.client.execute_kw(
+            "product.scale.log",
+            "search_read",
+            [[["sent", "=", False]], self._LOG_FIELDS],
+            {"order": "log_date, id"},
+        )
+        if not logs:
+            _logger.debug("No unsent logs found")
+            return []
+
         return logs
 
-    def generate_files(self, output_folder, log_ids=None):
+    def _coalesce_logs(self, logs):
+        """
+        Collapse the logs of each product on each scale system into a single
+        log holding its final action (create + write -> create, anything +
+        unlink -> unlink). The coalesced log takes the place of the latest
+        one in log_date order, and keeps all the ids it replaces in
+        `source_ids`.
+        """
+        coalesced = {}
+        for log in sorted(logs, key=lambda l: (l["log_date"] or "", l.get("id", 0))):
+            key = (
+                self._m2o_id(log["scale_system_id"]),
+                self._m2o_id(log["product_id"]),
+            )
+            previous = coalesced.pop(key, None)
+
+            log = dict(log, source_ids=[log["id"]] if "id" in log else [])
+            if previous is not None:
+                log["source_ids"] = previous["source_ids"] + log["source_ids"]
+                if previous["action"] == "create" and log["action"] == "write":
+                    log["action"] = "create"
+            # Re-inserted last, so the dict stays in log_date order
+            coalesced[key] = log
+
+        if len(coalesced) < len(logs):
+            _logger.info(f"Coalesced {len(logs)} logs into {len(coalesced)}")
+        return list(coalesced.values())
+
+    def generate_files(
+        self, output_folder, log_ids=None, logs=None, resync=False, written_ids=None
+    ):
         """
         Generate scale files locally for unsent logs
 
+        Once a full resync has been made, the rendered lines are compared to the
+        snapshot of the last shipped ones: unchanged products are not written,
+        and the action (A/M/B) is the one needed by the scale.
+
         Args:
             output_folder: Local folder path to save generated files
             log_ids: List of log IDs to process (if None, processes all unsent)
+            logs: Logs already read, e.g. by the daemon (takes precedence)
+            resync: Whether the logs are a full resync of the catalogue
+            written_ids: List extended with the ids of the logs of each scale
+                system once its files are in place, kept when a later one fails
 
         Returns:
-            bool: True if successful
+            list: ids of the logs written to the files
         """
         # Create output folder if it doesn't exist
         os.makedirs(output_folder, exist_ok=True)
 
         # Get logs to process
-        if log_ids is None:
+        if logs is not None:
+            pass
+        elif log_ids is None:
             logs = self.get_unsent_logs()
         else:
             logs = self.client.execute_kw(
                 "product.scale.log",
                 "search_read",
-                [
-                    log_ids,
-                    [
-                        "id",
-                        "log_date",
-                        "sent",
-                        "scale_system_id",
-                        "product_id",
-                        "action",
-                    ],
-                ],
+                [[["id", "in", log_ids]], self._LOG_FIELDS],
             )
 
         if not logs:
             _logger.info("No logs to process")
-            return False
+            return []
+
+        if written_ids is None:
+            written_ids = []
+        logs = self._coalesce_logs(logs)
 
         # Group logs by scale system
         system_map = {}
         for log in logs:
-            system_id = (
-                log["scale_system_id"][0]
-                if isinstance(log["scale_system_id"], list)
-                else log["scale_system_id"]
-            )
+            system_id = self._m2o_id(log["scale_system_id"])
 
             if system_id not in system_map:
                 system_map[system_id] = []
@@ -304,180 +656,391 @@ class OdooScaleLogClient:
                 f"Processing {len(system_logs)} logs for scale system {scale_system_id}"
             )
 
-            # Get scale system configuration
-            scale_system = self.client.execute_kw(
-                "product.scale.system",
-                "read",
-                [
-                    [scale_system_id],
-                    [
-                        "encoding",
-                        "product_text_file_pattern",
-                        "external_text_file_pattern",
-                        "send_images",
-                    ],
-                ],
-            )[0]
+            scale_system, product_lines = self._get_scale_system_config(
+                scale_system_id
+            )
 
-            # Get product lines configuration
-            product_line_ids = self.client.execute_kw(
-                "product.scale.system.product.line",
-                "search",
-                [[["scale_system_id", "=", scale_system_id]]],
+            system_log_ids = []
+            shipped_products = []
+
+            # Hashes of the lines last shipped per product, once a full resync
+            # has been made
+            snapshot_key = f"scale_snapshot:{scale_system_id}"
+            snapshot = self.client._check_cache(snapshot_key)
+            if snapshot is None and resync:
+                snapshot = {}
+            unchanged = 0
+
+            # Get all fields needed, but the images which are only read for the
+            # changed products, see _sync_images
+            image_fields = {
+                pl["field_name"]
+                for pl in product_lines
+                if pl["type"] == "product_image" and pl.get("field_name")
+            }
+            field_names = [
+                pl.get("field_name") for pl in product_lines if pl.get("field_name")
+            ]
+            field_names = list(
+                set(["id", "scale_group_id", "write_date", "product_tmpl_id"])
+                .union(field_names)
+                .difference(image_fields)
             )
 
-            product_lines = self.client.execute_kw(
-                "product.scale.system.product.line",
-                "read",
-                [
-                    product_line_ids,
-                    [
-                        "id",
-                        "type",
-                        "field_id",
-                        "delimiter",
-                        "numeric_coefficient",
-                        "numeric_round",
-                        "constant_value",
-                        "multiline_length",
-                        "multiline_separator",
-                        "related_field_id",
-                        "x2many_range",
-                        "suffix",
-                    ],
-                ],
+            # Read all the products and scale groups of the logs at once
+            products = self._read_by_id(
+                "product.product",
+                dict.fromkeys(self._m2o_id(log["product_id"]) for log in system_logs),
+                field_names,
+            )
+            if image_fields:
+                self._read_image_versions(products, image_fields)
+            scale_groups = self._read_by_id(
+                "product.scale.group",
+                dict.fromkeys(
+                    self._m2o_id(p["scale_group_id"])
+                    for p in products.values()
+                    if p["scale_group_id"]
+                ),
+                ["external_identity"],
             )
 
-            # Convert field_id references to field names
-            for pl in product_lines:
-                if pl.get("field_id"):
-                    field_id = (
-                        pl["field_id"][0]
-                        if isinstance(pl["field_id"], list)
-                        else pl["field_id"]
-                    )
-                    field_info = self.client.execute_kw(
-                        "ir.model.fields", "read", [[field_id], ["name", "relation"]]
+            related = self._prefetch_related(products.values(), product_lines)
+            render = self._compile_product_lines(scale_system, product_lines, related)
+
+            # Stream the text lines into the files
+            encoding = scale_system.get("encoding", "utf-8")
+            translation = self._TRANSLATED_TERM if encoding != "utf-8" else None
+            now = datetime.now()
+            product_file = ScaleFileWriter(
+                os.path.join(
+                    output_folder,
+                    now.strftime(scale_system["product_text_file_pattern"]),
+                ),
+                encoding,
+                translation,
+            )
+            external_file = ScaleFileWriter(
+                os.path.join(
+                    output_folder,
+                    now.strftime(scale_system["external_text_file_pattern"]),
+                ),
+                encoding,
+                translation,
+            )
+
+            def write_texts(texts):
+                _logger.info(texts["product_text"].strip())
+
+                if texts["product_text"]:
+                    product_file.write(texts["product_text"])
+                if texts["external_text"]:
+                    external_file.write(texts["external_text"])
+
+            with product_file, external_file:
+                for log in system_logs:
+                    product_id = self._m2o_id(log["product_id"])
+                    product = products.get(product_id)
+                    scale_group = product and scale_groups.get(
+                        self._m2o_id(product["scale_group_id"])
                     )
-                    if field_info:
-                        pl["field_name"] = field_info[0]["name"]
-                        pl["related_model"] = field_info[0].get("relation")
-
-            # Generate text lines
-            product_text_lst = []
-            external_text_lst = []
-            saved_images = set()
-
-            for log in system_logs:
-                # Get product data
-                product_id = (
-                    log["product_id"][0]
-                    if isinstance(log["product_id"], list)
-                    else log["product_id"]
-                )
 
-                # Get all fields needed
-                field_names = [
-                    pl.get("field_name") for pl in product_lines if pl.get("field_name")
-                ]
-                field_names = list(set(["id", "scale_group_id"] + field_names))
-
-                product = self.client.execute_kw(
-                    "product.product", "read", [[product_id], field_names]
-                )[0]
-
-                # Get scale group
-                scale_group_id = (
-                    product["scale_group_id"][0]
-                    if isinstance(product["scale_group_id"], list)
-                    else product["scale_group_id"]
-                )
+                    # Once a resync has been made, a product leaving the scale
+                    # system is unlinked from the group it was last shipped in
+                    if snapshot is not None and (
+                        scale_group is None or log["action"] == "unlink"
+                    ):
+                        system_log_ids.extend(log["source_ids"])
+                        unlink = self._snapshot_unlink(snapshot, log, product, render)
+                        if unlink is None:
+                            unchanged += 1
+                        else:
+                            write_texts(unlink)
+                        continue
+
+                    if product is None:
+                        _logger.warning(f"Skipping product {product_id}: not found")
+                        continue
+                    if scale_group is None:
+                        _logger.warning(
+                            f"Skipping product {product_id}: no scale group"
+                        )
+                        continue
+
+                    log["scale_group_external_identity"] = scale_group[
+                        "external_identity"
+                    ]
+
+                    # Compute texts
+                    texts = render(log, product)
+                    system_log_ids.extend(log["source_ids"])
+
+                    # Only ship what differs from the last shipped catalogue
+                    if snapshot is not None:
+                        previous = snapshot.get(product_id)
+                        entry = self._snapshot_entry(log, texts)
+                        if previous == entry:
+                            unchanged += 1
+                            continue
+                        if previous is not None and previous[1] != entry[1]:
+                            # Moved to another group: unlinked from the old one
+                            write_texts(
+                                self._snapshot_unlink(snapshot, log, product, render)
+                            )
+                            previous = None
+                        snapshot[product_id] = entry
+
+                        action = "write" if previous is not None else "create"
+                        if action != log["action"]:
+                            log = dict(log, action=action)
+                            texts = render(log, product)
 
-                scale_group = self.client.execute_kw(
-                    "product.scale.group",
-                    "read",
-                    [[scale_group_id], ["external_identity"]],
-                )[0]
+                    write_texts(texts)
 
-                log["scale_group_external_identity"] = scale_group["external_identity"]
+                    if log["action"] != "unlink":
+                        shipped_products.append(product)
 
-                # Compute texts
-                texts = self._compute_text(
-                    log, product, scale_group, scale_system, product_lines
+            # The files are in place: the logs are written whatever comes next
+            written_ids.extend(system_log_ids)
+
+            if snapshot is not None:
+                self.client._set_cache(snapshot_key, snapshot)
+                _logger.info(
+                    f"{unchanged} unchanged products not sent to scale system "
+                    f"{scale_system_id}"
                 )
 
-                _logger.info(texts["product_text"].strip())
+            if scale_system.get("send_images"):
+                self._sync_images(output_folder, product_lines, shipped_products)
 
-                if texts["product_text"]:
-                    product_text_lst.append(texts["product_text"])
-                if texts["external_text"]:
-                    external_text_lst.append(texts["external_text"])
-
-                # Save product images if needed
-                if False and scale_system.get("send_images"):
-                    for product_line in product_lines:
-                        if product_line["type"] == "product_image":
-                            field_name = product_line.get("field_name")
-                            if field_name and product.get(field_name):
-                                extension = product_line.get("suffix") or ".PNG"
-                                image_filename = self._generate_image_file_name(
-                                    product["id"], product[field_name], extension
-                                )
-
-                                if (
-                                    image_filename
-                                    and image_filename not in saved_images
-                                ):
-                                    image_path = os.path.join(
-                                        output_folder, image_filename
-                                    )
-                                    image_data = base64.b64decode(product[field_name])
-                                    with open(image_path, "wb") as f:
-                                        f.write(image_data)
-                                    saved_images.add(image_filename)
-                                    _logger.info(f"Saved image: {image_filename}")
-                                elif image_filename in saved_images:
-                                    _logger.debug(
-                                        f"Skipped duplicate image: {image_filename}"
-                                    )
-
-            # Write text files
-            encoding = scale_system.get("encoding", "utf-8")
-            now = datetime.now()
+        _logger.info(f"Successfully generated files in {output_folder}")
+        return written_ids
 
-            if product_text_lst:
-                product_filename = now.strftime(
-                    scale_system["product_text_file_pattern"]
-                )
-                product_path = os.path.join(output_folder, product_filename)
-                with open(product_path, "w", encoding=encoding, errors="ignore") as f:
-                    for line in product_text_lst:
-                        raw_text = line
-                        if encoding != "utf-8":
-                            raw_text = raw_text.translate(self._TRANSLATED_TERM)
-                        f.write(raw_text)
-                _logger.info(f"Generated product file: {product_filename}")
-
-            if external_text_lst:
-                external_filename = now.strftime(
-                    scale_system["external_text_file_pattern"]
+    def _snapshot_entry(self, log, texts):
+        """
+        Snapshot entry of the lines rendered for a product: a hash of the
+        lines, and the external identity of the scale group they are sent to
+        """
+        # The action code does not take part in the hash
+        digest = hashlib.blake2b(
+            (
+                texts["product_text"].partition(self._DELIMITER)[2]
+                + texts["external_text"]
+            ).encode("utf-8"),
+            digest_size=8,
+        ).digest()
+        return (digest, log["scale_group_external_identity"])
+
+    def _snapshot_unlink(self, snapshot, log, product, render):
+        """
+        Remove a product from the snapshot of the last shipped lines
+        ({product_id: (hash, scale group external identity)})
+
+        Returns:
+            dict: texts of the unlink in the scale group the product was last
+            shipped in, or None when it was not shipped
+        """
+        product_id = self._m2o_id(log["product_id"])
+        entry = snapshot.pop(product_id, None)
+        if entry is None:
+            return None
+
+        # A deleted product is unlinked by its id only
+        unlink = dict(log, action="unlink", scale_group_external_identity=entry[1])
+        return render(unlink, product or {"id": product_id})
+
+    def resync(self, output_folder, scale_system_ids=None):
+        """
+        Render the whole catalogue of the scale systems (all of them by default)
+        and ship only the products that differ from the last shipped snapshot,
+        plus an unlink for those which left the catalogue. The first resync
+        ships everything and creates the snapshot.
+        """
+        if scale_system_ids is None:
+            scale_system_ids = self.client.execute_kw(
+                "product.scale.system", "search", [[]]
+            )
+
+        now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for scale_system_id in scale_system_ids:
+            product_ids = self.client.execute_kw(
+                "product.product",
+                "search",
+                [[["scale_group_id.scale_system_id", "=", scale_system_id]]],
+            )
+            snapshot = self.client._check_cache(f"scale_snapshot:{scale_system_id}")
+            removed_ids = set(snapshot or {}) - set(product_ids)
+
+            # Not actual logs: they have no id, so none is marked as sent
+            logs = [
+                {
+                    "log_date": now,
+                    "action": action,
+                    "product_id": product_id,
+                    "scale_system_id": scale_system_id,
+                }
+                for action, ids in (("write", product_ids), ("unlink", removed_ids))
+                for product_id in ids
+            ]
+            _logger.info(
+                f"Resync of scale system {scale_system_id}: {len(product_ids)} "
+                f"products, {len(removed_ids)} removed"
+            )
+            self.generate_files(output_folder, logs=logs, resync=True)
+
+    def _sync_images(self, output_folder, product_lines, products):
+        """
+        Write the images of the product_image lines for the given products.
+
+        The manifest of the images already shipped keeps the product (or
+        template) `write_date` and the content hash of each image: only the
+        images of the products written since are read from Odoo, and only the
+        ones whose content changed are decoded and written, from a thread pool.
+        """
+        manifest_path = os.path.join(output_folder, self._IMAGE_MANIFEST)
+        manifest = {}
+        if os.path.exists(manifest_path):
+            with open(manifest_path, "r", encoding="utf-8") as f:
+                manifest = json.load(f)
+
+        # {field_name: {image_filename: product}} of the products with an image
+        images = {}
+        for product_line in product_lines:
+            field_name = product_line.get("field_name")
+            if product_line["type"] != "product_image" or not field_name:
+                continue
+            extension = product_line.get("suffix") or ".PNG"
+            for product in products:
+                image_filename = self._generate_image_file_name(
+                    product["id"], product.get(field_name), extension
                 )
-                external_path = os.path.join(output_folder, external_filename)
-                with open(external_path, "w", encoding=encoding, errors="ignore") as f:
-                    for line in external_text_lst:
-                        raw_text = line
-                        if encoding != "utf-8":
-                            raw_text = raw_text.translate(self._TRANSLATED_TERM)
-                        f.write(raw_text)
-                _logger.info(f"Generated external text file: {external_filename}")
+                if image_filename:
+                    images.setdefault(field_name, {})[image_filename] = product
+
+        nb_images = sum(len(field_images) for field_images in images.values())
+        changed = {}
+        for field_name, field_images in images.items():
+            stale = {
+                image_filename: product
+                for image_filename, product in field_images.items()
+                if not product.get("image_write_date")
+                or not isinstance(manifest.get(image_filename), dict)
+                or manifest[image_filename]["write_date"]
+                != product["image_write_date"]
+            }
+            values = self._read_by_id(
+                "product.product",
+                dict.fromkeys(product["id"] for product in stale.values()),
+                [field_name],
+            )
+            for image_filename, product in stale.items():
+                value = values.get(product["id"], {}).get(field_name)
+                if not value:
+                    continue
+                entry = {
+                    "write_date": product.get("image_write_date"),
+                    "sha1": hashlib.sha1(value.encode("ascii")).hexdigest(),
+                }
+                previous = manifest.get(image_filename)
+                if isinstance(previous, dict) and previous["sha1"] == entry["sha1"]:
+                    manifest[image_filename] = entry
+                else:
+                    changed[image_filename] = (value, entry)
+
+        def write_image(image_filename, value):
+            image_path = os.path.join(output_folder, image_filename)
+            tmp_path = os.path.join(output_folder, f".{image_filename}.tmp")
+            with open(tmp_path, "wb") as f:
+                f.write(base64.b64decode(value))
+            os.replace(tmp_path, image_path)
+
+        saved = 0
+        with ThreadPoolExecutor(max_workers=self._IMAGE_WORKERS) as executor:
+            futures = {
+                executor.submit(write_image, image_filename, value): image_filename
+                for image_filename, (value, entry) in changed.items()
+            }
+            for future in as_completed(futures):
+                image_filename = futures[future]
+                try:
+                    future.result()
+                    manifest[image_filename] = changed[image_filename][1]
+                    saved += 1
+                except Exception as e:
+                    _logger.error(f"Could not save image {image_filename}: {e}")
+
+        tmp_path = f"{manifest_path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, manifest_path)
+
+        _logger.info(
+            f"Saved {saved} images, {len(changed) - saved} failed, "
+            f"{nb_images - len(changed)} unchanged"
+        )
 
-        _logger.info(f"Successfully generated files in {output_folder}")
-        return True
+    def run_daemon(self, output_folder, poll_interval=5, flush_interval=30):
+        """
+        Poll the unsent logs and flush them to the scale files every
+        `flush_interval` seconds. Only the ids written are marked as sent, also
+        those of the scale systems written before a failure.
+
+        The logs written but not marked as sent yet (Odoo unreachable) are
+        kept aside and marked again at the next poll instead of being written
+        a second time.
+        """
+        _logger.info(
+            f"Polling scale logs every {poll_interval}s, "
+            f"flushing every {flush_interval}s to {output_folder}"
+        )
+        pending = {}
+        unmarked = set()
+        last_flush = time.monotonic()
+
+        while True:
+            try:
+                if unmarked and self.mark_logs_as_sent(sorted(unmarked)):
+                    unmarked.clear()
+
+                # All the unsent logs: a log committed late, with an older
+                # log_date, is still picked up
+                for log in self.get_unsent_logs():
+                    if log["id"] not in unmarked:
+                        pending.setdefault(log["id"], log)
+
+                if pending and time.monotonic() - last_flush >= flush_interval:
+                    written_ids = []
+                    try:
+                        self.generate_files(
+                            output_folder,
+                            logs=list(pending.values()),
+                            written_ids=written_ids,
+                        )
+                    finally:
+                        # The logs already in the files are never written again,
+                        # even when a later scale system failed
+                        unmarked.update(written_ids)
+                        for log_id in written_ids:
+                            pending.pop(log_id, None)
+                    # Skipped logs stay unsent in Odoo, for the next full run
+                    pending.clear()
+                    last_flush = time.monotonic()
+                    if unmarked and self.mark_logs_as_sent(sorted(unmarked)):
+                        unmarked.clear()
+            except Exception as e:
+                _logger.error(f"Error: {e}", exc_info=True)
+
+            time.sleep(poll_interval)
 
     def mark_logs_as_sent(self, log_ids):
-        """Mark logs as sent"""
+        """
+        Mark logs as sent
+
+        Returns:
+            bool: whether Odoo accepted the write
+        """
         now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-        self.client.execute_kw(
+        result = self.client.execute_kw(
             "product.scale.log",
             "write",
             [
@@ -485,26 +1048,46 @@ class OdooScaleLogClient:
                 {"sent": True, "last_send_date": now},
             ],
         )
+        if not result:
+            _logger.error(f"Could not mark {len(log_ids)} logs as sent")
+            return False
+
         _logger.info(f"Marked {len(log_ids)} logs as sent")
+        return True
 
 
 def main():
-    OUTPUT_FOLDER = "/tmp/scale_files"
+    parser = argparse.ArgumentParser(description="Generate the scale files")
+    parser.add_argument("--output", default="/tmp/scale_files")
+    parser.add_argument(
+        "--daemon", action="store_true", help="Poll the logs continuously"
+    )
+    parser.add_argument(
+        "--resync",
+        action="store_true",
+        help="Ship the whole catalogue differences instead of the logs",
+    )
+    parser.add_argument("--poll-interval", type=float, default=5)
+    parser.add_argument("--flush-interval", type=float, default=30)
+    args = parser.parse_args()
 
     try:
         # Initialize client
         client = OdooScaleLogClient()
 
-        # Generate files for all unsent logs
-        success = client.generate_files(OUTPUT_FOLDER)
+        if args.daemon:
+            client.run_daemon(args.output, args.poll_interval, args.flush_interval)
+            return
+
+        if args.resync:
+            client.resync(args.output)
+            return
 
-        if success:
-            # Optionally mark logs as sent
-            unsent_logs = client.get_unsent_logs()
-            if unsent_logs:
-                log_ids = [log["id"] for log in unsent_logs]
-                _logger.info(f"Marking {len(log_ids)} logs as sent")
-                client.mark_logs_as_sent(log_ids)
+        # Generate files for all unsent logs, and mark the ones written
+        written_ids = client.generate_files(args.output)
+        if written_ids:
+            _logger.info(f"Marking {len(written_ids)} logs as sent")
+            client.mark_logs_as_sent(written_ids)
 
     except Exception as e:
         _logger.error(f"Error: {e}", exc_info=True)
@@ -0,0 +1,44 @@
+from datetime import date
+from dateutil.relativedelta import relativedelta
+from otsokop.anomalies import RULES, fix_anomalies, scan_anomalies
+from otsokop.odoo import Odoo
+import argparse
+import sys
+import pandas as pd
+
+client = Odoo()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Scan the stock data for anomalies")
+    parser.add_argument(
+        "--start", default=(date.today() + relativedelta(years=-1)).strftime("%Y-%m-01")
+    )
+    parser.add_argument("--end", default=date.today().strftime("%Y-%m-%d"))
+    parser.add_argument("--sigma", type=float, default=3)
+    parser.add_argument(
+        "--fix",
+        action="store_true",
+        help="Delete the price history entries with a zero cost",
+    )
+    args = parser.parse_args()
+
+    anomalies = scan_anomalies(client, args.start, args.end, args.sigma)
+
+    for rule in RULES:
+        print(f"{rule}: {len(anomalies[rule])}")
+
+    with pd.ExcelWriter(f"output/anomalies_{args.start}_{args.end}.xlsx") as writer:
+        for rule in RULES:
+            anomalies[rule].to_excel(
+                writer, index=False, sheet_name=rule[:31], freeze_panes=(1, 0)
+            )
+
+    if args.fix:
+        journal = f"anomalies_{args.start}_{args.end}.jsonl"
+        fixed = fix_anomalies(client, anomalies, journal=journal)
+        print(f"Fixed {fixed} records")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
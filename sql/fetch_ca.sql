@@ -4,37 +4,36 @@ WITH base AS (
         p.name AS product_name,
         c.id AS category_id,
         c.name AS category_name,
-        concat_ws(" - ", product_rack.code, product_rack.name) AS rack,
-        quarter(po.date_order) AS q,
-        sum(pod.price_subtotal_incl) AS amt_ttc
+        concat_ws(' - ', product_rack.code, product_rack.name) AS rack,
+        r.quarter AS q,
+        sum(r.sales_ttc) AS amt_ttc
     FROM
-        pos_order_detail AS pod
-    INNER JOIN pos_order AS po
-        ON
-            pod.pos_order_id = po.id
+        sales_rollup_month AS r
     INNER JOIN product AS p
         ON
-            pod.product_id = p.id
+            r.product_id = p.id
     INNER JOIN product_category AS c
         ON
-            p.product_category_id = c.id
+            r.product_category_id = c.id
     INNER JOIN product_rack
         ON
-            p.product_rack_code = product_rack.code
+            r.product_rack_code = product_rack.code
     WHERE
-        po.state = "done"
-        AND po.date_order >= "2025-01-01"
-        AND po.date_order < "2025-07-01"
-        AND pod.price_subtotal_incl > 0
+        r.state = 'done'
+        AND r.period_start >= '2025-01-01'
+        AND r.period_start < '2025-07-01'
+        AND r.sales_ttc > 0
     GROUP BY
         p.id,
         p.name,
         c.id,
         c.name,
+        product_rack.code,
+        product_rack.name,
         q
 ),
 
-pivot AS (
+pivoted AS (
     SELECT
         product_id,
         product_name,
@@ -66,7 +65,7 @@ ranked AS (
         sum(p.t4_ttc) OVER (ORDER BY p.sem_ttc DESC) AS cum_t4_running,
         sum(p.sem_ttc) OVER (ORDER BY p.sem_ttc DESC) AS cum_sem_running
     FROM
-        pivot AS p
+        pivoted AS p
 ),
 
 totals AS (
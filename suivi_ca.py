@@ -1,3 +1,4 @@
+from otsokop.cube import ProductCube
 from otsokop.odoo import Odoo
 from datetime import date
 from datetime import datetime
@@ -28,33 +29,9 @@ PERCENT_FORMAT = "0.00%"
 
 client = Odoo()
 
-all_products = client.get_all_products()
-print(all_products)
-
-# value.forEach(entry => {
-#     otso.products[entry.id] = {
-#         id: entry.id,
-#         category_id: entry.categ_id[0],
-#         category: entry.categ_id[1],
-#         name: entry.name,
-#         rack_location: entry.rack_location,
-#         //farming_method: entry.farming_method,
-#         create_date: entry.create_date,
-#         theoritical_price: entry.theoritical_price,
-#         is_active: entry.active,
-#         sale_ok: entry.sale_ok,
-#         months: {
-#         },
-#         total: {
-#             ca: [],
-#             remise: [],
-#             pertes: [],
-#         }
-#     };
-
-# });
-
-export_ventes = client.get_pos_orders(start_date, end_date, include_order_lines=True)
-print(export_ventes)
-export_pertes = client.get_product_losses(start_date, end_date)
-print(export_pertes)
+cube = ProductCube(client, start_date, end_date + relativedelta(days=-1))
+print(cube.totals("category"))
+
+cube.to_excel(
+    f"output/{FILE_PREFIX} {opt_date_start}.xlsx", MONEY_FORMAT, PERCENT_FORMAT
+)
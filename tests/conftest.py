@@ -0,0 +1,79 @@
+import importlib, os, pytest, sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import date, datetime
+from otsokop.odoo import Odoo
+
+
+@pytest.fixture
+def client(tmp_path, monkeypatch):
+    """
+    Odoo client with its cache in a temporary folder, answering `execute_kw`
+    from `client.rpc[(model, method)]`: a list of records, or a callable
+    receiving the params and kwargs of the call.
+    """
+    monkeypatch.chdir(tmp_path)
+    client = Odoo(
+        server="http://odoo.test",
+        database="test",
+        username="test",
+        password="test",
+        timezone="Europe/Paris",
+    )
+    client.rpc = {}
+    client.calls = []
+
+    def execute_kw(model, method, params, kwargs=None):
+        client.calls.append((model, method))
+        response = client.rpc[(model, method)]
+        if callable(response):
+            return response(params, kwargs)
+        return response
+
+    client.execute_kw = execute_kw
+    yield client
+    client._cache.close()
+
+
+@pytest.fixture
+def script(tmp_path, monkeypatch):
+    """Import a top-level script, whose module-level `Odoo()` needs the env"""
+    monkeypatch.chdir(tmp_path)
+    for name, value in {
+        "ODOO_SERVER": "http://odoo.test",
+        "ODOO_DATABASE": "test",
+        "ODOO_USERNAME": "test",
+        "ODOO_SECRET": "test",
+    }.items():
+        monkeypatch.setenv(name, value)
+
+    def import_script(name):
+        monkeypatch.delitem(sys.modules, name, raising=False)
+        return importlib.import_module(name)
+
+    return import_script
+
+
+@pytest.fixture
+def freeze_today(monkeypatch):
+    """Set the day seen by `date.today()` and `datetime.now()` of modules"""
+
+    def freeze(today, *modules):
+        class FrozenDate(date):
+            @classmethod
+            def today(cls):
+                return today
+
+        class FrozenDatetime(datetime):
+            @classmethod
+            def now(cls, tz=None):
+                return datetime(today.year, today.month, today.day, 12)
+
+        for module in modules:
+            if isinstance(getattr(module, "date", None), type):
+                monkeypatch.setattr(module, "date", FrozenDate)
+            if isinstance(getattr(module, "datetime", None), type):
+                monkeypatch.setattr(module, "datetime", FrozenDatetime)
+
+    return freeze
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from otsokop import anomalies
+from otsokop.anomalies import fix_anomalies, scan_anomalies
+
+
+def test_fix_anomalies_only_deletes_zero_costs(client, monkeypatch):
+    price_history = pd.DataFrame(
+        {
+            "id": [1, 2, 3],
+            "datetime": pd.to_datetime(["2025-01-01"] * 3),
+            "product_id": [1, 2, 3],
+            "cost": [0.0, -2.5, 3.0],
+        }
+    )
+    monkeypatch.setattr(
+        anomalies,
+        "load_frames",
+        lambda client, date_start, date_end: (
+            anomalies._concat([], ["id", "uom_id", "state"] + anomalies.DUPLICATE_KEY),
+            price_history,
+            anomalies._concat(
+                [], ["id", "date_order", "product_id", "price_unit", "product_qty"]
+            ),
+        ),
+    )
+    monkeypatch.setattr(
+        client, "get_products", lambda: pd.DataFrame(columns=["id", "uom_id"])
+    )
+    monkeypatch.setattr(
+        client,
+        "get_uoms",
+        lambda: pd.DataFrame(columns=["id", "measure_type", "rounding"]),
+    )
+    unlinked = []
+    monkeypatch.setattr(
+        client,
+        "bulk_unlink",
+        lambda model, ids, journal=None: unlinked.extend(ids) or len(ids),
+    )
+
+    found = scan_anomalies(client, "2025-01-01", "2025-01-31")
+    assert found["zero_costs"]["id"].tolist() == [1]
+    assert found["negative_costs"]["id"].tolist() == [2]
+
+    assert fix_anomalies(client, found) == 1
+    assert unlinked == [1]
@@ -0,0 +1,69 @@
+import pandas as pd
+
+STOCK = 12
+SHELF = 13
+SUPPLIER = 4
+CUSTOMER = 5
+
+
+def _move_lines(rows):
+    return pd.DataFrame(
+        rows,
+        columns=["id", "product_id", "location_id", "location_dest_id", "qty_done"],
+    ).assign(lot_id=0)
+
+
+def _quants(rows):
+    return pd.DataFrame(
+        rows, columns=["id", "product_id", "location_id", "quantity"]
+    ).assign(lot_id=0)
+
+
+def test_corrections_replay_the_moves_from_zero(script):
+    balance_quants = script("balance_quants")
+    move_lines = _move_lines(
+        [
+            [1, 1, SUPPLIER, STOCK, 10.0],
+            [2, 1, STOCK, CUSTOMER, 3.0],
+            [3, 1, STOCK, SHELF, 2.0],
+            [4, 2, SUPPLIER, STOCK, 5.0],
+        ]
+    )
+    quants = _quants(
+        [
+            # Already consistent with its moves: not corrected again
+            [100, 1, STOCK, 5.0],
+            # Drifted
+            [101, 2, STOCK, 7.0],
+            # No move at all
+            [102, 3, STOCK, 4.0],
+        ]
+    )
+
+    corrections = balance_quants.compute_quant_corrections(
+        move_lines, quants, [STOCK, SHELF]
+    )
+
+    assert corrections[
+        ["action", "quant_id", "product_id", "location_id", "delta", "new_quantity"]
+    ].values.tolist() == [
+        ["create", pd.NA, 1, SHELF, 2.0, 2.0],
+        ["update", 101, 2, STOCK, -2.0, 5.0],
+        ["update", 102, 3, STOCK, -4.0, 0.0],
+    ]
+
+
+def test_corrections_empty_the_duplicate_quants(script):
+    balance_quants = script("balance_quants")
+    move_lines = _move_lines([[1, 1, SUPPLIER, STOCK, 7.0]])
+    quants = _quants([[101, 1, STOCK, 4.0], [100, 1, STOCK, 3.0]])
+
+    corrections = balance_quants.compute_quant_corrections(
+        move_lines, quants, [STOCK]
+    )
+
+    assert corrections[["quant_id", "delta", "new_quantity"]].values.tolist() == [
+        [100, 4.0, 7.0],
+        [101, -4.0, 0.0],
+    ]
+    assert corrections["new_quantity"].sum() == 7.0
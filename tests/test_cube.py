@@ -0,0 +1,101 @@
+import pandas as pd
+
+from datetime import date
+from otsokop import cube
+from otsokop.cube import MEASURES, ProductCube
+
+
+def _pos_order_line(line_id, price):
+    return {
+        "id": line_id,
+        "product_id": [1, "Pomme"],
+        "price_subtotal": price,
+        "price_subtotal_incl": price,
+        "price_unit": price,
+        "qty": 1.0,
+        "discount": 0.0,
+    }
+
+
+def _cube_setup(client, monkeypatch, month_start, lines):
+    client.rpc[("pos.order", "search_read")] = lambda params, kwargs: [
+        {
+            "id": 1,
+            "date_order": f"{month_start} 10:00:00",
+            "partner_id": False,
+            "amount_total": 0.0,
+            "amount_tax": 0.0,
+            "amount_return": 0.0,
+            "amount_paid": 0.0,
+            "state": "done",
+            "lines": [line["id"] for line in lines],
+        }
+    ]
+    client.rpc[("pos.order.line", "search_read")] = lambda params, kwargs: [
+        dict(line) for line in lines
+    ]
+    client.rpc[("purchase.order", "search_read")] = lambda params, kwargs: [
+        {
+            "id": 1,
+            "date_order": f"{month_start} 09:00:00",
+            "date_planned": False,
+            "partner_id": [2, "Fournisseur"],
+            "state": "draft",
+            "order_line": [],
+        }
+    ]
+    client.rpc[("purchase.order.line", "search_read")] = []
+    monkeypatch.setattr(
+        client,
+        "get_product_losses",
+        lambda date_start, date_end: pd.DataFrame(columns=["product_id"]),
+    )
+    monkeypatch.setattr(
+        client,
+        "get_products",
+        lambda: pd.DataFrame(
+            {
+                "id": [1],
+                "name": ["Pomme"],
+                "product_category_id": [3],
+                "product_rack_code": ["A1"],
+            }
+        ),
+    )
+    monkeypatch.setattr(
+        client,
+        "get_product_categories",
+        lambda: pd.DataFrame({"id": [3], "name": ["Fruits"]}),
+    )
+
+
+def test_product_cube_refreshes_current_month(client, monkeypatch):
+    month_start = date.today().strftime("%Y-%m-01")
+    lines = [_pos_order_line(1, 10.0)]
+    _cube_setup(client, monkeypatch, month_start, lines)
+
+    revenue = MEASURES.index("revenue")
+    assert ProductCube(client, month_start).values[revenue].sum() == 10.0
+
+    lines.append(_pos_order_line(2, 5.0))
+    assert ProductCube(client, month_start).values[revenue].sum() == 15.0
+
+
+def test_product_cube_reads_month_again_once_final(
+    client, monkeypatch, freeze_today
+):
+    lines = [_pos_order_line(1, 10.0)]
+    _cube_setup(client, monkeypatch, "2024-03-01", lines)
+    revenue = MEASURES.index("revenue")
+
+    freeze_today(date(2024, 3, 20), cube)
+    cube_march = ProductCube(client, "2024-03-01", "2024-03-31")
+    assert cube_march.values[revenue].sum() == 10.0
+
+    # A sale of the end of the month, read once the month is over
+    lines.append(_pos_order_line(2, 5.0))
+    freeze_today(date(2024, 4, 2), cube)
+    for _ in range(2):
+        cube_march = ProductCube(client, "2024-03-01", "2024-03-31")
+        assert cube_march.values[revenue].sum() == 15.0
+    assert client.calls.count(("pos.order", "search_read")) == 2
@@ -0,0 +1,25 @@
+import pandas as pd
+
+
+def test_generate_sheets_writes_one_sheet_per_rack(script, tmp_path):
+    inventory_sheets = script("inventory_sheets")
+    snapshot = pd.DataFrame(
+        {
+            "rack_location": ["A1", "A1", None],
+            "product_id": [1, 2, 3],
+            "categ": ["Fruits", "Fruits", "Épicerie"],
+            "name": ["Pomme", "Poire", "Riz"],
+            "barcode": ["123", None, "456"],
+            "uom": ["kg", "kg", "Unité"],
+            "qty_available": [2.5, 1.0, 4.0],
+        }
+    ).set_index("rack_location")
+
+    paths = inventory_sheets.generate_sheets(snapshot, str(tmp_path), "csv")
+
+    assert sorted(path.rsplit("/", 1)[1] for path in paths) == [
+        "A1.csv",
+        "Sans rayon.csv",
+    ]
+    sheet = pd.read_csv(tmp_path / "A1.csv", sep=";")
+    assert sheet["Article"].tolist() == ["Pomme", "Poire"]
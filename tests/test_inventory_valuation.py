@@ -0,0 +1,44 @@
+import pandas as pd
+
+
+def _move_line(line_id, move_id, debit, credit, quantity):
+    return {
+        "id": line_id,
+        "product_id": [1, "Pomme"],
+        "account_id": [10, "Stock"],
+        "move_id": [move_id, f"STJ/{move_id}"],
+        "debit": debit,
+        "credit": credit,
+        "quantity": quantity,
+    }
+
+
+def test_zero_cost_lines_follow_the_stock_move(script, monkeypatch):
+    inventory_valuation = script("inventory_valuation")
+    client = inventory_valuation.client
+    monkeypatch.setattr(
+        client,
+        "get_product_categories",
+        lambda: pd.DataFrame([{"id": 1, "property_stock_valuation_account_id": 10}]),
+    )
+    records = {
+        "account.move.line": [
+            _move_line(1, 1, 20.0, 0.0, 10.0),
+            # Received and delivered at a zero cost
+            _move_line(2, 2, 0.0, 0.0, 5.0),
+            _move_line(3, 3, 0.0, 0.0, 3.0),
+            _move_line(4, 4, 0.0, 8.0, 4.0),
+        ],
+        # Only the account move of the receipt enters the stock
+        "account.move": [{"id": 2}],
+    }
+
+    def execute_kw(model, method, params, kwargs=None):
+        if params[0][-1] != ["id", ">", 0]:
+            return []
+        return records[model]
+
+    monkeypatch.setattr(client, "execute_kw", execute_kw)
+
+    valuation = inventory_valuation.inventory_valuation("2025-01-31")
+    assert valuation[["value", "quantity"]].values.tolist() == [[12.0, 8.0]]
@@ -0,0 +1,47 @@
+import os, pandas as pd, pytest
+
+from otsokop.lake import ParquetLake
+
+
+def test_write_partition_keeps_the_previous_one_on_failure(tmp_path, monkeypatch):
+    lake = ParquetLake(str(tmp_path))
+    lake.write_partition("product", pd.DataFrame({"id": [1, 2]}))
+
+    rename = os.rename
+
+    def failing_rename(src, dst):
+        if os.path.basename(src).startswith(".tmp-"):
+            raise OSError("rename failed")
+        rename(src, dst)
+
+    monkeypatch.setattr(os, "rename", failing_rename)
+    with pytest.raises(OSError):
+        lake.write_partition("product", pd.DataFrame({"id": [1, 2, 3]}))
+
+    assert lake.read("product")["id"].tolist() == [1, 2]
+    # Nothing left over from the failed write
+    assert sorted(os.listdir(tmp_path)) == [ParquetLake.MANIFEST, "model=product"]
+
+
+def test_read_partitions_with_mixed_odoo_values(tmp_path):
+    lake = ParquetLake(str(tmp_path))
+    partitions = [
+        # `False` only: empty values, or a boolean never True
+        {"ref": [False, False], "partner_id": [False, False], "paid": [False] * 2},
+        {"ref": ["abc", False], "partner_id": [7, False], "paid": [True, False]},
+        {"ref": [12, "def"], "partner_id": [8, 9], "paid": [False, False]},
+        {"ref": [False, False], "partner_id": [1.5, False], "paid": [False, True]},
+    ]
+    for month, columns in enumerate(partitions, start=1):
+        df = pd.DataFrame({"id": [2 * month - 1, 2 * month], **columns})
+        lake.write_partition("pos_order", df, 2025, month)
+
+    orders = lake.read("pos_order").sort_values("id")
+
+    assert orders["ref"].fillna("").tolist() == ["", "", "abc", "", "12", "def", "", ""]
+    assert orders["partner_id"].fillna(0).tolist() == [0, 0, 7, 0, 8, 9, 1.5, 0]
+    assert orders["paid"].tolist() == [False] * 2 + [True] + [False] * 4 + [True]
+    assert orders["month"].tolist() == [1, 1, 2, 2, 3, 3, 4, 4]
+
+    recent = lake.read("pos_order", ["id", "ref"], [("month", ">=", 3)])
+    assert recent["ref"].fillna("").tolist() == ["12", "def", "", ""]
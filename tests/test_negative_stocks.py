@@ -0,0 +1,47 @@
+from datetime import date
+
+import pandas as pd
+
+
+def _period(product_id, from_date, sales_qty):
+    return {
+        "from_date": f"{from_date} 00:00:00",
+        "to_date": f"{from_date} 23:59:59",
+        "product_id": [product_id, "Pomme"],
+        "location_id": [12, "Stock"],
+        "loss_qty": 0.0,
+        "end_qty": -1.0,
+        "virtual_qty": -1.0,
+        "sales_qty": sales_qty,
+        "incoming_qty": 0.0,
+        "purchase_qty": 0.0,
+        "production_qty": 0.0,
+        "outgoing_qty": 0.0,
+        "ignored": False,
+    }
+
+
+def test_explain_negative_stocks_keys_the_history_by_month(script, client):
+    negative_stocks = script("negative_stocks")
+    periods = [
+        # Before the last 30 days
+        _period(1, "2025-03-03", 5.0),
+        _period(1, "2025-03-17", 2.0),
+        _period(1, "2025-04-07", 3.0),
+    ]
+    months = []
+
+    def search_read(params, kwargs):
+        (from_date, to_date) = (f"{params[0][0][2]}", f"{params[0][1][2]}")
+        months.append(to_date[:7])
+        return [dict(p) for p in periods if from_date <= p["from_date"] <= to_date]
+
+    client.rpc[("product.history", "search_read")] = search_read
+    stocks = pd.DataFrame([{"id": 1, "qty_available": -1.0}])
+
+    for today in (date(2025, 4, 10), date(2025, 4, 11)):
+        explained = negative_stocks.explain_negative_stocks(client, stocks, today)
+        assert explained["sales_qty"].tolist() == [5.0]
+
+    # March is over and read once, April is read again every day
+    assert months == ["2025-03", "2025-04", "2025-04"]
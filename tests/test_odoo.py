@@ -0,0 +1,153 @@
+from datetime import date, datetime
+from otsokop import odoo
+
+
+def test_get_purchase_orders_without_date_planned(client):
+    # Draft RFQs without lines have no planned date
+    client.rpc[("purchase.order", "search_read")] = [
+        {
+            "id": 1,
+            "date_order": "2024-01-05 10:00:00",
+            "date_planned": False,
+            "display_name": "PO00001",
+            "partner_id": [3, "Fournisseur"],
+            "amount_total": 0.0,
+            "amount_tax": 0.0,
+            "amount_untaxed": 0.0,
+            "invoice_status": "no",
+            "state": "draft",
+            "order_line": [],
+        },
+        {
+            "id": 2,
+            "date_order": "2024-01-06 10:00:00",
+            "date_planned": "2024-01-10 08:00:00",
+            "display_name": "PO00002",
+            "partner_id": [3, "Fournisseur"],
+            "amount_total": 12.0,
+            "amount_tax": 0.0,
+            "amount_untaxed": 12.0,
+            "invoice_status": "to invoice",
+            "state": "purchase",
+            "order_line": [],
+        },
+    ]
+    client.rpc[("purchase.order.line", "search_read")] = []
+
+    (orders, _) = client.get_purchase_orders("2024-01-01", "2024-01-31")
+
+    assert orders["date_planned"].isna().tolist() == [True, False]
+    assert str(orders["date_planned"].dtype).startswith("datetime64")
+
+
+def _loss_move(move_id, date_expected, product_qty):
+    return {
+        "id": move_id,
+        "date_expected": date_expected,
+        "location_id": [12, "Stock"],
+        "location_dest_id": [8, "Inventory loss"],
+        "product_id": [5, "Pomme"],
+        "product_qty": product_qty,
+        "price_unit": -1.5,
+        "picking_type_id": [1, "Pertes"],
+        "state": "done",
+    }
+
+
+def _loss_setup(client, moves):
+    client.rpc[("stock.picking.type", "search_read")] = [
+        {"id": 1, "name": "Pertes", "code": "internal", "active": True}
+    ]
+    client.rpc[("stock.location", "search_read")] = [
+        {"id": 8, "name": "Inventory loss", "comment": False}
+    ]
+    client.rpc[("stock.move", "search_read")] = lambda params, kwargs: [
+        dict(move) for move in moves
+    ]
+
+
+def test_get_product_losses_refreshes_current_month(client):
+    today = datetime.now()
+    month_start = today.strftime("%Y-%m-01")
+    moves = [_loss_move(1, f"{month_start} 10:00:00", 2.0)]
+    _loss_setup(client, moves)
+
+    losses = client.get_product_losses(month_start, today.strftime("%Y-%m-%d"))
+    assert losses["product_qty"].tolist() == [2.0]
+
+    moves.append(_loss_move(2, f"{month_start} 11:00:00", 3.0))
+    losses = client.get_product_losses(month_start, today.strftime("%Y-%m-%d"))
+    assert losses["product_qty"].tolist() == [2.0, 3.0]
+
+
+def test_get_product_losses_caches_past_months(client):
+    moves = [_loss_move(1, "2024-03-15 10:00:00", 2.0)]
+    _loss_setup(client, moves)
+
+    client.get_product_losses("2024-03-01", "2024-03-31")
+    moves.append(_loss_move(2, "2024-03-16 10:00:00", 3.0))
+    losses = client.get_product_losses("2024-03-01", "2024-03-31")
+
+    assert losses["product_qty"].tolist() == [2.0]
+    assert client.calls.count(("stock.move", "search_read")) == 1
+
+
+def test_get_product_losses_reads_month_again_once_final(client, freeze_today):
+    moves = [_loss_move(1, "2024-03-15 10:00:00", 2.0)]
+    _loss_setup(client, moves)
+
+    freeze_today(date(2024, 3, 20), odoo)
+    losses = client.get_product_losses("2024-03-01", "2024-03-31")
+    assert losses["product_qty"].tolist() == [2.0]
+
+    # A loss recorded late, read once the month is over
+    moves.append(_loss_move(2, "2024-03-28 10:00:00", 3.0))
+    freeze_today(date(2024, 4, 2), odoo)
+    for _ in range(2):
+        losses = client.get_product_losses("2024-03-01", "2024-03-31")
+        assert losses["product_qty"].tolist() == [2.0, 3.0]
+    assert client.calls.count(("stock.move", "search_read")) == 2
+
+
+def _rack_product(product_id, qty_available):
+    return {
+        "id": product_id,
+        "rack_location": "A1",
+        "categ_id": [1, "Fruits"],
+        "name": f"Produit {product_id}",
+        "barcode": False,
+        "uom_id": [1, "Unité"],
+        "qty_available": qty_available,
+        "sale_ok": True,
+        "active": True,
+    }
+
+
+def test_products_by_racks_reads_products_of_deleted_quants(client):
+    products = {1: _rack_product(1, 0.0), 2: _rack_product(2, 4.0)}
+    quants = [
+        {"id": 10, "product_id": [1, "Produit 1"]},
+        {"id": 20, "product_id": [2, "Produit 2"]},
+    ]
+
+    def search_read_products(params, kwargs):
+        if params[0][0][0] == "id":
+            return [products[i] for i in params[0][0][2]]
+        return list(products.values())
+
+    client.rpc[("product.product", "search_read")] = search_read_products
+    client.rpc[("product.product", "search")] = []
+    client.rpc[("stock.quant", "search_read")] = lambda params, kwargs: (
+        [] if params[0][0][0] == "write_date" else quants
+    )
+    client.rpc[("stock.quant", "search")] = lambda params, kwargs: [
+        quant["id"] for quant in quants
+    ]
+    assert client.products_by_racks(full=True)["qty_available"].tolist() == [0, 4]
+
+    # The zero quants cleanup deletes the quant of the product 1
+    del quants[0]
+    products[1] = _rack_product(1, -2.0)
+
+    snapshot = client.products_by_racks()
+    assert snapshot.sort_values("product_id")["qty_available"].tolist() == [-2, 4]
@@ -0,0 +1,92 @@
+import pandas as pd
+
+from otsokop.rollups import rollup_table
+
+ORDERS = {
+    1: {"date_order": "2025-03-31 10:00:00", "amount_total": 5.0, "lines": [1]},
+    2: {"date_order": "2025-04-02 10:00:00", "amount_total": 7.0, "lines": [2]},
+}
+
+
+def _order_ids(params):
+    """Orders of ORDERS matching the date domain of `_pos_orders_domain`"""
+    (start, end) = (pd.Timestamp(value) for (_, _, value) in params[0][:2])
+    return [
+        order_id
+        for order_id, order in ORDERS.items()
+        if start <= pd.Timestamp(order["date_order"], tz="UTC") <= end
+    ]
+
+
+def execute_kw(model, method, params, kwargs=None):
+    if method == "read_group":
+        order_ids = _order_ids(params)
+        amount = sum(ORDERS[order_id]["amount_total"] for order_id in order_ids)
+        field = params[1][0]
+        return [{"__count": len(order_ids), field: amount}]
+    if model == "pos.order":
+        return [
+            {
+                "id": order_id,
+                "partner_id": False,
+                "amount_tax": 0.0,
+                "amount_return": 0.0,
+                "amount_paid": ORDERS[order_id]["amount_total"],
+                "state": "done",
+                **ORDERS[order_id],
+            }
+            for order_id in _order_ids(params)
+        ]
+    return [
+        {
+            "id": line_id,
+            "product_id": [1, "Pomme"],
+            "price_subtotal": ORDERS[line_id]["amount_total"],
+            "price_subtotal_incl": ORDERS[line_id]["amount_total"],
+            "price_unit": ORDERS[line_id]["amount_total"],
+            "qty": 1.0,
+            "discount": 0.0,
+        }
+        for line_id in params[0][0][2]
+    ]
+
+
+def _rollups(warehouse):
+    return {
+        grain: warehouse.read_sql(
+            f"SELECT period_start, product_id, qty, amount_ttc "
+            f"FROM {rollup_table(grain)} ORDER BY period_start"
+        ).values.tolist()
+        for grain in ("day", "week", "month")
+    }
+
+
+def test_verify_repair_keeps_the_rollups(script, tmp_path, monkeypatch):
+    monkeypatch.setenv("WAREHOUSE_ENGINE", f"sqlite:///{tmp_path / 'wh.sqlite'}")
+    dump_mysql = script("dump_mysql")
+    monkeypatch.setattr(dump_mysql.client, "execute_kw", execute_kw)
+    warehouse = dump_mysql.warehouse
+    warehouse.append(
+        pd.DataFrame(
+            {"id": [1], "product_category_id": [3], "product_rack_code": ["A1"]}
+        ),
+        "product",
+    )
+
+    dump_mysql.dump_pos_orders(pd.Timestamp("2025-03-01"), pd.Timestamp("2025-03-31"))
+    dump_mysql.dump_pos_orders(pd.Timestamp("2025-04-01"), pd.Timestamp("2025-04-30"))
+    rollups = _rollups(warehouse)
+    assert rollups["week"] == [["2025-03-31 00:00:00.000000", 1, 2.0, 12.0]]
+
+    # An order of March without lines, unknown to Odoo
+    warehouse.append(
+        pd.DataFrame(
+            {"id": [99], "date_order": ["2025-03-15 10:00:00"], "amount_total": 0.0}
+        ),
+        "pos_order",
+    )
+    report = dump_mysql.verify("2025-03-01", "2025-04-30")
+
+    assert report["month"].tolist() == ["2025-03"]
+    assert report["ok"].all()
+    assert _rollups(warehouse) == rollups
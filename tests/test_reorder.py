@@ -0,0 +1,73 @@
+from datetime import date
+from otsokop.reorder import history_tile, purchases_tile
+
+
+def _history(history_id, from_date, to_date, sales_qty):
+    return {
+        "id": history_id,
+        "from_date": from_date,
+        "to_date": to_date,
+        "product_id": [1, "Pomme"],
+        "location_id": [12, "Stock"],
+        "loss_qty": 0.0,
+        "end_qty": 10.0,
+        "virtual_qty": 10.0,
+        "sales_qty": sales_qty,
+        "incoming_qty": 0.0,
+        "purchase_qty": 0.0,
+        "production_qty": 0.0,
+        "outgoing_qty": 0.0,
+        "ignored": False,
+    }
+
+
+def _purchase_order(order_id, date_order):
+    return {
+        "id": order_id,
+        "date_order": date_order,
+        "date_planned": False,
+        "display_name": f"PO{order_id:05d}",
+        "partner_id": [3, "Fournisseur"],
+        "amount_total": 0.0,
+        "amount_tax": 0.0,
+        "amount_untaxed": 0.0,
+        "invoice_status": "no",
+        "state": "purchase",
+        "order_line": [],
+    }
+
+
+def test_history_tile_reads_month_again_once_final(client):
+    rows = [_history(1, "2024-03-04 00:00:00", "2024-03-10 23:59:59", 2.0)]
+    client.rpc[("product.history", "search_read")] = lambda params, kwargs: [
+        dict(row) for row in rows
+    ]
+    march = date(2024, 3, 1)
+
+    tile = history_tile(client, march, date(2024, 3, 20))
+    assert tile["sales_qty"].tolist() == [2.0]
+
+    # The last week of the month, read once the month is over
+    rows.append(_history(2, "2024-03-25 00:00:00", "2024-03-31 23:59:59", 3.0))
+    for _ in range(2):
+        tile = history_tile(client, march, date(2024, 4, 2))
+        assert tile["sales_qty"].tolist() == [5.0]
+    assert client.calls.count(("product.history", "search_read")) == 2
+
+
+def test_purchases_tile_reads_month_again_once_final(client):
+    orders = [_purchase_order(1, "2024-03-05 10:00:00")]
+    client.rpc[("purchase.order", "search_read")] = lambda params, kwargs: [
+        dict(order) for order in orders
+    ]
+    client.rpc[("purchase.order.line", "search_read")] = []
+    march = date(2024, 3, 1)
+
+    (month_orders, _) = purchases_tile(client, march, date(2024, 3, 20))
+    assert month_orders["id"].tolist() == [1]
+
+    orders.append(_purchase_order(2, "2024-03-29 10:00:00"))
+    for _ in range(2):
+        (month_orders, _) = purchases_tile(client, march, date(2024, 4, 2))
+        assert month_orders["id"].tolist() == [1, 2]
+    assert client.calls.count(("purchase.order", "search_read")) == 2
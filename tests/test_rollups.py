@@ -0,0 +1,64 @@
+import pandas as pd
+
+from otsokop.rollups import rollup_table, update_sales_rollups
+from otsokop.warehouse import Warehouse
+
+
+def _sales_warehouse(tmp_path, sales):
+    """SQLite warehouse with one order line per (date_order, qty, amount)"""
+    warehouse = Warehouse(f"sqlite:///{tmp_path / 'warehouse.sqlite'}")
+    warehouse.append(
+        pd.DataFrame(
+            {
+                "id": range(1, len(sales) + 1),
+                "date_order": [date_order for (date_order, _, _) in sales],
+                "state": "done",
+            }
+        ),
+        "pos_order",
+    )
+    warehouse.append(
+        pd.DataFrame(
+            {
+                "pos_order_id": range(1, len(sales) + 1),
+                "product_id": 1,
+                "qty": [qty for (_, qty, _) in sales],
+                "price_subtotal": [amount for (_, _, amount) in sales],
+                "price_subtotal_incl": [amount for (_, _, amount) in sales],
+            }
+        ),
+        "pos_order_detail",
+    )
+    warehouse.append(
+        pd.DataFrame(
+            {"id": [1], "product_category_id": [3], "product_rack_code": ["A1"]}
+        ),
+        "product",
+    )
+    return warehouse
+
+
+def _rollup(warehouse, grain):
+    return warehouse.read_sql(
+        f"SELECT period_start, qty, amount_ttc FROM {rollup_table(grain)} "
+        "ORDER BY period_start"
+    ).values.tolist()
+
+
+def test_reloading_a_month_keeps_the_week_spanning_two_months(tmp_path):
+    # The week of Monday 2025-03-31 ends in April
+    warehouse = _sales_warehouse(
+        tmp_path,
+        [
+            ("2025-03-31 10:00:00", 1.0, 5.0),
+            ("2025-04-02 10:00:00", 1.0, 7.0),
+        ],
+    )
+    update_sales_rollups(warehouse, "2025-03-01", "2025-03-31")
+    update_sales_rollups(warehouse, "2025-04-01", "2025-04-30")
+    rollups = {grain: _rollup(warehouse, grain) for grain in ("day", "week", "month")}
+    assert rollups["week"] == [["2025-03-31 00:00:00.000000", 2.0, 12.0]]
+
+    update_sales_rollups(warehouse, "2025-03-01", "2025-03-31")
+    for grain in ("day", "week", "month"):
+        assert _rollup(warehouse, grain) == rollups[grain]
@@ -0,0 +1,119 @@
+import base64, json, os
+
+import pytest
+
+import scale_log
+from bench_scale_log import ReplayOdoo, check_golden, synthetic_payloads
+from scale_log import OdooScaleLogClient
+
+# Anonymised payloads of a few products and their logs, with the files they
+# generate (`python bench_scale_log.py golden payloads.json golden --update`)
+FIXTURES = os.path.join(os.path.dirname(__file__), "fixtures", "scale_log")
+
+
+def _resync(odoo, output_folder):
+    """Resync the scale system, returning the product and external lines"""
+    OdooScaleLogClient(client=odoo).resync(str(output_folder), [1])
+    lines = {"PLU": [], "TXT": []}
+    if os.path.exists(output_folder):
+        for name in sorted(os.listdir(output_folder)):
+            with open(os.path.join(output_folder, name), encoding="iso-8859-1") as f:
+                lines[name[:3]].extend(f.read().splitlines())
+    return lines
+
+
+def test_generate_files_matches_golden():
+    with open(os.path.join(FIXTURES, "payloads.json"), encoding="utf-8") as f:
+        payloads = json.load(f)
+    assert check_golden(payloads, os.path.join(FIXTURES, "golden"))
+
+
+def test_resync_unlinks_from_the_last_shipped_group(tmp_path):
+    payloads = synthetic_payloads(3)
+    for product in payloads["product.product"]:
+        product["scale_group_id.scale_system_id"] = 1
+    payloads["product.scale.group"].append({"id": 2, "external_identity": "2"})
+    odoo = ReplayOdoo(payloads)
+    products = odoo.records["product.product"]
+
+    first = _resync(odoo, tmp_path / "first")
+    assert [line[:2] for line in first["PLU"]] == ["A,", "A,", "A,"]
+    assert _resync(odoo, tmp_path / "unchanged") == {"PLU": [], "TXT": []}
+
+    # Product 1 is deleted and product 2 moves to the group 2
+    del products[1]
+    products[2]["scale_group_id"] = [2, "Groupe 2"]
+    lines = _resync(odoo, tmp_path / "changed")
+
+    assert [line.split(",")[:2] for line in lines["PLU"]] == [
+        ["B", "2"],
+        ["A", "2"],
+        ["B", "1"],
+    ]
+    groups = [line.split("#")[1] for line in lines["TXT"] if line.endswith("#Bio")]
+    assert groups == ["1", "2", "1"]
+
+    # Nothing left to unlink, and the resync logs are never marked as sent
+    assert _resync(odoo, tmp_path / "again") == {"PLU": [], "TXT": []}
+    assert not any(log["sent"] for log in odoo.records["product.scale.log"].values())
+
+
+def test_images_follow_their_template(tmp_path):
+    payloads = synthetic_payloads(10)
+    payloads["product.scale.system"][0]["send_images"] = True
+    for log in payloads["product.scale.log"]:
+        log["action"] = "write"
+    odoo = ReplayOdoo(payloads)
+    templates = odoo.records["product.template"]
+    with_image = sorted(i for i, template in templates.items() if template["image"])
+
+    OdooScaleLogClient(client=odoo).generate_files(str(tmp_path))
+    images = sorted(name for name in os.listdir(tmp_path) if name.endswith(".PNG"))
+    assert images == sorted(f"{i}.PNG" for i in with_image)
+
+    # The image is edited on the template, the variant is not written
+    image = base64.b64encode(b"new image").decode("ascii")
+    templates[with_image[0]].update(image=image, write_date="2025-02-01 00:00:00")
+    odoo.records["product.product"][with_image[0]]["image"] = image
+    OdooScaleLogClient(client=odoo).generate_files(str(tmp_path))
+
+    with open(tmp_path / f"{with_image[0]}.PNG", "rb") as f:
+        assert f.read() == b"new image"
+
+
+def test_daemon_marks_the_logs_written_before_a_failure(tmp_path, monkeypatch):
+    payloads = synthetic_payloads(6)
+    # The files of the scale system 2 cannot be written
+    system = dict(payloads["product.scale.system"][0], id=2)
+    system["product_text_file_pattern"] = "missing/PLU_%Y%m%d_%H%M%S.txt"
+    payloads["product.scale.system"].append(system)
+    for log in payloads["product.scale.log"]:
+        if log["id"] % 2 == 0:
+            log["scale_system_id"] = [2, "Balance 2"]
+    odoo = ReplayOdoo(payloads)
+    client = OdooScaleLogClient(client=odoo)
+
+    flushed = []
+    generate_files = client.generate_files
+
+    def record_generate_files(output_folder, logs=None, **kwargs):
+        flushed.append(sorted(log["id"] for log in logs))
+        return generate_files(output_folder, logs=logs, **kwargs)
+
+    class Stop(Exception):
+        pass
+
+    def sleep(seconds):
+        if len(flushed) == 2:
+            raise Stop()
+
+    monkeypatch.setattr(client, "generate_files", record_generate_files)
+    monkeypatch.setattr(scale_log.time, "sleep", sleep)
+    with pytest.raises(Stop):
+        client.run_daemon(str(tmp_path), flush_interval=0)
+
+    # Only the logs of the scale system 2 are flushed again
+    logs = odoo.records["product.scale.log"].values()
+    failed = sorted(log["id"] for log in logs if log["scale_system_id"][0] == 2)
+    assert flushed[1] == failed
+    assert all(log["sent"] != (log["id"] in failed) for log in logs)
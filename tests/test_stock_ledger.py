@@ -0,0 +1,62 @@
+import pandas as pd
+
+from datetime import date
+from otsokop import stock_ledger
+from otsokop.stock_ledger import StockLedger
+
+STOCK = 12
+SUPPLIER = 8
+CUSTOMER = 9
+
+
+def _move_line(line_id, moved_at, source, destination, qty_done):
+    return {
+        "id": line_id,
+        "date": moved_at,
+        "location_id": [source, "Source"],
+        "location_dest_id": [destination, "Destination"],
+        "move_id": [line_id, "Move"],
+        "product_qty": qty_done,
+        "product_id": [1, "Pomme"],
+        "product_uom_id": [1, "Unit(s)"],
+        "product_uom_qty": qty_done,
+        "qty_done": qty_done,
+        "state": "done",
+    }
+
+
+def _move_lines_setup(client, lines):
+    def search_read(params, kwargs):
+        (start, end) = (value for (_, _, value) in params[0])
+        return [
+            dict(line)
+            for line in lines
+            if start <= pd.Timestamp(line["date"], tz="UTC") < end
+        ]
+
+    client.rpc[("stock.move.line", "search_read")] = search_read
+
+
+def test_ledger_checkpoint_reads_month_again_once_final(client, freeze_today):
+    lines = [
+        _move_line(1, "2024-02-10 10:00:00", SUPPLIER, STOCK, 5.0),
+        _move_line(2, "2024-03-05 10:00:00", STOCK, CUSTOMER, 2.0),
+    ]
+    _move_lines_setup(client, lines)
+
+    freeze_today(date(2024, 3, 20), stock_ledger)
+    ledger = StockLedger(client, "2024-02-01")
+    assert ledger.quantity_at(1, STOCK, "2024-02-15") == 5.0
+    assert ledger.quantity_at(1, STOCK, "2024-03-31") == 3.0
+
+    # A receipt at the end of March, read once the month is over
+    lines.append(_move_line(3, "2024-03-25 10:00:00", SUPPLIER, STOCK, 4.0))
+    lines.append(_move_line(4, "2024-04-01 10:00:00", STOCK, CUSTOMER, 1.0))
+    freeze_today(date(2024, 4, 2), stock_ledger)
+    for _ in range(2):
+        ledger = StockLedger(client, "2024-02-01")
+        assert ledger.quantity_at(1, STOCK, "2024-03-31") == 7.0
+        assert ledger.quantity_at(1, STOCK, "2024-04-02") == 6.0
+        assert ledger.checkpoint(date(2024, 3, 1))[(1, STOCK)] == 7.0
+    series = ledger.quantity_series(1, STOCK, "2024-03-24", "2024-04-01")
+    assert series.tolist() == [3.0] + [7.0] * 7 + [6.0]